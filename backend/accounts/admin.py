@@ -1,6 +1,19 @@
 from django.contrib import admin
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import CustomUser
+from .models import CustomUser, InviteBatch, OutboundEmail
+from .pagination import EstimatedCountPaginator
+
+
+def prefix_match(field, prefix):
+    """
+    `field` starts with `prefix`, written as a range so any B-tree index on the
+    column can serve it (LIKE 'x%' can't use one on SQLite, or on PostgreSQL
+    without a pattern-ops index)
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
 
 
 @admin.register(CustomUser)
@@ -10,8 +23,13 @@ class UserAdmin(BaseUserAdmin):
     list_display = ['email', 'full_name', 'role', 'is_active', 'is_staff', 'created_at']
     list_filter = ['role', 'is_active', 'is_staff', 'created_at']
     search_fields = ['email', 'full_name', 'phone']
+    search_help_text = 'Exact email, the start of an email or phone number, or any part of a name'
     ordering = ['-created_at']
     
+    # The users table can hold millions of rows: no unbounded COUNT(*) per page load
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal Info', {'fields': ('full_name', 'phone', 'avatar', 'role')}),
@@ -25,3 +43,64 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('email', 'full_name', 'role', 'password1', 'password2'),
         }),
     )
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            # The changelist only renders these columns
+            queryset = queryset.only('id', *self.list_display)
+        return queryset
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Replace the default OR of three leading-wildcard icontains scans with one
+        lookup per kind of term: an exact email match first, then an email prefix,
+        a phone prefix, or a name substring. On PostgreSQL each has an index
+        (see CustomUser.Meta.indexes); other backends scan, as the stock search does.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        
+        if '@' in term:
+            exact = queryset.filter(email=CustomUser.objects.normalize_email(term))
+            if exact.exists():
+                return exact, False
+            # Local parts keep the case they were registered with
+            return queryset.filter(email__istartswith=term), False
+        
+        if term.lstrip('+').replace(' ', '').isdigit():
+            return queryset.filter(prefix_match('phone', term)), False
+        
+        return queryset.filter(Q(full_name__icontains=term) | Q(email__istartswith=term)), False
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Admin interface for inspecting and requeueing outbox messages"""
+
+    list_display = ['to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to_email']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    # Bodies can hold live password reset links
+    exclude = ['body', 'html_body']
+    raw_id_fields = ['batch']
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected messages')
+    def requeue(self, request, queryset):
+        # Sent and dead-lettered rows have had their bodies cleared, so only pending ones can be retried
+        count = queryset.filter(status='PENDING').update(attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'Requeued {count} pending messages.')
+
+
+@admin.register(InviteBatch)
+class InviteBatchAdmin(admin.ModelAdmin):
+    """Admin interface for hosts' bulk interview invitations"""
+
+    list_display = ['title', 'host', 'total', 'scheduled_at', 'created_at']
+    search_fields = ['title']
+    list_select_related = ['host']
+    raw_id_fields = ['host']
+    readonly_fields = ['total', 'created_at']
@@ -0,0 +1,196 @@
+"""
+Native async variants of the auth views for ASGI deployments.
+
+DRF's APIView is synchronous, so under ASGI every request to it pays a
+sync-to-async thread hop. These views are plain Django async views that keep
+the DRF behaviour the frontend relies on: cookie JWT authentication, the
+sliding-window throttles, serializer validation and DRF-shaped error bodies.
+They are mounted instead of the sync views when AUTH_ASYNC_VIEWS is on.
+"""
+import io
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+
+from . import revocation
+from .authentication import CookieJWTAuthentication
+from .google import GoogleKeysUnavailable, averify_google_token
+from .mail import aenqueue_mail
+from .models import CustomUser
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .routers import read_from_replica
+from .serializers import FastUserSerializer, GoogleLoginSerializer, PasswordResetEmailSerializer
+from .throttling import AUTH_THROTTLE_CLASSES
+from .tokens import tokens_for_user
+from .views import (
+    clear_auth_cookies, password_reset_email, profile_not_modified, read_refresh_cookie, set_auth_cookies,
+    set_profile_validators,
+)
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """Render like the DRF views so both view flavours return identical bodies"""
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of APIView: parses JSON bodies into request.data,
+    authenticates with CookieJWTAuthentication, applies throttles and turns
+    APIExceptions into DRF-style responses.
+    """
+    requires_auth = False
+    throttle_classes = []
+    throttle_scope = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Same as APIView: cookie JWT auth is not session auth, so no CSRF check
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.data = self.parse(request)
+            request.user, request.auth = await self.authenticate(request)
+            if self.requires_auth and request.auth is None:
+                raise exceptions.NotAuthenticated()
+            self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def parse(self, request):
+        if request.method not in ('POST', 'PUT', 'PATCH') or not request.body:
+            return {}
+        if request.content_type == 'application/json':
+            context = {'encoding': request.encoding or settings.DEFAULT_CHARSET}
+            return FastJSONParser().parse(io.BytesIO(request.body), parser_context=context)
+        return request.POST
+
+    async def authenticate(self, request):
+        result = await CookieJWTAuthentication().aauthenticate(request)
+        if result is None:
+            return AnonymousUser(), None
+        return result
+
+    def check_throttles(self, request):
+        durations = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                durations.append(throttle.wait())
+        if durations:
+            raise exceptions.Throttled(max((d for d in durations if d is not None), default=None))
+
+    def handle_exception(self, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = json_response(data, status=exc.status_code)
+        if isinstance(exc, exceptions.Throttled) and exc.wait is not None:
+            response['Retry-After'] = str(math.ceil(exc.wait))
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = CookieJWTAuthentication().authenticate_header(None)
+        return response
+
+
+class AsyncCurrentUserView(AsyncAPIView):
+    """Get current authenticated user"""
+    requires_auth = True
+
+    async def get(self, request):
+        not_modified = profile_not_modified(request, request.user)
+        if not_modified is not None:
+            return not_modified
+        response = json_response(FastUserSerializer(request.user).data)
+        set_profile_validators(response, request.user)
+        return response
+
+
+class AsyncLogoutView(AsyncAPIView):
+    """User logout endpoint"""
+    requires_auth = True
+
+    async def post(self, request):
+        refresh = read_refresh_cookie(request)
+        if refresh is not None:
+            # The revocation insert needs a transaction, which the async ORM can't open
+            await sync_to_async(revocation.revoke_family)(refresh)
+
+        response = json_response({'message': 'Logout successful'})
+        clear_auth_cookies(response)
+        return response
+
+
+class AsyncPasswordResetRequestView(AsyncAPIView):
+    """Request password reset email"""
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'password_reset'
+
+    async def post(self, request):
+        serializer = PasswordResetEmailSerializer(data=request.data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # One query answers both "does the account exist" and "who is it"
+        email = serializer.validated_data['email']
+        with read_from_replica():
+            user = await CustomUser.objects.filter(email=email).afirst()
+        if user is None:
+            return json_response({'email': ['No user found with this email address.']},
+                                 status=status.HTTP_400_BAD_REQUEST)
+
+        email_subject, email_body = password_reset_email(user)
+        await aenqueue_mail(
+            email_subject,
+            email,
+            html_body=email_body,
+            from_email=settings.EMAIL_HOST_USER,
+        )
+
+        return json_response({'message': 'If an account exists with this email, a reset link will be sent'})
+
+
+class AsyncGoogleLoginView(AsyncAPIView):
+    """Google OAuth login endpoint"""
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'google_login'
+
+    async def post(self, request):
+        serializer = GoogleLoginSerializer(data=request.data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            idinfo = await averify_google_token(serializer.validated_data['access_token'])
+        except ValueError:
+            return json_response({'error': 'Invalid Google token'}, status=status.HTTP_400_BAD_REQUEST)
+        except GoogleKeysUnavailable:
+            return json_response({'error': 'Google sign-in is temporarily unavailable'},
+                                 status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        user, created = await CustomUser.objects.aget_or_create(
+            email=idinfo['email'],
+            defaults={
+                'full_name': idinfo.get('name', ''),
+                'avatar': idinfo.get('picture', ''),
+                'role': serializer.validated_data.get('role', 'CANDIDATE'),
+            }
+        )
+        # Receivers may write to the database (an overdue touch buffer flushes inline)
+        await sync_to_async(user_logged_in.send)(sender=user.__class__, request=request, user=user)
+
+        response = json_response({
+            'message': 'Google login successful',
+            'user': FastUserSerializer(user).data,
+            'is_new_user': created,
+        })
+        set_auth_cookies(response, tokens_for_user(user))
+        return response
@@ -1,25 +1,187 @@
 """
 Authentication middleware for JWT cookie-based authentication
 """
+import copy
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from rest_framework.exceptions import AuthenticationFailed
 
+from .cache import tiered_cache
+from .metrics import timed
+from .models import CustomUser
+from .routers import read_from_primary
+from .tokens import has_profile_claims, profile_claims_enabled, user_from_claims
+
+
+def _cache_setting(name, default):
+    return getattr(settings, 'AUTH_USER_CACHE', {}).get(name, default)
+
+
+# Cached users are pickled model instances, so a change of fields is a new format
+USER_CACHE_VERSION = hashlib.blake2b(
+    ','.join(field.attname for field in CustomUser._meta.concrete_fields).encode(), digest_size=4,
+).hexdigest()
+
+# Validated tokens are keyed by a hash of the raw cookie value and stay in the
+# process: checking an HS256 signature is cheaper than a shared cache lookup.
+# User snapshots are keyed by user id and shared by every worker.
+token_cache = tiered_cache(
+    'tokens',
+    max_entries=_cache_setting('MAX_TOKENS', 10000),
+    ttl=_cache_setting('TTL', 300),
+    shared=False,
+)
+user_cache = tiered_cache(
+    'users',
+    version=USER_CACHE_VERSION,
+    max_entries=_cache_setting('MAX_USERS', 10000),
+    ttl=_cache_setting('TTL', 300),
+)
+
+
+def invalidate_user(user_id):
+    """Drop the cached snapshot for a user, in every worker, so the next request reloads it"""
+    user_cache.delete(str(user_id))
+
+
+def auth_cache_stats():
+    """Hit/miss counters for the authentication caches of this process"""
+    return {
+        'tokens': token_cache.stats(),
+        'users': user_cache.stats(),
+    }
+
+
+def check_not_revoked(user, validated_token):
+    # Claims-only tokens skip the user row, so they stay valid until they expire
+    if user.tokens_revoked(validated_token):
+        raise AuthenticationFailed(_('Token was revoked'), code='token_revoked')
+
 
 class CookieJWTAuthentication(JWTAuthentication):
     """
     Custom JWT authentication class that reads the token from cookies
     instead of the Authorization header
     """
-    
+
     def authenticate(self, request):
         # Try to get token from cookie
         access_token = request.COOKIES.get('access_token')
-        
+
         if access_token is None:
             return None
-        
+
         # Validate the token
         validated_token = self.get_validated_token(access_token)
-        
+
         # Get the user
         return self.get_user(validated_token), validated_token
+
+    def get_validated_token(self, raw_token):
+        if not _cache_setting('ENABLED', True):
+            with timed('jwt'):
+                return super().get_validated_token(raw_token)
+
+        if isinstance(raw_token, str):
+            raw_token = raw_token.encode()
+        key = hashlib.sha256(raw_token).hexdigest()
+
+        validated_token = token_cache.get(key)
+        if validated_token is None:
+            with timed('jwt'):
+                validated_token = super().get_validated_token(raw_token)
+            token_cache.set(key, validated_token, expires_at=validated_token.get('exp'))
+        return validated_token
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; the user lookup uses the async ORM"""
+        access_token = request.COOKIES.get('access_token')
+
+        if access_token is None:
+            return None
+
+        # Token validation is CPU-only (and usually a cache hit), so it runs inline
+        validated_token = self.get_validated_token(access_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    def _user_cache_key(self, validated_token):
+        """Key of the token's user in user_cache, or None when the cache doesn't apply"""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not _cache_setting('ENABLED', True) or user_id is None:
+            return None
+        return str(user_id)
+
+    def get_user(self, validated_token):
+        # Claims-only mode: the token already carries the profile, so skip the database.
+        # The active flag was checked when the token was minted and is not re-read here.
+        if profile_claims_enabled() and has_profile_claims(validated_token):
+            return user_from_claims(validated_token)
+
+        key = self._user_cache_key(validated_token)
+        if key is None:
+            user = super().get_user(validated_token)
+            check_not_revoked(user, validated_token)
+            return user
+
+        # Concurrent first requests of a user share one query
+        user = user_cache.get_or_set(
+            key, partial(self.fetch_cached_user, validated_token), expires_at=validated_token.get('exp'),
+        )
+
+        check_not_revoked(user, validated_token)
+        # Hand out a copy so per-request mutations never leak into the shared snapshot
+        return copy.copy(user)
+
+    def fetch_cached_user(self, validated_token):
+        # Every worker serves the cached row for minutes; a lagging replica could
+        # put back one that a deactivation or password change just invalidated
+        with read_from_primary():
+            return super().get_user(validated_token)
+
+    async def aget_user(self, validated_token):
+        if profile_claims_enabled() and has_profile_claims(validated_token):
+            return user_from_claims(validated_token)
+
+        key = self._user_cache_key(validated_token)
+        if key is None:
+            user = await self.afetch_user(validated_token)
+            check_not_revoked(user, validated_token)
+            return user
+
+        user = user_cache.get(key)
+        if user is None:
+            with read_from_primary():
+                user = await self.afetch_user(validated_token)
+            user_cache.set(key, user, expires_at=validated_token.get('exp'))
+
+        check_not_revoked(user, validated_token)
+        return copy.copy(user)
+
+    async def afetch_user(self, validated_token):
+        """Async ORM counterpart of JWTAuthentication.get_user"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
@@ -0,0 +1,435 @@
+"""
+Local avatar proxy.
+
+CustomUser.avatar holds the raw Google `picture` URL. Rather than having
+every client hot-link the full-size image from a third party, AvatarStore
+fetches each source once, cuts a thumbnail of every AVATARS['SIZES'] from
+it, keeps only those in AVATARS['CACHE_DIR'] and hands out their file names.
+Files are named after the SHA-256 of the source image, so the URL of a
+thumbnail never changes
+content: serve_avatar sends it with immutable caching headers, straight from
+disk (FileResponse, which WSGI servers hand to sendfile()) or through the
+front server when AVATARS['SENDFILE_HEADER'] is set. The directory is kept
+under AVATARS['MAX_BYTES'] by evicting the least recently used files; every
+process on the host shares it.
+
+Resizing needs Pillow. Without it the original image is served at every size.
+"""
+import functools
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core import checks
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import FileResponse, HttpResponse, HttpResponseNotFound
+from django.utils.module_loading import import_string
+from django.views.decorators.http import require_safe
+
+from .cache import LRUCache
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+# <sha256 of the source>-<size>.<extension>; the URL index is never served
+THUMBNAIL_NAME_RE = re.compile(r'[0-9a-f]{64}-[0-9]+\.(?:jpg|png|gif|webp)')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Larger sources are refused before decoding, whatever their size in bytes
+MAX_PIXELS = 40_000_000
+# Recency is recorded in the file mtime, at most this often per file
+TOUCH_INTERVAL = 60 * 60
+LOCK_STRIPES = 64
+
+
+def avatar_setting(name):
+    defaults = {
+        'FETCHER': 'accounts.avatars.HTTPFetcher',
+        'CACHE_DIR': os.path.join(settings.BASE_DIR, 'avatar_cache'),
+        'MAX_BYTES': 256 * 1024 * 1024,  # size of CACHE_DIR before least recently used files go
+        'SIZES': [48, 96, 192],  # allowed thumbnail sizes, in pixels
+        'DEFAULT_SIZE': 96,
+        'SOURCE_HOSTS': ['*.googleusercontent.com'],  # hosts avatars may be fetched from
+        'MAX_SOURCE_BYTES': 5 * 1024 * 1024,
+        'TIMEOUT': 5,  # seconds
+        'FAILURE_TTL': 60,  # seconds a source that failed to fetch is not retried
+        'REDIRECT_MAX_AGE': 60 * 60,  # seconds clients may reuse the redirect to a thumbnail
+        'SENDFILE_HEADER': '',  # e.g. 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache)
+        'SENDFILE_PREFIX': '/internal/avatars/',  # internal location of CACHE_DIR for X-Accel-Redirect
+    }
+    return getattr(settings, 'AVATARS', {}).get(name, defaults[name])
+
+
+class FetchError(Exception):
+    """The source image could not be fetched or is not a usable image"""
+
+
+class SourceNotAllowed(FetchError):
+    """The avatar URL points somewhere avatars are not fetched from"""
+
+
+class HTTPFetcher:
+    """Fetches source images over HTTP(S), refusing redirects and oversized bodies"""
+
+    def __init__(self, timeout=None, max_bytes=None):
+        self.timeout = timeout or avatar_setting('TIMEOUT')
+        self.max_bytes = max_bytes or avatar_setting('MAX_SOURCE_BYTES')
+
+    def fetch(self, url):
+        import requests
+
+        try:
+            with timed('http'), requests.get(url, timeout=self.timeout, stream=True, allow_redirects=False) as response:
+                if response.status_code != 200:
+                    raise FetchError(f'{url} returned HTTP {response.status_code}')
+                data = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    data += chunk
+                    if len(data) > self.max_bytes:
+                        raise FetchError(f'{url} is larger than {self.max_bytes} bytes')
+                return bytes(data)
+        except requests.RequestException as e:
+            raise FetchError(str(e)) from e
+
+
+class StaticFetcher:
+    """Serves fixed images by URL, e.g. for tests and benchmarks"""
+
+    def __init__(self, images):
+        self.images = images
+        self.fetches = 0
+
+    def fetch(self, url):
+        self.fetches += 1
+        try:
+            return self.images[url]
+        except KeyError:
+            raise FetchError(f'{url} not found') from None
+
+
+def image_type(data):
+    """File extension of the image in data, or None if it is not a supported format"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+@functools.cache
+def pillow():
+    """PIL's (Image, ImageOps), or None when Pillow is not installed; imported on first use"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def thumbnail_extension(source_extension):
+    return 'jpg' if pillow() else source_extension
+
+
+def make_thumbnails(data, sizes):
+    """
+    {size: the image in data cropped to a square and scaled to size x size, as
+    a JPEG}; without Pillow every size is the image unchanged
+    """
+    modules = pillow()
+    if modules is None:
+        return {size: data for size in sizes}
+    Image, ImageOps = modules
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise FetchError(f'{image.width}x{image.height} image is too large')
+            # JPEGs decode straight at the smallest scale still covering the largest size
+            image.draft('RGB', (max(sizes), max(sizes)))
+            image = ImageOps.exif_transpose(image).convert('RGBA')
+            # Transparent sources go on white, JPEG has no alpha
+            flattened = Image.new('RGB', image.size, (255, 255, 255))
+            flattened.paste(image, mask=image.getchannel('A'))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise FetchError(f'Unreadable image: {e}') from e
+
+    thumbnails = {}
+    for size in sizes:
+        out = io.BytesIO()
+        ImageOps.fit(flattened, (size, size), Image.LANCZOS).save(out, 'JPEG', quality=85, optimize=True)
+        thumbnails[size] = out.getvalue()
+    return thumbnails
+
+
+def thumbnail_name(source, size):
+    digest, extension = source.split('.')
+    return f'{digest}-{size}.{thumbnail_extension(extension)}'
+
+
+class AvatarStore:
+    """
+    Content-addressed thumbnail cache in one directory:
+    <sha256 of the image>-<size>.<ext> holds a thumbnail and
+    url-<sha256 of the URL> the "<sha256 of the image>.<ext>" of the image at that URL.
+    """
+
+    def __init__(self, directory, fetcher, max_bytes, sizes, source_hosts=(), failure_ttl=60):
+        self.directory = os.fspath(directory)
+        self.fetcher = fetcher
+        self.max_bytes = max_bytes
+        self.sizes = sorted(sizes)
+        self.source_hosts = list(source_hosts)
+        os.makedirs(self.directory, exist_ok=True)
+        # Requests for the same source queue behind one fetch instead of each fetching it
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._failures = LRUCache(max_entries=1024, ttl=failure_ttl)
+        self._size_lock = threading.Lock()
+        self._size = None  # bytes in the directory, as last scanned plus our own writes since
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evictions = 0
+
+    def check_source(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise SourceNotAllowed(f'{url} is not an http(s) URL')
+        if not any(fnmatch(parts.hostname, pattern) for pattern in self.source_hosts):
+            raise SourceNotAllowed(f'{parts.hostname} is not in AVATARS["SOURCE_HOSTS"]')
+
+    def thumbnail(self, url, size):
+        """File name of the size x size thumbnail of the image at url, fetched and cut if needed"""
+        if size not in self.sizes:
+            raise ValueError(f'{size} is not one of {self.sizes}')
+        self.check_source(url)
+        index = 'url-' + hashlib.sha256(url.encode()).hexdigest()
+
+        name = self._cached_thumbnail(index, size)
+        if name is not None:
+            self.hits += 1
+            return name
+
+        with self._locks[hash(index) % LOCK_STRIPES]:
+            # Whoever held the lock may have just made it
+            name = self._cached_thumbnail(index, size)
+            if name is not None:
+                self.hits += 1
+                return name
+            self.misses += 1
+
+            if self._failures.get(url):
+                raise FetchError(f'{url} failed recently')
+            try:
+                return self._fetch(url, index, size)
+            except FetchError as e:
+                logger.warning('Avatar %s is unavailable: %s', url, e)
+                self._failures.set(url, True)
+                raise
+
+    def _fetch(self, url, index, size):
+        """Fetch the image at url and cut every size from it; the source itself is not kept"""
+        data = self.fetcher.fetch(url)
+        self.fetches += 1
+        extension = image_type(data)
+        if extension is None:
+            raise FetchError(f'{url} is not a JPEG, PNG, GIF or WebP image')
+        source = f'{hashlib.sha256(data).hexdigest()}.{extension}'
+        for each_size, thumbnail in make_thumbnails(data, self.sizes).items():
+            self._write(thumbnail_name(source, each_size), thumbnail)
+        # Last, so no process finds the index before the thumbnails it points to
+        self._write(index, source.encode())
+        return thumbnail_name(source, size)
+
+    def _cached_thumbnail(self, index, size):
+        source = self._source(index)
+        if source is None:
+            return None
+        name = thumbnail_name(source, size)
+        if not self.touch(name):
+            return None
+        # The index entry is needed to find the thumbnail again, keep it as fresh
+        self.touch(index)
+        return name
+
+    def _source(self, index):
+        """"<sha256>.<ext>" of the image the URL index entry points to"""
+        try:
+            with open(self.path(index), 'rb') as f:
+                return f.read().decode()
+        except FileNotFoundError:
+            return None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def touch(self, name):
+        """Whether name is in the cache, marking it recently used"""
+        try:
+            mtime = os.stat(self.path(name)).st_mtime
+        except FileNotFoundError:
+            return False
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def _write(self, name, data):
+        # Written aside and renamed into place: readers in any process see all of it or nothing
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(name))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._size_lock:
+            if self._size is None:
+                self._size = self.scan()[1]
+            else:
+                self._size += len(data)
+            full = self._size > self.max_bytes
+        if full:
+            self.evict()
+
+    def scan(self):
+        """([(mtime, path, bytes)], total bytes) of the files in the directory"""
+        entries, total = [], 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith('.tmp-'):
+                    # Left behind by a process that died mid-write
+                    if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+                        self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        """Remove least recently used files until the directory is at 90% of max_bytes"""
+        with self._size_lock:
+            entries, total = self.scan()
+            target = self.max_bytes * 0.9
+            for _, path, size in sorted(entries):
+                if total <= target:
+                    break
+                if self._remove(path):
+                    self.evictions += 1
+                total -= size
+            self._size = total
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another process evicted it first
+            return False
+        return True
+
+    def clear(self):
+        for _, path, _ in self.scan()[0]:
+            self._remove(path)
+        self._failures.clear()
+        with self._size_lock:
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'fetches': self.fetches,
+            'evictions': self.evictions,
+            'bytes': self._size,
+            'max_bytes': self.max_bytes,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store configured from AVATARS"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            fetcher = avatar_setting('FETCHER')
+            if isinstance(fetcher, str):
+                fetcher = import_string(fetcher)()
+            _store = AvatarStore(
+                avatar_setting('CACHE_DIR'),
+                fetcher,
+                max_bytes=avatar_setting('MAX_BYTES'),
+                sizes=avatar_setting('SIZES'),
+                source_hosts=avatar_setting('SOURCE_HOSTS'),
+                failure_ttl=avatar_setting('FAILURE_TTL'),
+            )
+        return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'AVATARS':
+        _store = None
+
+
+@require_safe
+def serve_avatar(request, name):
+    """A thumbnail by the file name AvatarStore.thumbnail returned; its content never changes"""
+    if not THUMBNAIL_NAME_RE.fullmatch(name):
+        return HttpResponseNotFound()
+    store = get_store()
+    if not store.touch(name):
+        response = HttpResponseNotFound()
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    content_type = CONTENT_TYPES[name.rsplit('.', 1)[1]]
+    header = avatar_setting('SENDFILE_HEADER')
+    if header:
+        # The front server sends the file; Django only checks it exists
+        response = HttpResponse(content_type=content_type)
+        response[header] = avatar_setting('SENDFILE_PREFIX') + name if header == 'X-Accel-Redirect' else store.path(name)
+    else:
+        try:
+            response = FileResponse(open(store.path(name), 'rb'), content_type=content_type)
+        except FileNotFoundError:
+            return HttpResponseNotFound()
+    response['Cache-Control'] = IMMUTABLE
+    return response
+
+
+@checks.register()
+def check_pillow(app_configs, **kwargs):
+    if importlib.util.find_spec('PIL') is None:
+        return [checks.Warning(
+            'Pillow is not installed, so avatars are served at their original size.',
+            hint='pip install Pillow',
+            id='accounts.W001',
+        )]
+    return []
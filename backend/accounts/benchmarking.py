@@ -0,0 +1,152 @@
+"""
+Helpers shared by the benchmark management commands (loadtest and friends).
+Everything here runs against a throwaway database, never the configured one.
+"""
+import math
+import os
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.utils import timezone
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_samples))
+    return sorted_samples[min(max(rank, 1), len(sorted_samples)) - 1]
+
+
+def summarize(latencies, wall_time, errors=0):
+    """Throughput and latency percentiles (milliseconds) for one endpoint"""
+    samples = sorted(latencies)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'wall_seconds': round(wall_time, 4),
+        'throughput_rps': round(len(samples) / wall_time, 2) if wall_time else 0.0,
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else 0.0,
+    }
+
+
+def timed(fn, repeat):
+    """Run fn repeat times; return per-call latencies in seconds"""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def environment_info():
+    """Settings that matter when comparing runs, plus the current commit"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'db_engine': settings.DATABASES['default']['ENGINE'],
+        'password_hasher': settings.PASSWORD_HASHERS[0],
+        'auth_user_cache': getattr(settings, 'AUTH_USER_CACHE', {}).get('ENABLED', True),
+        'profile_claims': getattr(settings, 'AUTH_PROFILE_CLAIMS', False),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def seed_users(rows, batch_size=5000):
+    """
+    Bulk-insert rows users with unusable passwords. Every row gets its own
+    creation time, one millisecond apart, as real signups have; auto_now_add
+    would overwrite it, so it is switched off while seeding.
+    """
+    from .models import CustomUser
+
+    field = CustomUser._meta.get_field('created_at')
+    start_time = timezone.now() - timedelta(milliseconds=rows)
+    field.auto_now_add = False
+    try:
+        for start in range(0, rows, batch_size):
+            CustomUser.objects.bulk_create(
+                CustomUser(
+                    email=f'user{i}@example.com',
+                    username=f'user{i}',
+                    full_name=f'User {i}',
+                    role='HOST' if i % 10 == 0 else 'CANDIDATE',
+                    password='!',
+                    created_at=start_time + timedelta(milliseconds=i),
+                )
+                for i in range(start, min(start + batch_size, rows))
+            )
+    finally:
+        field.auto_now_add = True
+
+
+@contextmanager
+def throwaway_database(verbosity=0):
+    """
+    Create a fresh, migrated copy of the default database for the duration of a
+    benchmark. SQLite gets a temporary file so server threads can share it.
+    """
+    connection = connections['default']
+    temp_dir = None
+    if connection.vendor == 'sqlite':
+        temp_dir = tempfile.mkdtemp(prefix='jobmeet-bench-')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        if temp_dir:
+            for name in os.listdir(temp_dir):
+                os.remove(os.path.join(temp_dir, name))
+            os.rmdir(temp_dir)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BenchmarkServer(ThreadedWSGIServer):
+    # The default backlog of 10 resets connections at a few hundred concurrent clients
+    request_queue_size = 1024
+
+
+@contextmanager
+def local_server(application=None):
+    """Serve the WSGI application on a free localhost port; yields the base URL"""
+    server = BenchmarkServer(('127.0.0.1', 0), QuietRequestHandler)
+    server.set_app(application or get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield f'http://{host}:{port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
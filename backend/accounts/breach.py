@@ -0,0 +1,143 @@
+"""
+Offline breached-password check.
+
+The build_breach_filter command turns a local list of SHA-1 password hashes
+(the "HASH:count" format of public breach corpora) into a Bloom filter file.
+BreachedPasswordValidator memory-maps that file read-only, so every worker
+process on the host shares the same page cache copy instead of loading its
+own, and a lookup is one SHA-1 plus a handful of byte reads. Rebuilding
+replaces the file atomically; running processes keep using the filter they
+mapped until they restart.
+
+A Bloom filter has no false negatives: every listed password is rejected,
+and a few unlisted ones are too, at the rate the filter was built for.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+
+MAGIC = b'JMBF'
+VERSION = 1
+# magic, version, hashes, size in bits, items
+HEADER = struct.Struct('<4sHHQQ')
+
+
+def filter_size(capacity, error_rate):
+    """(bits, hashes) for a Bloom filter holding capacity items at error_rate"""
+    capacity = max(capacity, 1)
+    size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+    hashes = max(int(round(size / capacity * math.log(2))), 1)
+    return size, hashes
+
+
+def positions(digest, size, hashes):
+    # The digest is already uniformly distributed; split it for Kirsch-Mitzenmacher double hashing
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:16], 'little') | 1
+    return ((h1 + i * h2) % size for i in range(hashes))
+
+
+class BreachFilter:
+    """Read-only, memory-mapped Bloom filter over SHA-1 digests"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.hashes, self.size, self.count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a breached-password filter')
+        if len(self._map) < HEADER.size + (self.size + 7) // 8:
+            self._map.close()
+            raise ValueError(f'{path} is truncated')
+        self.path = path
+
+    def __contains__(self, digest):
+        bits = self._map
+        return all(bits[HEADER.size + (p >> 3)] & (1 << (p & 7)) for p in positions(digest, self.size, self.hashes))
+
+    def contains_password(self, password):
+        return hashlib.sha1(password.encode()).digest() in self
+
+    @property
+    def false_positive_rate(self):
+        """Expected rate for the number of items actually added"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def close(self):
+        self._map.close()
+
+
+class BreachFilterWriter:
+    """
+    Builds a filter file in place through a writable memory map, so building
+    needs no more RAM than the page cache is willing to give it. The file
+    only appears at path once close() succeeds.
+    """
+
+    def __init__(self, path, capacity, error_rate):
+        self.path = path
+        self.size, self.hashes = filter_size(capacity, error_rate)
+        self.count = 0
+        self._temp_path = f'{path}.partial'
+        self._file = open(self._temp_path, 'w+b')
+        self._file.truncate(HEADER.size + (self.size + 7) // 8)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def add(self, digest):
+        bits = self._map
+        for p in positions(digest, self.size, self.hashes):
+            bits[HEADER.size + (p >> 3)] |= 1 << (p & 7)
+        self.count += 1
+
+    def close(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.hashes, self.size, self.count)
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        self._map.close()
+        self._file.close()
+        os.remove(self._temp_path)
+
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def get_filter(path):
+    """One mapping per file per process"""
+    with _filters_lock:
+        if path not in _filters:
+            _filters[path] = BreachFilter(path)
+        return _filters[path]
+
+
+class BreachedPasswordValidator:
+    """
+    Reject passwords found in the breach filter at `path`
+    (see the build_breach_filter command).
+    """
+
+    def __init__(self, path=None):
+        if not path:
+            raise ImproperlyConfigured('BreachedPasswordValidator needs the path of a filter file')
+        self.path = os.fspath(path)
+        self.filter = get_filter(self.path)
+
+    def validate(self, password, user=None):
+        if self.filter.contains_password(password):
+            raise ValidationError(
+                'This password has appeared in a data breach and cannot be used.',
+                code='password_breached',
+            )
+
+    def get_help_text(self):
+        return 'Your password can’t be one that has appeared in a known data breach.'
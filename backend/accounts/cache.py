@@ -0,0 +1,423 @@
+"""
+Caching helpers for the accounts app: an in-process LRU, and TieredCache,
+which puts one in front of a cache shared by every worker
+"""
+import hashlib
+import logging
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-entry expiry.
+    Keeps hit/miss/eviction counters so the cache can be sized from real traffic.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        Store value under key. The entry lives for ttl seconds (the cache default
+        if omitted), but never past the absolute expires_at timestamp when given.
+        """
+        if self.max_entries <= 0:
+            return
+        deadline = time.time() + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self._lock:
+            self._data[key] = (value, deadline)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Snapshot of the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+MISSING = object()
+
+
+def tiered_cache_setting(name):
+    defaults = {
+        'ALIAS': 'default',  # Django cache every worker shares
+        'SYNC_INTERVAL': 1,  # seconds between checks for other workers' invalidations
+        'LOCK_TIMEOUT': 5,  # seconds a compute lease is held at most, and waited for
+        'LOG_SIZE': 1000,  # invalidations a worker may fall behind before it drops its whole local tier
+    }
+    return getattr(settings, 'TIERED_CACHE', {}).get(name, defaults[name])
+
+
+# Invalidations older than this may be gone; a worker that missed them drops its local tier
+LOG_TTL = 5 * 60
+
+
+class TieredCache:
+    """
+    One namespace of keys in two tiers: a small in-process LRU (local) in
+    front of the Django cache TIERED_CACHE['ALIAS'] that all workers share.
+
+    Shared keys are "<namespace>:<database>:<version>:<generation>:<key>".
+    The database part (a digest of the default database's name) keeps test
+    runs and benchmarks, which create their own database, apart from a server
+    on the same host. Bump version when the cached values change shape, so old
+    and new code never read each other's entries; clear() starts a new
+    generation, which orphans every entry of the namespace at once.
+
+    delete() and clear() reach the local tier of every worker: deletions go
+    into an invalidation log in the shared tier that each worker replays on
+    its first lookup after SYNC_INTERVAL. A worker that cannot replay the log
+    completely drops its whole local tier instead.
+
+    get_or_set() computes a missing value once per process; with lease=True
+    also once across processes, the others waiting for it in the shared tier.
+    With shared=False only the local tier is used, for values cheaper to
+    recompute than to fetch. Shared tier failures are logged and count as misses.
+    """
+
+    def __init__(self, namespace, version=1, max_entries=1024, ttl=300, shared=True, lease=False):
+        self.namespace = namespace
+        self.version = version
+        self.ttl = ttl
+        self.shared = shared
+        self.lease = lease
+        self.local = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._flights = {}  # key -> (lock, threads using it)
+        self._flights_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._next_sync = 0
+        self._database = None
+        self._scope = None
+        self._generation = None
+        self._seen = None  # last invalidation replayed
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def backend(self):
+        return caches[tiered_cache_setting('ALIAS')]
+
+    def _meta_key(self, name):
+        return f'{self.namespace}:{self._scope}:{name}'
+
+    def _shared_key(self, key):
+        return f'{self.namespace}:{self._scope}:{self.version}:{self._generation}:{key}'
+
+    def _shared_ready(self):
+        """Whether the shared tier can be used, replaying invalidations when due"""
+        if not self.shared:
+            return False
+        database = settings.DATABASES['default']['NAME']
+        if database != self._database:
+            self._next_sync = 0
+        self._sync()
+        return self._generation is not None and database == self._database
+
+    def _use_database(self, database):
+        if database != self._database:
+            # Another database (a test run starting, say): none of the entries apply
+            self.local.clear()
+            self._database, self._generation, self._seen = database, None, None
+            self._scope = hashlib.blake2b(str(database).encode(), digest_size=4).hexdigest()
+
+    def _sync(self):
+        if time.monotonic() < self._next_sync or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = time.monotonic() + tiered_cache_setting('SYNC_INTERVAL')
+            self._use_database(settings.DATABASES['default']['NAME'])
+            generation_key, seq_key = self._meta_key('generation'), self._meta_key('seq')
+            state = self.backend.get_many([generation_key, seq_key])
+            generation, seq = state.get(generation_key), state.get(seq_key, 0)
+            if generation is None:
+                # Never reuse a number: entries of a lost counter must stay unreachable
+                self.backend.add(generation_key, time.time_ns(), timeout=None)
+                generation = self.backend.get(generation_key)
+
+            if generation != self._generation:
+                self.local.clear()
+                self._generation = generation
+            elif seq != self._seen:
+                self._replay(self._seen, seq)
+            self._seen = seq
+        except Exception as e:
+            logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+        finally:
+            self._sync_lock.release()
+
+    def _replay(self, seen, seq):
+        if seq < seen or seq - seen > tiered_cache_setting('LOG_SIZE'):
+            self.local.clear()
+            return
+        keys = [self._meta_key(f'inv:{n}') for n in range(seen + 1, seq + 1)]
+        entries = self.backend.get_many(keys)
+        self.invalidations += len(keys)
+        if len(entries) < len(keys):
+            # Expired, or still being written: drop everything rather than miss one
+            self.local.clear()
+            return
+        for key in entries.values():
+            self.local.delete(key)
+
+    def _lookup(self, key):
+        """(value or MISSING, tier that had it)"""
+        shared = self._shared_ready()
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value, 'local'
+        if not shared:
+            return MISSING, None
+        try:
+            entry = self.backend.get(self._shared_key(key))
+        except Exception as e:
+            logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+            return MISSING, None
+        if entry is None:
+            return MISSING, None
+        value, expires_at = entry
+        self.local.set(key, value, expires_at=expires_at)
+        return value, 'shared'
+
+    def get(self, key, default=None):
+        value, tier = self._lookup(key)
+        if tier == 'local':
+            self.local_hits += 1
+        elif tier == 'shared':
+            self.shared_hits += 1
+        else:
+            self.misses += 1
+            return default
+        return value
+
+    def peek(self, key, default=None):
+        """get() without counting the lookup"""
+        value, _ = self._lookup(key)
+        return default if value is MISSING else value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Store value in both tiers for ttl seconds, but never past expires_at when given"""
+        deadline = time.time() + (self.ttl if ttl is None else ttl)
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        self.local.set(key, value, expires_at=deadline)
+        timeout = deadline - time.time()
+        if timeout <= 0 or not self._shared_ready():
+            return
+        try:
+            self.backend.set(self._shared_key(key), (value, deadline), timeout=timeout)
+        except Exception as e:
+            logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+
+    def get_or_set(self, key, compute, ttl=None, expires_at=None):
+        """Cached value of key, else compute() stored as set() would"""
+        value = self.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        with self.lock(key):
+            value = self.peek(key, MISSING)
+            if value is MISSING:
+                value = compute()
+                self.set(key, value, ttl=ttl, expires_at=expires_at)
+        return value
+
+    def delete(self, key):
+        """Drop key from both tiers, and from every other worker's local tier"""
+        self.local.delete(key)
+        if not self._shared_ready():
+            return
+        try:
+            self.backend.delete(self._shared_key(key))
+            self._broadcast(key)
+        except Exception as e:
+            logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+
+    def _broadcast(self, key):
+        seq_key = self._meta_key('seq')
+        for _ in range(3):
+            self.backend.add(seq_key, 0, timeout=None)
+            try:
+                seq = self.backend.incr(seq_key)
+            except ValueError:
+                # Evicted between add() and incr()
+                continue
+            # add() rather than set(): caches without an atomic incr can hand out a number twice
+            if self.backend.add(self._meta_key(f'inv:{seq}'), key, timeout=LOG_TTL):
+                return
+        self.clear()
+
+    def clear(self):
+        """Drop every entry of the namespace, in every worker"""
+        self.local.clear()
+        if not self.shared:
+            return
+        self._use_database(settings.DATABASES['default']['NAME'])
+        try:
+            self.backend.set(self._meta_key('generation'), time.time_ns(), timeout=None)
+        except Exception as e:
+            logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+        self._next_sync = 0
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Single flight for key: one thread per process holds it at a time and,
+        with lease=True, one process, for up to LOCK_TIMEOUT seconds
+        """
+        with self._flights_lock:
+            lock, users = self._flights.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self._flights[key] = (lock, users + 1)
+        try:
+            with lock:
+                if self.lease and self._shared_ready():
+                    with self._lease(key):
+                        yield
+                else:
+                    yield
+        finally:
+            with self._flights_lock:
+                lock, users = self._flights[key]
+                if users == 1:
+                    del self._flights[key]
+                else:
+                    self._flights[key] = (lock, users - 1)
+
+    @contextmanager
+    def _lease(self, key):
+        lease_key = self._meta_key(f'lease:{key}')
+        timeout = tiered_cache_setting('LOCK_TIMEOUT')
+        deadline = time.monotonic() + timeout
+        acquired = False
+        try:
+            while not (acquired := self.backend.add(lease_key, os.getpid(), timeout=timeout)):
+                if time.monotonic() >= deadline:
+                    # The holder is stuck or gone; compute anyway
+                    break
+                time.sleep(0.01)
+        except Exception as e:
+            logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    self.backend.delete(lease_key)
+                except Exception as e:
+                    logger.warning('Shared tier of the %s cache is unavailable: %s', self.namespace, e)
+
+    def stats(self):
+        """Counters of this process; hit_ratio counts hits in either tier"""
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'hits': self.local_hits + self.shared_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'evictions': self.local.evictions,
+            'size': len(self.local),
+            'max_entries': self.local.max_entries,
+            'hit_ratio': (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+            'local_hit_ratio': self.local_hits / lookups if lookups else 0.0,
+        }
+
+
+namespaces = {}
+
+
+def tiered_cache(namespace, **options):
+    """The process-wide TieredCache of namespace, created on first use"""
+    if namespace not in namespaces:
+        namespaces[namespace] = TieredCache(namespace, **options)
+    return namespaces[namespace]
+
+
+def cache_stats():
+    """stats() of every namespace in use"""
+    return {namespace: cache.stats() for namespace, cache in sorted(namespaces.items())}
+
+
+class PrivateFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that only uses a directory this process's user owns and
+    nobody else can enter. Entries are pickles, loaded as code, and hold user
+    rows with their password hashes, so a directory someone else created
+    first (easy under /tmp) is refused rather than read from.
+    """
+
+    def _createdir(self):
+        super()._createdir()
+        self._check_dir()
+
+    def _key_to_file(self, key, version=None):
+        # The directory may have been removed and recreated by someone else since
+        if os.path.lexists(self._dir):
+            self._check_dir()
+        return super()._key_to_file(key, version)
+
+    def _check_dir(self):
+        info = os.lstat(self._dir)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise ImproperlyConfigured(
+                f'Cache directory {self._dir} must be a directory owned by this user with mode 0700'
+            )
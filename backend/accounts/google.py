@@ -0,0 +1,327 @@
+"""
+Google ID token verification with a shared, TTL-respecting signing-key cache.
+
+google-auth (and the requests/urllib3 stack under it) is imported on first
+use, not at module load: it is most of the import time of the auth views,
+and most workers never see a Google sign-in before they are recycled.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .cache import tiered_cache
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleKeysUnavailable(Exception):
+    """Raised when no usable signing keys can be obtained"""
+
+
+class HTTPKeySource:
+    """Fetches Google's signing certificates over HTTPS"""
+
+    def __init__(self, url=GOOGLE_CERTS_URL):
+        self.url = url
+
+    def fetch(self):
+        """Return a (certs, max_age) pair; max_age is None when the response sets no Cache-Control"""
+        from google.auth import exceptions as google_exceptions
+        from google.auth.transport import requests as google_requests
+
+        with timed('http'):
+            response = google_requests.Request()(url=self.url, method='GET')
+        if response.status != 200:
+            raise google_exceptions.TransportError(
+                f'Could not fetch certificates at {self.url} (HTTP {response.status})'
+            )
+
+        match = MAX_AGE_RE.search(response.headers.get('cache-control', ''))
+        max_age = int(match.group(1)) if match else None
+        return json.loads(response.data.decode('utf-8')), max_age
+
+
+class StaticKeySource:
+    """Serves a fixed certificate set, e.g. from a local fake issuer"""
+
+    def __init__(self, certs, max_age=3600):
+        self.certs = certs
+        self.max_age = max_age
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return dict(self.certs), self.max_age
+
+
+# Certificate sets by source URL, shared by the workers so one fetch serves all of them
+keys_cache = tiered_cache('google_keys', max_entries=8, ttl=5 * 60, lease=True)
+
+
+class SharedKeySource:
+    """
+    Wraps a key source so worker processes share what it fetches. A worker
+    whose set runs out takes the one another worker already fetched, and only
+    fetches itself when there is none or it is the set the worker already has
+    (expired, or missing a rotated key). Sources without a url are not shared.
+    """
+
+    def __init__(self, source, cache=keys_cache):
+        self.source = source
+        self.cache = cache
+        self._seen = None
+
+    def fetch(self):
+        url = getattr(self.source, 'url', None)
+        if url is None:
+            return self.source.fetch()
+
+        entry = self.cache.get(url)
+        if entry is None or entry[2] == self._seen:
+            with self.cache.lock(url):
+                entry = self.cache.peek(url)
+                if entry is None or entry[2] == self._seen:
+                    certs, max_age = self.source.fetch()
+                    max_age = self.cache.ttl if max_age is None else max_age
+                    # (certs, expiry, id of this fetch)
+                    if entry is not None:
+                        # Other workers drop the old set from their local tier too
+                        self.cache.delete(url)
+                    entry = (certs, time.time() + max_age, time.time_ns())
+                    self.cache.set(url, entry, ttl=max_age)
+        self._seen = entry[2]
+        return dict(entry[0]), max(int(entry[1] - time.time()), 0)
+
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens locally against a cached certificate set.
+
+    The certificate set is kept for the max-age Google advertises, refreshed in
+    the background shortly before it expires, and, if Google cannot be reached,
+    the previous set keeps being used for up to max_stale seconds.
+    """
+
+    def __init__(self, audience, key_source=None, refresh_ahead=60, max_stale=60 * 60,
+                 default_max_age=5 * 60, min_refresh_interval=30, clock_skew=10, issuers=None):
+        self.audience = audience
+        self.key_source = key_source or HTTPKeySource()
+        self.refresh_ahead = refresh_ahead
+        self.max_stale = max_stale
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.clock_skew = clock_skew
+        self.issuers = issuers or GOOGLE_ISSUERS
+
+        self._certs = None
+        self._expires_at = 0
+        self._last_attempt = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def verify(self, token):
+        """Return the verified claims of token, raising ValueError if it is not valid"""
+        from google.auth import jwt as google_jwt
+
+        header = google_jwt.decode_header(token)
+        certs = self.get_certs()
+
+        # Google rotated its keys before our copy expired: pick up the new set,
+        # at most once per min_refresh_interval so unknown key ids cannot force fetches
+        if header.get('kid') and header['kid'] not in certs:
+            if time.time() >= self._last_attempt + self.min_refresh_interval:
+                try:
+                    certs = self.refresh()
+                except Exception as e:
+                    logger.warning('Refresh of Google signing keys failed: %s', e)
+
+        idinfo = google_jwt.decode(
+            token, certs=certs, audience=self.audience, clock_skew_in_seconds=self.clock_skew
+        )
+        if idinfo.get('iss') not in self.issuers:
+            raise ValueError(f"Wrong issuer {idinfo.get('iss')!r}")
+        return idinfo
+
+    async def averify(self, token):
+        """
+        verify() for async views. With a fresh key for the token it is pure CPU
+        and runs inline; anything that may fetch certificates runs in a worker
+        thread so the event loop keeps serving other requests.
+        """
+        if self.has_fresh_key(token):
+            return self.verify(token)
+        return await sync_to_async(self.verify, thread_sensitive=False)(token)
+
+    def has_fresh_key(self, token):
+        """Whether verify(token) can run without fetching certificates"""
+        from google.auth import jwt as google_jwt
+
+        certs = self._certs
+        if certs is None or time.time() >= self._expires_at:
+            return False
+        kid = google_jwt.decode_header(token).get('kid')
+        return not kid or kid in certs
+
+    def get_certs(self):
+        now = time.time()
+        certs, expires_at = self._certs, self._expires_at
+
+        if certs is not None and now < expires_at:
+            if now >= expires_at - self.refresh_ahead:
+                self._refresh_in_background()
+            return certs
+
+        stale_ok = certs is not None and now < expires_at + self.max_stale
+        if stale_ok and now < self._last_attempt + self.min_refresh_interval:
+            # A refresh just failed; don't hit Google again on every request
+            return certs
+
+        try:
+            return self.refresh(max_age_floor=0)
+        except Exception as e:
+            if stale_ok:
+                logger.warning('Using stale Google signing keys: %s', e)
+                return certs
+            raise GoogleKeysUnavailable(str(e)) from e
+
+    def refresh(self, max_age_floor=None):
+        """
+        Fetch the certificate set synchronously and store it.
+        With max_age_floor set, a set that another thread refreshed while we
+        waited for the lock and that stays valid that long is reused.
+        """
+        with self._lock:
+            if max_age_floor is not None and self._certs is not None:
+                if time.time() + max_age_floor < self._expires_at:
+                    return self._certs
+
+            self._last_attempt = time.time()
+            certs, max_age = self.key_source.fetch()
+            self._certs = certs
+            self._expires_at = time.time() + (self.default_max_age if max_age is None else max_age)
+            return certs
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning('Background refresh of Google signing keys failed: %s', e)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='google-keys-refresh', daemon=True).start()
+
+
+_verifier = None
+
+
+def get_verifier():
+    """Process-wide verifier configured from GOOGLE_ID_TOKEN_VERIFIER"""
+    global _verifier
+    if _verifier is None:
+        options = dict(getattr(settings, 'GOOGLE_ID_TOKEN_VERIFIER', {}))
+        key_source = options.pop('KEY_SOURCE', None)
+        if isinstance(key_source, str):
+            key_source = import_string(key_source)()
+        _verifier = GoogleTokenVerifier(
+            audience=settings.GOOGLE_OAUTH_CLIENT_ID,
+            key_source=SharedKeySource(key_source or HTTPKeySource()),
+            **{name.lower(): value for name, value in options.items()},
+        )
+    return _verifier
+
+
+@receiver(setting_changed)
+def reset_verifier(setting, **kwargs):
+    global _verifier
+    if setting in ('GOOGLE_ID_TOKEN_VERIFIER', 'GOOGLE_OAUTH_CLIENT_ID'):
+        _verifier = None
+
+
+def verify_google_token(token):
+    return get_verifier().verify(token)
+
+
+async def averify_google_token(token):
+    return await get_verifier().averify(token)
+
+
+class LocalIssuer:
+    """
+    Fake OIDC issuer for tests and benchmarks.
+    Signs Google-shaped ID tokens with a throwaway RSA key and exposes the
+    matching certificate through key_source().
+    """
+
+    def __init__(self, audience, key_id='local-key'):
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+        from google.auth import crypt
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'local-issuer')])
+        now = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=365))
+            .sign(key, hashes.SHA256())
+        )
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+
+        self.audience = audience
+        self.key_id = key_id
+        self.signer = crypt.RSASigner.from_string(private_pem, key_id=key_id)
+        self.certs = {key_id: cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+    def key_source(self, max_age=3600):
+        return StaticKeySource(self.certs, max_age=max_age)
+
+    def issue(self, email, name='', picture='', lifetime=3600, **claims):
+        from google.auth import jwt as google_jwt
+
+        now = int(time.time())
+        payload = {
+            'iss': GOOGLE_ISSUERS[1],
+            'aud': self.audience,
+            'sub': email,
+            'email': email,
+            'email_verified': True,
+            'name': name,
+            'picture': picture,
+            'iat': now,
+            'exp': now + lifetime,
+        }
+        payload.update(claims)
+        return google_jwt.encode(self.signer, payload).decode()
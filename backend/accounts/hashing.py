@@ -0,0 +1,170 @@
+"""
+Bounded executor for password hashing.
+
+Hashing is deliberately slow, so a burst of logins can occupy every request
+worker. All hashing goes through one size-limited pool instead; when both the
+pool and its queue are full, callers fail fast with a 503 and Retry-After.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .metrics import timed
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please try again shortly.'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        # Picked up by DRF's exception handler as the Retry-After header
+        self.wait = wait
+
+
+class HashingPool:
+    """
+    Thread pool with a hard cap on queued work. PBKDF2 and the other built-in
+    hashers release the GIL, so threads give real parallelism here.
+    """
+
+    def __init__(self, max_workers, max_queue=0, retry_after=1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and return its result, or raise HashingUnavailable"""
+        if getattr(self._local, 'inside', False):
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise HashingUnavailable(self.retry_after)
+
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            self._local.inside = True
+            try:
+                return fn(*args)
+            finally:
+                self._local.inside = False
+                self._record(started - submitted, time.perf_counter() - started)
+
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            self._slots.release()
+
+    def _record(self, queue_wait, hash_time):
+        with self._stats_lock:
+            self.completed += 1
+            self.queue_wait_total += queue_wait
+            self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+            self.hash_time_total += hash_time
+            self.hash_time_max = max(self.hash_time_max, hash_time)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'queue_wait_seconds_total': self.queue_wait_total,
+                'queue_wait_seconds_max': self.queue_wait_max,
+                'hash_seconds_total': self.hash_time_total,
+                'hash_seconds_max': self.hash_time_max,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide hashing pool configured from PASSWORD_HASHING_POOL, or None if disabled"""
+    global _pool
+    options = getattr(settings, 'PASSWORD_HASHING_POOL', {})
+    max_workers = options.get('MAX_WORKERS', os.cpu_count() or 1)
+    if not max_workers:
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    max_workers,
+                    max_queue=options.get('MAX_QUEUE', max_workers * 4),
+                    retry_after=options.get('RETRY_AFTER', 1),
+                )
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    global _pool
+    if setting == 'PASSWORD_HASHING_POOL' and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def run_hasher(fn, *args):
+    pool = get_pool()
+    with timed('hash'):
+        if pool is None:
+            return fn(*args)
+        return pool.run(fn, *args)
+
+
+def hash_password(raw_password):
+    """make_password() on the hashing pool"""
+    if raw_password is None:
+        # Unusable password: nothing to hash
+        return make_password(None)
+    return run_hasher(make_password, raw_password)
+
+
+def _verify(raw_password, encoded):
+    must_update = []
+    # The setter only runs for a correct password stored with an outdated hasher
+    is_correct = check_password(raw_password, encoded, setter=lambda raw: must_update.append(True))
+    return is_correct, bool(must_update)
+
+
+def verify_password(raw_password, encoded):
+    """
+    check_password() on the hashing pool.
+    Returns (is_correct, must_update) so the caller can re-hash on its own thread.
+    """
+    return run_hasher(_verify, raw_password, encoded)
+
+
+def hashing_stats():
+    pool = get_pool()
+    return pool.stats() if pool is not None else {}
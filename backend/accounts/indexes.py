@@ -0,0 +1,28 @@
+"""
+Indexes that only exist on PostgreSQL.
+They are declared in Meta.indexes like any other, so the migration state knows
+about them, but other backends (SQLite in development) skip the DDL.
+"""
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+
+
+class PostgresOnlyMixin:
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
+class PostgresIndex(PostgresOnlyMixin, models.Index):
+    """B-tree index, e.g. with a pattern-ops opclass for LIKE 'x%'"""
+
+
+class PostgresGinIndex(PostgresOnlyMixin, GinIndex):
+    """GIN index, e.g. pg_trgm for LIKE '%x%'"""
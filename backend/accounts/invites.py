@@ -0,0 +1,127 @@
+"""
+Bulk interview invitations.
+A host invites many candidates in one request: every invitation is rendered from
+the precompiled interview_invite templates and queued in the outbox, which
+delivers them in batches over one connection each (see accounts.mail).
+
+Invitations go out through the company mail account to addresses the host
+chooses, so each host gets a daily recipient quota and join links may only
+point at JobMeet or an allowed meeting host.
+"""
+from datetime import timedelta
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.template import Context
+from django.utils import timezone
+
+from .mail import render_mail
+from .models import CustomUser, InviteBatch, OutboundEmail
+
+QUOTA_WINDOW = timedelta(days=1)
+
+
+def invite_setting(name):
+    defaults = {
+        'DAILY_RECIPIENTS': 2000,
+        'JOIN_URL_HOSTS': [],
+    }
+    return getattr(settings, 'INVITES', {}).get(name, defaults[name])
+
+
+class InviteQuotaExceeded(Exception):
+    """The host has used up their daily recipients; retry_after is None if the batch can never fit"""
+
+    def __init__(self, retry_after=None):
+        super().__init__('Daily invite quota exceeded')
+        self.retry_after = retry_after
+
+
+def join_url_allowed(url):
+    """Whether invitations may link to url: the frontend's origin, or an https JOIN_URL_HOSTS host"""
+    parts = urlsplit(url)
+    frontend = urlsplit(settings.FRONTEND_URL)
+    if parts.username is not None or parts.password is not None:
+        return False
+    if (parts.scheme, parts.netloc) == (frontend.scheme, frontend.netloc):
+        return True
+    return parts.scheme == 'https' and any(
+        fnmatch(parts.hostname or '', pattern) for pattern in invite_setting('JOIN_URL_HOSTS')
+    )
+
+
+def quota_retry_after(host, count, now):
+    """None if host may invite count more recipients now, else seconds until they may"""
+    limit = invite_setting('DAILY_RECIPIENTS')
+    if count > limit:
+        raise InviteQuotaExceeded()
+    recent = list(
+        InviteBatch.objects.filter(host=host, created_at__gt=now - QUOTA_WINDOW)
+        .order_by('created_at').values_list('created_at', 'total')
+    )
+    used = sum(total for _, total in recent)
+    if used + count <= limit:
+        return None
+    # Wait until enough of the oldest batches have left the window
+    for created_at, total in recent:
+        used -= total
+        if used + count <= limit:
+            return max((created_at + QUOTA_WINDOW - now).total_seconds(), 1)
+
+
+def create_invite_batch(host, title, recipients, message='', join_url='', scheduled_at=None):
+    """
+    Queue an invitation for each (email, name) in recipients and return the batch.
+    Raises InviteQuotaExceeded when it would take the host past DAILY_RECIPIENTS.
+    """
+    # Values shared by every invitation are put on the context once; only the name changes
+    context = Context({
+        'host_name': host.full_name or host.email,
+        'title': title,
+        'message': message,
+        'join_url': join_url or settings.FRONTEND_URL,
+        'scheduled_at': scheduled_at,
+    })
+    rows = []
+    for email, name in recipients:
+        with context.push(name=name):
+            subject, body, html_body = render_mail('interview_invite', context)
+        rows.append(OutboundEmail(
+            to_email=email,
+            from_email=settings.EMAIL_HOST_USER or '',
+            subject=subject,
+            body=body,
+            html_body=html_body,
+        ))
+
+    with transaction.atomic():
+        # Concurrent requests of one host take turns, so together they can't exceed the quota
+        list(CustomUser.objects.select_for_update().filter(pk=host.pk).values_list('pk'))
+        retry_after = quota_retry_after(host, len(rows), timezone.now())
+        if retry_after is not None:
+            raise InviteQuotaExceeded(retry_after)
+        batch = InviteBatch.objects.create(host=host, title=title, scheduled_at=scheduled_at, total=len(rows))
+        for row in rows:
+            row.batch = batch
+        OutboundEmail.objects.bulk_create(rows, batch_size=500)
+    return batch
+
+
+def batch_progress(batch):
+    """Delivery progress of an invite batch, counted from its outbox rows in one query"""
+    counts = dict(batch.emails.order_by().values_list('status').annotate(count=Count('pk')))
+    pending = counts.get('PENDING', 0)
+    return {
+        'id': batch.pk,
+        'title': batch.title,
+        'scheduled_at': batch.scheduled_at,
+        'total': batch.total,
+        'pending': pending,
+        'sent': counts.get('SENT', 0),
+        'failed': counts.get('DEAD', 0),
+        'done': pending == 0,
+        'created_at': batch.created_at,
+    }
@@ -0,0 +1,172 @@
+"""
+Transactional email outbox.
+Request handlers enqueue messages; the send_outbox command delivers them in batches.
+"""
+import functools
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.template import Context
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_setting(name):
+    defaults = {
+        'BATCH_SIZE': 50,
+        'MAX_ATTEMPTS': 5,
+        'BACKOFF_BASE': 30,  # seconds, doubled after every failed attempt
+        'BACKOFF_MAX': 60 * 60,
+        'LEASE': 5 * 60,  # seconds a claimed row is hidden from other workers
+    }
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(name, defaults[name])
+
+
+@functools.cache
+def mail_templates(name):
+    """
+    Compiled subject, plain-text and HTML templates of accounts/email/<name>.*,
+    looked up and parsed once per process rather than once per message
+    """
+    return tuple(
+        get_template(f'accounts/email/{name}.{suffix}').template
+        for suffix in ('subject.txt', 'txt', 'html')
+    )
+
+
+@receiver(setting_changed)
+def reset_mail_templates(setting, **kwargs):
+    if setting == 'TEMPLATES':
+        mail_templates.cache_clear()
+
+
+def render_mail(name, context):
+    """
+    (subject, text body, HTML body) of email name. context is a dict, or a
+    Context that callers rendering many messages push per-recipient values on.
+    """
+    if not isinstance(context, Context):
+        context = Context(context)
+    subject, text, html = mail_templates(name)
+    # Subjects are a single line whatever the template's whitespace
+    return ' '.join(subject.render(context).split()), text.render(context), html.render(context)
+
+
+def enqueue_mail(subject, to_email, body='', html_body='', from_email=None):
+    """Queue a message for delivery and return the outbox row"""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        to_email=to_email,
+        from_email=from_email or '',
+        body=body,
+        html_body=html_body,
+    )
+
+
+async def aenqueue_mail(subject, to_email, body='', html_body='', from_email=None):
+    """enqueue_mail() for async views"""
+    return await OutboundEmail.objects.acreate(
+        subject=subject,
+        to_email=to_email,
+        from_email=from_email or '',
+        body=body,
+        html_body=html_body,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff delay (in seconds) after the given number of failed attempts"""
+    return min(outbox_setting('BACKOFF_BASE') * 2 ** (attempts - 1), outbox_setting('BACKOFF_MAX'))
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to batch_size due messages by pushing their next attempt past the lease.
+    A worker that dies mid-batch therefore only delays those rows, it never loses them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if rows:
+            OutboundEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=outbox_setting('LEASE'))
+            )
+    return rows
+
+
+def build_message(row, connection):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=row.from_email or None,
+        to=[row.to_email],
+        connection=connection,
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    return message
+
+
+def deliver_batch(batch_size=None, connection=None):
+    """
+    Deliver one batch of due messages over a single mail connection.
+    Returns a dict with the number of sent, retried and dead-lettered messages.
+    """
+    rows = claim_batch(batch_size or outbox_setting('BATCH_SIZE'))
+    result = {'sent': 0, 'retried': 0, 'dead': 0}
+    if not rows:
+        return result
+
+    connection = connection or get_connection()
+    max_attempts = outbox_setting('MAX_ATTEMPTS')
+    sent = []
+    try:
+        for row in rows:
+            row.attempts += 1
+            try:
+                # No-op while the connection is healthy; reconnects after a failure
+                connection.open()
+                build_message(row, connection).send()
+            except Exception as e:
+                # Drop the (possibly broken) connection; the next send reopens it
+                connection.close()
+                row.last_error = str(e)
+                if row.attempts >= max_attempts:
+                    row.status = 'DEAD'
+                    # Bodies can hold live links (password reset); never keep them past delivery
+                    row.body = row.html_body = ''
+                    result['dead'] += 1
+                    logger.error('Outbox message %s dead after %s attempts: %s', row.pk, row.attempts, e)
+                else:
+                    row.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(row.attempts))
+                    result['retried'] += 1
+                    logger.warning('Outbox message %s failed (attempt %s): %s', row.pk, row.attempts, e)
+                row.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'body', 'html_body'])
+            else:
+                sent.append(row.pk)
+                result['sent'] += 1
+    finally:
+        connection.close()
+        # Delivered rows are recorded with one write per batch rather than one per message.
+        # Rows not reached (the worker died) stay claimed until the lease ends, then go out again.
+        if sent:
+            OutboundEmail.objects.filter(pk__in=sent).update(
+                status='SENT', attempts=F('attempts') + 1, last_error='', sent_at=timezone.now(),
+                body='', html_body='',
+            )
+
+    return result
@@ -0,0 +1,82 @@
+import json
+
+from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from accounts.admin import UserAdmin
+from accounts.benchmarking import environment_info, seed_users, summarize, timed, throwaway_database
+from accounts.models import CustomUser
+
+CHANGELIST = '/admin/accounts/customuser/'
+SCENARIOS = {
+    'first_page': {},
+    'deep_page': {'p': '50'},
+    'filter_role': {'role__exact': 'HOST'},
+    'search_exact_email': {'q': 'user{mid}@example.com'},
+    'search_name_prefix': {'q': 'User {mid}'},
+}
+
+
+class StockUserAdmin(UserAdmin):
+    """The changelist configuration before the large-table changes, for comparison"""
+    paginator = Paginator
+    show_full_result_count = True
+
+    def get_queryset(self, request):
+        return BaseUserAdmin.get_queryset(self, request)
+
+    def get_search_results(self, request, queryset, search_term):
+        return BaseUserAdmin.get_search_results(self, request, queryset, search_term)
+
+
+class Command(BaseCommand):
+    help = 'Measure admin changelist latency and query counts for users on a seeded table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Users to seed')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed loads per scenario')
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False), throwaway_database():
+            seed_users(options['rows'])
+            superuser = CustomUser.objects.create_superuser('admin@example.com', 'unused', full_name='Admin')
+            client = Client()
+            client.force_login(superuser)
+            mid = options['rows'] // 2
+
+            results = {}
+            for label, admin_class in (('stock', StockUserAdmin), ('current', UserAdmin)):
+                admin.site._registry[CustomUser] = admin_class(CustomUser, admin.site)
+                results[label] = {
+                    name: self.measure(client, {k: v.format(mid=mid) for k, v in params.items()},
+                                       options['repeat'])
+                    for name, params in SCENARIOS.items()
+                }
+            admin.site._registry[CustomUser] = UserAdmin(CustomUser, admin.site)
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {'rows': options['rows']},
+            'results': results,
+        }, indent=2))
+
+    def measure(self, client, params, repeat):
+        queries = []
+
+        def record(execute, sql, params_, many, context):
+            queries.append(sql)
+            return execute(sql, params_, many, context)
+
+        # execute_wrapper survives the reconnects between requests, unlike the debug query log
+        with connection.execute_wrapper(record):
+            response = client.get(CHANGELIST, params)
+        assert response.status_code == 200, response.status_code
+
+        report = summarize(timed(lambda: client.get(CHANGELIST, params), repeat), 0)
+        report['queries'] = len(queries)
+        return report
@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from accounts.benchmarking import environment_info, summarize, throwaway_database
+from accounts.google import LocalIssuer
+from accounts.models import CustomUser
+from accounts.tokens import tokens_for_user
+from accounts.urls import auth_urlpatterns
+
+ENDPOINTS = ['user', 'logout', 'password-reset', 'google']
+MODES = {
+    # mode: (ASGI handler, native async views)
+    'wsgi': (False, False),
+    'asgi-sync': (True, False),
+    'asgi': (True, True),
+}
+
+
+class URLConf:
+
+    def __init__(self, async_views):
+        self.urlpatterns = [path('api/auth/', include(auth_urlpatterns(async_views)))]
+
+
+class Command(BaseCommand):
+    help = ('Compare requests/sec of one worker serving the auth views under WSGI (sync views), '
+            'ASGI with the sync views, and ASGI with the native async views')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of users to seed')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='In-flight requests on the ASGI event loop')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Threads of the WSGI worker (1 = a sync worker)')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help=f'Comma-separated subset of: {", ".join(ENDPOINTS)}')
+        parser.add_argument('--modes', default=','.join(MODES),
+                            help=f'Comma-separated subset of: {", ".join(MODES)}')
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        modes = [name.strip() for name in options['modes'].split(',') if name.strip()]
+        unknown = (set(endpoints) - set(ENDPOINTS)) | (set(modes) - set(MODES))
+        if unknown:
+            raise CommandError(f'Unknown endpoints or modes: {", ".join(sorted(unknown))}')
+
+        self.issuer = LocalIssuer(audience='bench-client')
+        overrides = {
+            # The in-process clients send Host: testserver
+            'ALLOWED_HOSTS': ['testserver'],
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'GOOGLE_OAUTH_CLIENT_ID': 'bench-client',
+            'GOOGLE_ID_TOKEN_VERIFIER': {'KEY_SOURCE': self.issuer.key_source()},
+            'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+        }
+
+        with override_settings(**overrides), throwaway_database():
+            password = make_password(None)
+            CustomUser.objects.bulk_create(
+                CustomUser(email=f'bench{i}@example.com', username=f'bench{i}',
+                           full_name=f'Bench {i}', password=password)
+                for i in range(options['users'])
+            )
+            self.access_tokens = [
+                str(tokens_for_user(user).access_token) for user in CustomUser.objects.order_by('id')
+            ]
+
+            results = {}
+            for name in endpoints:
+                results[name] = {}
+                for mode in modes:
+                    use_asgi, async_views = MODES[mode]
+                    with override_settings(ROOT_URLCONF=URLConf(async_views)):
+                        if use_asgi:
+                            run = asyncio.run(self.run_asgi(name, options['requests'], options['concurrency']))
+                        else:
+                            run = self.run_wsgi(name, options['requests'], options['threads'])
+                    results[name][mode] = summarize(*run)
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {
+                'users': options['users'],
+                'requests': options['requests'],
+                'asgi_concurrency': options['concurrency'],
+                'wsgi_threads': options['threads'],
+            },
+            'endpoints': results,
+        }, indent=2))
+
+    def run_wsgi(self, name, total, threads):
+        counter = itertools.count()
+        latencies, errors = [], []
+
+        def worker(slot):
+            client = Client()
+            while (i := next(counter)) < total:
+                method, url, payload = self.build_request(name, i)
+                client.cookies['access_token'] = self.access_tokens[i % len(self.access_tokens)]
+                started = time.perf_counter()
+                response = getattr(client, method)(url, payload, content_type='application/json')
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, range(threads)))
+        return latencies, time.perf_counter() - started, len(errors)
+
+    async def run_asgi(self, name, total, concurrency):
+        counter = itertools.count()
+        latencies, errors = [], []
+
+        async def worker():
+            client = AsyncClient()
+            while (i := next(counter)) < total:
+                method, url, payload = self.build_request(name, i)
+                client.cookies['access_token'] = self.access_tokens[i % len(self.access_tokens)]
+                started = time.perf_counter()
+                response = await getattr(client, method)(url, payload, content_type='application/json')
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - started, len(errors)
+
+    def build_request(self, name, i):
+        email = f'bench{i % len(self.access_tokens)}@example.com'
+        if name == 'user':
+            return 'get', '/api/auth/user/', None
+        if name == 'logout':
+            return 'post', '/api/auth/logout/', None
+        if name == 'password-reset':
+            return 'post', '/api/auth/password-reset/', {'email': email}
+        # google: alternate between existing and new accounts
+        if i % 2:
+            email = f'google{i}@example.com'
+        return 'post', '/api/auth/google/', {'access_token': self.issuer.issue(email, name='Google User')}
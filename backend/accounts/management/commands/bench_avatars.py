@@ -0,0 +1,171 @@
+import http.client
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.avatars import get_store, pillow
+from accounts.benchmarking import environment_info, local_server, summarize, throwaway_database
+from accounts.models import CustomUser
+
+
+def source_image(i):
+    """A distinct full-size photo (noise compresses about as badly as a real one)"""
+    modules = pillow()
+    if modules is None:
+        return b'\xff\xd8\xff' + os.urandom(250 * 1024)
+    Image, _ = modules
+    image = Image.effect_noise((1024, 1024), 48 + i % 16).convert('RGB')
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+@contextmanager
+def upstream(images):
+    """Local stand-in for the image host; yields (base URL, request counter)"""
+    requests = {'count': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                requests['count'] += 1
+            body = images.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(body or b'')))
+            self.end_headers()
+            self.wfile.write(body or b'')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield f'http://{host}:{port}', requests
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def get(url, cookies=None):
+    """(status, headers, body bytes) of a GET without following redirects"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    try:
+        headers = {'Cookie': '; '.join(f'{k}={v}' for k, v in cookies.items())} if cookies else {}
+        conn.request('GET', parts.path + (f'?{parts.query}' if parts.query else ''), headers=headers)
+        response = conn.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        conn.close()
+
+
+class Command(BaseCommand):
+    help = ('Avatar proxy against a local server and a local stand-in for the image host: hot-linking '
+            'the full-size source versus the first (fetch and resize) and later redirects to a thumbnail, '
+            'and serving the thumbnail. Checks that concurrent first requests fetch each source once')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Users, each with their own source image')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per warm phase')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Clients; on the cold pass they all ask for the same avatar at once')
+        parser.add_argument('--size', type=int, default=96, help='Thumbnail size to request')
+
+    def handle(self, *args, **options):
+        users, concurrency, size = options['users'], options['concurrency'], options['size']
+        images = {f'/photo-{i}.jpg': source_image(i) for i in range(users)}
+
+        with tempfile.TemporaryDirectory() as cache_dir, upstream(images) as (upstream_url, upstream_requests):
+            overrides = {
+                'ALLOWED_HOSTS': ['127.0.0.1', 'localhost'],
+                'AVATARS': {
+                    **settings.AVATARS, 'CACHE_DIR': cache_dir, 'SOURCE_HOSTS': ['127.0.0.1'],
+                    'FETCHER': 'accounts.avatars.HTTPFetcher', 'SENDFILE_HEADER': '',
+                },
+            }
+            with override_settings(**overrides), throwaway_database():
+                CustomUser.objects.bulk_create(
+                    CustomUser(email=f'avatar{i}@example.com', username=f'avatar{i}', full_name=f'Avatar {i}',
+                               avatar=f'{upstream_url}/photo-{i}.jpg')
+                    for i in range(users)
+                )
+                viewer = CustomUser.objects.first()
+                cookies = {'access_token': str(RefreshToken.for_user(viewer).access_token)}
+                pks = list(CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+
+                with local_server() as base_url:
+                    def avatar(pk):
+                        return get(f'{base_url}/api/auth/users/{pk}/avatar/?size={size}', cookies)
+
+                    report = {
+                        'hotlink': self.run([f'{upstream_url}{path}' for path in images], get, concurrency),
+                    }
+                    upstream_requests['count'] = 0
+                    # Every client asks for the same not yet cached avatar at the same time
+                    report['first_redirect'] = self.run([pk for pk in pks for _ in range(concurrency)],
+                                                        avatar, concurrency)
+                    fetches = upstream_requests['count']
+                    warm = [pks[i % len(pks)] for i in range(options['requests'])]
+                    report['cached_redirect'] = self.run(warm, avatar, concurrency)
+                    locations = {pk: avatar(pk)[1]['Location'] for pk in pks}
+                    report['thumbnail'] = self.run([base_url + locations[pk] for pk in warm], get, concurrency)
+                    stats = get_store().stats()
+
+        thumbnail = report['thumbnail'].pop('bytes')
+        hotlink = report['hotlink'].pop('bytes')
+        report['first_redirect'].pop('bytes')
+        report['cached_redirect'].pop('bytes')
+        checks = {
+            'each_source_fetched_once': fetches == users,
+            'no_errors': not any(phase['errors'] for phase in report.values()),
+        }
+        self.stdout.write(json.dumps({
+            'environment': {**environment_info(), 'pillow': pillow() is not None},
+            'parameters': {'users': users, 'concurrency': concurrency, 'size': size,
+                           'requests': options['requests']},
+            **report,
+            'bytes_per_avatar': {'hotlink': hotlink, 'thumbnail': thumbnail},
+            'upstream_fetches': fetches,
+            'store': stats,
+            'checks': checks,
+            'ok': all(checks.values()),
+        }, indent=2))
+
+    def run(self, items, request, concurrency):
+        latencies, sizes, errors = [], [], 0
+        lock = threading.Lock()
+
+        def one(item):
+            nonlocal errors
+            started = time.perf_counter()
+            status, _, body = request(item)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                sizes.append(len(body))
+                errors += status not in (200, 302)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, items))
+        result = summarize(latencies, time.perf_counter() - started, errors)
+        result['bytes'] = round(sum(sizes) / len(sizes)) if sizes else 0
+        return result
@@ -0,0 +1,200 @@
+import json
+import math
+import socketserver
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.template import Context
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.benchmarking import environment_info, local_server, summarize, throwaway_database
+from accounts.invites import batch_progress
+from accounts.mail import deliver_batch, outbox_setting, render_mail
+from accounts.management.commands.loadtest import Client
+from accounts.models import CustomUser, InviteBatch, OutboundEmail
+
+
+@contextmanager
+def smtp_server(latency=0.0):
+    """
+    Local stand-in for the SMTP relay that accepts everything; yields (port, stats).
+    Every reply waits latency seconds, as a round trip to a real relay would.
+    """
+    stats = {'connections': 0, 'recipients': Counter()}
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, *lines):
+            if latency:
+                time.sleep(latency)
+            self.wfile.write(b''.join(line.encode() + b'\r\n' for line in lines))
+
+        def handle(self):
+            with lock:
+                stats['connections'] += 1
+            self.reply('220 localhost ESMTP')
+            recipients = []
+            while line := self.rfile.readline():
+                verb = line[:4].upper()
+                if verb == b'EHLO':
+                    self.reply('250-localhost', '250 8BITMIME')
+                elif verb == b'RCPT':
+                    recipients.append(line.split(b':', 1)[1].strip(b' <>\r\n').decode())
+                    self.reply('250 OK')
+                elif verb == b'DATA':
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                    while self.rfile.readline() not in (b'.\r\n', b''):
+                        pass
+                    with lock:
+                        stats['recipients'].update(recipients)
+                    recipients = []
+                    self.reply('250 OK')
+                elif verb == b'QUIT':
+                    self.reply('221 Bye')
+                    return
+                else:
+                    # HELO, MAIL, RSET, NOOP
+                    recipients = [] if verb in (b'MAIL', b'RSET') else recipients
+                    self.reply('250 OK')
+
+    class Server(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address[1], stats
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+class Command(BaseCommand):
+    help = ('Bulk interview invites against a local server, a throwaway database and a local SMTP '
+            'stand-in: queueing the invitations through the API, then delivering them one connection '
+            'per message (the old send_mail path) versus through the outbox, one connection per batch. '
+            'Also times rendering from the precompiled templates against render_to_string')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=1000, help='Candidates invited in one request')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Messages per outbox connection (default: EMAIL_OUTBOX BATCH_SIZE)')
+        parser.add_argument('--smtp-latency', type=float, default=0.0,
+                            help='Milliseconds the SMTP stand-in waits before every reply')
+
+    def handle(self, *args, **options):
+        count = options['recipients']
+        batch_size = options['batch_size'] or outbox_setting('BATCH_SIZE')
+        payload = {
+            'title': 'Backend Engineer',
+            'message': 'Please join five minutes early to check your camera and microphone.',
+            'join_url': f'{settings.FRONTEND_URL}/interviews/backend-engineer',
+            'recipients': [
+                {'email': f'candidate{i}@example.com', 'name': f'Candidate {i}'} for i in range(count)
+            ],
+        }
+
+        with smtp_server(options['smtp_latency'] / 1000) as (port, smtp):
+            overrides = {
+                'ALLOWED_HOSTS': ['127.0.0.1', 'localhost'],
+                'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+                'EMAIL_HOST': '127.0.0.1',
+                'EMAIL_PORT': port,
+                'EMAIL_USE_TLS': False,
+                'EMAIL_USE_SSL': False,
+                'EMAIL_HOST_USER': '',
+                'EMAIL_HOST_PASSWORD': '',
+                # Let a single batch of any --recipients fit in the host's daily quota
+                'INVITES': {**settings.INVITES, 'DAILY_RECIPIENTS': max(count, 1)},
+            }
+            with override_settings(**overrides), throwaway_database():
+                host = CustomUser.objects.create_user(
+                    email='host@example.com', password=None, full_name='Bench Host', role='HOST',
+                )
+                render = self.render(host, payload)
+
+                with local_server() as base_url:
+                    client = Client(base_url)
+                    client.cookies['access_token'] = str(RefreshToken.for_user(host).access_token)
+                    started = time.perf_counter()
+                    status = client.request('POST', '/api/auth/invites/', payload)
+                    elapsed = time.perf_counter() - started
+                report = {'enqueue': {**summarize([elapsed], elapsed, int(status != 202)), 'status': status}}
+                rows = list(OutboundEmail.objects.all())
+
+                report['per_message'] = self.deliver(smtp, len(rows), lambda: [
+                    send_mail(row.subject, row.body, row.from_email or None, [row.to_email],
+                              html_message=row.html_body)
+                    for row in rows
+                ])
+                smtp['recipients'].clear()
+                report['outbox'] = self.deliver(smtp, len(rows), lambda: self.drain(batch_size))
+                progress = batch_progress(InviteBatch.objects.get())
+
+        delivered = smtp['recipients']
+        checks = {
+            'enqueued_with_202': status == 202,
+            'one_row_per_recipient': len(rows) == count,
+            'each_recipient_once': len(delivered) == count and set(delivered.values()) == {1},
+            'one_connection_per_batch': report['outbox']['connections'] == math.ceil(count / batch_size),
+            'progress_done': progress['done'] and progress['sent'] == count,
+        }
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {'recipients': count, 'batch_size': batch_size,
+                           'smtp_latency_ms': options['smtp_latency']},
+            'render_us_per_message': render,
+            **report,
+            'checks': checks,
+            'ok': all(checks.values()),
+        }, indent=2))
+
+    def render(self, host, payload):
+        """Microseconds per invitation: precompiled templates versus a lookup per message"""
+        context = {'host_name': host.full_name, 'title': payload['title'], 'message': payload['message'],
+                   'join_url': payload['join_url'], 'scheduled_at': None}
+        names = [recipient['name'] for recipient in payload['recipients']]
+
+        def lookup_each_time():
+            for name in names:
+                for suffix in ('subject.txt', 'txt', 'html'):
+                    render_to_string(f'accounts/email/interview_invite.{suffix}', {**context, 'name': name})
+
+        def precompiled():
+            shared = Context(context)
+            for name in names:
+                with shared.push(name=name):
+                    render_mail('interview_invite', shared)
+
+        result = {}
+        for label, fn in (('render_to_string', lookup_each_time), ('precompiled', precompiled)):
+            started = time.perf_counter()
+            fn()
+            result[label] = round((time.perf_counter() - started) / len(names) * 1e6, 1)
+        return result
+
+    def drain(self, batch_size):
+        while sum(deliver_batch(batch_size).values()) == batch_size:
+            pass
+
+    def deliver(self, smtp, messages, send):
+        connections = smtp['connections']
+        started = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - started
+        return {
+            'messages': messages,
+            'wall_seconds': round(elapsed, 4),
+            'messages_per_second': round(messages / elapsed, 1),
+            'connections': smtp['connections'] - connections,
+        }
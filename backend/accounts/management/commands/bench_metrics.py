@@ -0,0 +1,71 @@
+import json
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from accounts.benchmarking import environment_info, seed_users, summarize, timed, throwaway_database
+from accounts.metrics import timed as metrics_timed
+from accounts.models import CustomUser
+from accounts.tokens import tokens_for_user
+
+MIDDLEWARE = 'accounts.metrics.PerformanceMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of PerformanceMiddleware (absent, disabled, enabled)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode and round')
+        parser.add_argument('--rounds', type=int, default=5,
+                            help='Modes are interleaved over this many rounds to even out drift')
+
+    def handle(self, *args, **options):
+        modes = {
+            'absent': {'MIDDLEWARE': [m for m in settings.MIDDLEWARE if m != MIDDLEWARE]},
+            'disabled': {'PERFORMANCE_METRICS': {**settings.PERFORMANCE_METRICS, 'ENABLED': False}},
+            'enabled': {'PERFORMANCE_METRICS': {**settings.PERFORMANCE_METRICS, 'ENABLED': True,
+                                                'SLOW_REQUEST_MS': 10 ** 9}},
+        }
+
+        with override_settings(ALLOWED_HOSTS=['testserver']), throwaway_database():
+            seed_users(1)
+            access_token = str(tokens_for_user(CustomUser.objects.get()).access_token)
+
+            # A client builds its middleware chain on its first request, so one client per mode
+            clients = {}
+            for mode, overrides in modes.items():
+                with override_settings(**overrides):
+                    clients[mode] = Client()
+                    clients[mode].cookies['access_token'] = access_token
+                    # Warm the token and user caches so the view itself is as cheap as possible
+                    clients[mode].get('/api/auth/user/')
+
+            latencies = {mode: [] for mode in modes}
+            for _ in range(options['rounds']):
+                for mode, overrides in modes.items():
+                    client = clients[mode]
+                    with override_settings(**overrides):
+                        latencies[mode] += timed(lambda: client.get('/api/auth/user/'), options['requests'])
+
+        results = {mode: summarize(samples, sum(samples)) for mode, samples in latencies.items()}
+        baseline = results['absent']['mean_ms']
+        for result in results.values():
+            result['overhead_us'] = round((result['mean_ms'] - baseline) * 1000, 2)
+
+        # Cost of an instrumentation point outside an instrumented request
+        def instrumentation_point():
+            with metrics_timed('hash'):
+                pass
+
+        number = 100000
+        seconds = timeit.timeit(instrumentation_point, number=number)
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {'requests': options['requests'] * options['rounds']},
+            'modes': results,
+            'timed_without_collector_ns': round(seconds / number * 1e9, 1),
+        }, indent=2))
@@ -0,0 +1,73 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from accounts.benchmarking import environment_info, seed_users, summarize, timed, throwaway_database
+from accounts.middleware import ROUTE_MIDDLEWARE
+from accounts.models import CustomUser
+from accounts.tokens import tokens_for_user
+
+PATHS = {
+    'api': '/api/auth/user/',
+    'admin': '/admin/login/',
+}
+
+
+def flat_middleware():
+    """MIDDLEWARE with RouteMiddleware replaced by its DEFAULT list: every path gets the full stack"""
+    middleware = []
+    for path in settings.MIDDLEWARE:
+        middleware += settings.ROUTE_MIDDLEWARE['DEFAULT'] if path == ROUTE_MIDDLEWARE else [path]
+    return middleware
+
+
+class Command(BaseCommand):
+    help = 'Per-request cost of the full middleware stack vs. the per-prefix stacks of RouteMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode, path and round')
+        parser.add_argument('--rounds', type=int, default=5,
+                            help='Modes are interleaved over this many rounds to even out drift')
+
+    def handle(self, *args, **options):
+        modes = {
+            'full': {'MIDDLEWARE': flat_middleware()},
+            'routed': {},
+        }
+
+        with override_settings(ALLOWED_HOSTS=['testserver']), throwaway_database():
+            seed_users(1)
+            access_token = str(tokens_for_user(CustomUser.objects.get()).access_token)
+
+            # A client builds its middleware chain on its first request, so one client per mode
+            clients = {}
+            for mode, overrides in modes.items():
+                with override_settings(**overrides):
+                    clients[mode] = Client()
+                    clients[mode].cookies['access_token'] = access_token
+                    # Warm the token and user caches so the view itself is as cheap as possible
+                    for path in PATHS.values():
+                        clients[mode].get(path)
+
+            latencies = {(name, mode): [] for name in PATHS for mode in modes}
+            for _ in range(options['rounds']):
+                for name, path in PATHS.items():
+                    for mode in modes:
+                        client = clients[mode]
+                        latencies[(name, mode)] += timed(lambda: client.get(path), options['requests'])
+
+        results = {}
+        for name in PATHS:
+            results[name] = {mode: summarize(latencies[(name, mode)], sum(latencies[(name, mode)])) for mode in modes}
+            results[name]['saved_us'] = round(
+                (results[name]['full']['mean_ms'] - results[name]['routed']['mean_ms']) * 1000, 2
+            )
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {'requests': options['requests'] * options['rounds']},
+            'paths': results,
+        }, indent=2))
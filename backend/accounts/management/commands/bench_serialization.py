@@ -0,0 +1,73 @@
+import json
+import statistics
+import tracemalloc
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from accounts.benchmarking import environment_info, timed
+from accounts.models import CustomUser
+from accounts.parsers import FastJSONParser
+from accounts.renderers import FastJSONRenderer
+from accounts.serializers import FastUserSerializer, UserSerializer
+
+
+def peak_bytes(fn):
+    """Peak memory allocated while fn runs (transient allocations included)"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        fn()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = 'Per-response cost and peak allocation of user serialization and JSON rendering/parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20000, help='Timed calls per case')
+
+    def handle(self, *args, **options):
+        user = CustomUser(
+            id=12345, email='jane.doe@example.com', full_name='Jane Doe', phone='+1 555 0100',
+            role='CANDIDATE', avatar='https://lh3.googleusercontent.com/a/photo.jpg',
+            created_at=timezone.now(),
+        )
+        body = json.dumps({'email': 'jane.doe@example.com', 'password': 'S3cure-pass!'}).encode()
+        stock_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+
+        # One login/user response body each
+        cases = {
+            'stock: UserSerializer + JSONRenderer':
+                lambda: stock_renderer.render({'user': UserSerializer(user).data}),
+            'FastUserSerializer + JSONRenderer':
+                lambda: stock_renderer.render({'user': FastUserSerializer(user).data}),
+            'fast: FastUserSerializer + FastJSONRenderer':
+                lambda: fast_renderer.render({'user': FastUserSerializer(user).data}),
+            'parse: JSONParser':
+                lambda: JSONParser().parse(BytesIO(body)),
+            'parse: FastJSONParser':
+                lambda: FastJSONParser().parse(BytesIO(body)),
+        }
+
+        results = {}
+        for name, fn in cases.items():
+            fn()  # warm up
+            latencies = timed(fn, options['repeat'])
+            results[name] = {
+                'mean_us': round(statistics.fmean(latencies) * 1e6, 2),
+                'median_us': round(statistics.median(latencies) * 1e6, 2),
+                'peak_alloc_bytes': peak_bytes(fn),
+            }
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {'repeat': options['repeat']},
+            'cases': results,
+        }, indent=2))
@@ -0,0 +1,102 @@
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from accounts.benchmarking import environment_info, local_server, summarize, throwaway_database
+from accounts.management.commands.loadtest import Client
+from accounts.models import CustomUser
+
+PASSWORD = 'Signup-bench-123'
+
+
+class Command(BaseCommand):
+    help = ('Concurrent signups against a local server and a throwaway database. Emails share local '
+            'parts across domains and every email is submitted twice at once; checks that each email '
+            'ends up as exactly one user and that nothing fails with a server error')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=500, help='Distinct emails to sign up')
+        parser.add_argument('--domains', type=int, default=5,
+                            help='Domains each local part is used with (john@d0.com, john@d1.com, ...)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients')
+        parser.add_argument('--hasher', default=None,
+                            help='Dotted path of the password hasher to use (default: PASSWORD_HASHERS[0])')
+
+    def handle(self, *args, **options):
+        domains = options['domains']
+        emails = [f'user{i // domains}@d{i % domains}.example.com' for i in range(options['emails'])]
+        # Each email twice, the two attempts adjacent so they race each other
+        attempts = [email for email in emails for _ in range(2)]
+
+        overrides = {
+            'ALLOWED_HOSTS': ['127.0.0.1', 'localhost'],
+            'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+            # Queue hashing instead of shedding load: every attempt should get a real answer
+            'PASSWORD_HASHING_POOL': {**settings.PASSWORD_HASHING_POOL, 'MAX_QUEUE': len(attempts)},
+        }
+        if options['hasher']:
+            overrides['PASSWORD_HASHERS'] = [options['hasher']] + [
+                h for h in settings.PASSWORD_HASHERS if h != options['hasher']
+            ]
+
+        with override_settings(**overrides), throwaway_database():
+            with local_server() as base_url:
+                latencies, statuses, wall = self.run(base_url, attempts, options['concurrency'])
+            users = list(CustomUser.objects.values_list('email', 'username'))
+
+        created = statuses[201]
+        rejected = statuses[400]
+        failed = sum(count for status, count in statuses.items() if status not in (201, 400))
+        checks = {
+            'users_per_email_exactly_one': len(users) == len(emails) and {e for e, _ in users} == set(emails),
+            'one_201_per_email': created == len(emails),
+            'duplicates_rejected_with_400': rejected == len(attempts) - len(emails),
+            'usernames_unique': len({u for _, u in users}) == len(users),
+            'no_server_errors': failed == 0,
+        }
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {
+                'emails': len(emails),
+                'attempts': len(attempts),
+                'domains': domains,
+                'concurrency': options['concurrency'],
+            },
+            'signup': summarize(latencies, wall, failed),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'users_created': len(users),
+            'checks': checks,
+            'ok': all(checks.values()),
+        }, indent=2))
+
+    def run(self, base_url, attempts, concurrency):
+        counter = itertools.count()
+        latencies, statuses = [], Counter()
+        lock = threading.Lock()
+
+        def worker(slot):
+            while (i := next(counter)) < len(attempts):
+                # A fresh client per attempt: the auth cookies of one signup don't leak into the next
+                client = Client(base_url)
+                started = time.perf_counter()
+                status = client.request('POST', '/api/auth/signup/', {
+                    'email': attempts[i], 'full_name': f'Signup {i}',
+                    'password': PASSWORD, 'password2': PASSWORD,
+                })
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        return latencies, statuses, time.perf_counter() - started
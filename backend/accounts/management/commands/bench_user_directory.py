@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from accounts.benchmarking import environment_info, seed_users, summarize, timed, throwaway_database
+from accounts.models import CustomUser
+from accounts.pagination import KeysetPagination
+from rest_framework.request import Request
+
+
+class Command(BaseCommand):
+    help = 'Compare keyset and OFFSET page latency of the user directory on a seeded table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Users to seed')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--pages', default='1,100,1000,3999',
+                            help='Comma-separated page numbers to time')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed fetches per page')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        pages = [int(p) for p in options['pages'].split(',')]
+
+        with throwaway_database():
+            seed_users(options['rows'])
+            ordered = CustomUser.objects.order_by('-created_at', '-id')
+            factory = RequestFactory()
+            results = {}
+
+            for page in pages:
+                offset = (page - 1) * page_size
+                if offset >= options['rows']:
+                    continue
+
+                # The cursor a client would hold after walking to this page
+                query = {'page_size': page_size}
+                if offset:
+                    pagination = KeysetPagination()
+                    query['cursor'] = pagination.encode_cursor(ordered.only('id', 'created_at')[offset - 1])
+                request = Request(factory.get('/api/auth/users/', query))
+
+                def keyset():
+                    KeysetPagination().paginate_queryset(CustomUser.objects.all(), request)
+
+                def offset_page():
+                    list(ordered[offset:offset + page_size])
+
+                results[f'page_{page}'] = {
+                    'keyset': summarize(timed(keyset, options['repeat']), 0),
+                    'offset': summarize(timed(offset_page, options['repeat']), 0),
+                }
+
+        self.stdout.write(json.dumps({
+            'environment': environment_info(),
+            'parameters': {'rows': options['rows'], 'page_size': page_size},
+            'pages': results,
+        }, indent=2))
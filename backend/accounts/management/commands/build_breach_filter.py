@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarking import timed
+from accounts.breach import BreachFilter, BreachFilterWriter
+
+
+def digests(lines, plain, counts):
+    """SHA-1 digests of the lines; malformed ones are only counted, under counts['skipped']"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if plain:
+            yield hashlib.sha1(line.encode()).digest()
+            continue
+        try:
+            # "HASH" or "HASH:count"
+            digest = bytes.fromhex(line.split(':', 1)[0])
+        except ValueError:
+            digest = b''
+        if len(digest) != 20:
+            counts['skipped'] += 1
+            continue
+        yield digest
+
+
+class Command(BaseCommand):
+    help = ('Build the breached-password Bloom filter used by accounts.breach.BreachedPasswordValidator '
+            'from a list of SHA-1 hashes ("HASH" or "HASH:count" per line) or, with --plain, passwords')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Hash list file, or - for stdin (needs --count)')
+        parser.add_argument('output', help='Filter file to write; replaced atomically when done')
+        parser.add_argument('--plain', action='store_true', help='Lines are passwords, not SHA-1 hashes')
+        parser.add_argument('--error-rate', type=float, default=1e-6,
+                            help='Target false-positive rate (default: 1e-6)')
+        parser.add_argument('--count', type=int, default=None,
+                            help='Number of lines, to skip the counting pass over the source')
+        parser.add_argument('--probes', type=int, default=100000,
+                            help='Random unlisted hashes used to measure the false-positive rate')
+
+    def handle(self, *args, **options):
+        if not 0 < options['error_rate'] < 1:
+            raise CommandError('--error-rate must be between 0 and 1')
+        source = options['source']
+        count = options['count']
+        if count is None:
+            if source == '-':
+                raise CommandError('Reading from stdin needs --count')
+            with open(source, encoding='utf-8', errors='replace') as f:
+                count = sum(1 for line in f if line.strip())
+
+        started = time.perf_counter()
+        writer = BreachFilterWriter(options['output'], count, options['error_rate'])
+        counts = {'skipped': 0}
+        try:
+            f = sys.stdin if source == '-' else open(source, encoding='utf-8', errors='replace')
+            try:
+                for digest in digests(f, options['plain'], counts):
+                    writer.add(digest)
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        build_seconds = time.perf_counter() - started
+
+        breach_filter = BreachFilter(options['output'])
+        try:
+            # Random digests stand in for passwords that are not in the list
+            probes = [os.urandom(20) for _ in range(options['probes'])]
+            measured = sum(probe in breach_filter for probe in probes) / len(probes) if probes else None
+            lookups = timed(lambda: breach_filter.contains_password('correct horse battery staple'), 10000)
+            report = {
+                'output': options['output'],
+                'items': breach_filter.count,
+                'skipped_lines': counts['skipped'],
+                'bits': breach_filter.size,
+                'file_bytes': os.path.getsize(options['output']),
+                'bits_per_item': round(breach_filter.size / max(breach_filter.count, 1), 2),
+                'hashes': breach_filter.hashes,
+                'target_false_positive_rate': options['error_rate'],
+                'expected_false_positive_rate': breach_filter.false_positive_rate,
+                'measured_false_positive_rate': measured,
+                'probes': len(probes),
+                'lookup_median_us': round(statistics.median(lookups) * 1e6, 2),
+                'build_seconds': round(build_seconds, 2),
+            }
+        finally:
+            breach_filter.close()
+
+        if count and breach_filter.count > count:
+            self.stderr.write(f'{breach_filter.count} items exceeds --count {count}; '
+                              'the false-positive rate is higher than targeted')
+        self.stdout.write(json.dumps(report, indent=2))
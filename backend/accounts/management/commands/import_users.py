@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from accounts.models import CustomUser, username_for_email
+
+ROLES = {choice for choice, _ in CustomUser.ROLE_CHOICES}
+
+
+def read_rows(path, fmt):
+    """Yield (line_number, row dict) pairs without loading the file into memory"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else {'_error': 'invalid JSON object'}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def text_field(row, name, reason=None):
+    """A column's value as a string ('' when missing); JSONL rows can carry any JSON type"""
+    value = row.get(name)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(reason or f'invalid {name}')
+    return value
+
+
+def clean_row(row):
+    """Return (user fields, password spec) for a row or raise ValueError with the reject reason"""
+    if '_error' in row:
+        raise ValueError(row['_error'])
+
+    email = CustomUser.objects.normalize_email(text_field(row, 'email').strip())
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError('invalid email')
+
+    full_name = text_field(row, 'full_name').strip()
+    if not full_name:
+        raise ValueError('missing full_name')
+    if len(full_name) > 255:
+        raise ValueError('full_name too long')
+
+    role = (text_field(row, 'role') or 'CANDIDATE').strip().upper()
+    if role not in ROLES:
+        raise ValueError(f'unknown role {role!r}')
+
+    phone = text_field(row, 'phone').strip()
+    if len(phone) > 20:
+        raise ValueError('phone too long')
+
+    password_hash = text_field(row, 'password_hash', 'invalid password').strip()
+    if password_hash:
+        try:
+            identify_hasher(password_hash)
+        except ValueError:
+            raise ValueError('unrecognized password_hash')
+        password = ('hashed', password_hash)
+    else:
+        password = ('raw', text_field(row, 'password', 'invalid password') or None)
+
+    fields = {'email': email, 'full_name': full_name, 'role': role, 'phone': phone or None}
+    return fields, password
+
+
+class Command(BaseCommand):
+    help = 'Bulk import users from a CSV or JSONL file (columns: email, full_name, role, phone, password or password_hash)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows validated, deduplicated and inserted per chunk')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing plain-text passwords (0 hashes inline)')
+        parser.add_argument('--rejects', default=None,
+                            help='Write rejected rows to this CSV file (line, email, reason)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate without inserting')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        pool = ProcessPoolExecutor(options['workers']) if options['workers'] > 0 else None
+        rejects_file = open(options['rejects'], 'w', newline='', encoding='utf-8') if options['rejects'] else None
+        rejects = csv.writer(rejects_file) if rejects_file else None
+        if rejects:
+            rejects.writerow(['line', 'email', 'reason'])
+
+        seen = set()
+        totals = {'read': 0, 'created': 0, 'rejected': 0}
+        started = time.perf_counter()
+
+        def reject(line_number, row, reason):
+            totals['rejected'] += 1
+            if rejects:
+                rejects.writerow([line_number, (row or {}).get('email', ''), reason])
+
+        try:
+            for chunk in chunked(read_rows(path, fmt), options['batch_size']):
+                totals['read'] += len(chunk)
+                valid = []
+                for line_number, row in chunk:
+                    try:
+                        fields, password = clean_row(row)
+                    except ValueError as e:
+                        reject(line_number, row, str(e))
+                        continue
+                    if fields['email'] in seen:
+                        reject(line_number, row, 'duplicate email in input')
+                        continue
+                    seen.add(fields['email'])
+                    valid.append((line_number, row, fields, password))
+
+                # One indexed IN lookup per chunk for emails that already exist
+                existing = set(CustomUser.objects.filter(
+                    email__in=[fields['email'] for _, _, fields, _ in valid]
+                ).values_list('email', flat=True))
+                pending = []
+                for entry in valid:
+                    if entry[2]['email'] in existing:
+                        reject(entry[0], entry[1], 'email already registered')
+                    else:
+                        pending.append(entry)
+
+                if pending and not options['dry_run']:
+                    totals['created'] += self.insert(pending, pool, options['workers'], reject)
+
+                elapsed = time.perf_counter() - started
+                self.stderr.write(f"{totals['read']} rows read, {totals['created']} created, "
+                                  f"{totals['rejected']} rejected ({totals['read'] / elapsed:.0f} rows/s)")
+        finally:
+            if pool:
+                pool.shutdown()
+            if rejects_file:
+                rejects_file.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(json.dumps({
+            **totals,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(totals['read'] / elapsed, 1) if elapsed else 0.0,
+        }))
+
+    def insert(self, pending, pool, workers, reject):
+        raw = [password for _, _, _, (kind, password) in pending if kind == 'raw' and password]
+        if pool and raw:
+            hashed = iter(pool.map(make_password, raw, chunksize=max(len(raw) // (workers * 4), 1)))
+        else:
+            hashed = iter(make_password(password) for password in raw)
+
+        users = []
+        for _, _, fields, (kind, password) in pending:
+            if kind == 'hashed':
+                encoded = password
+            elif password:
+                encoded = next(hashed)
+            else:
+                encoded = make_password(None)
+            # bulk_create bypasses CustomUser.save(), which would otherwise set the username
+            users.append(CustomUser(password=encoded, username=username_for_email(fields['email']), **fields))
+
+        try:
+            with transaction.atomic():
+                CustomUser.objects.bulk_create(users)
+            return len(users)
+        except IntegrityError:
+            pass
+
+        # Someone registered one of these emails since the chunk was checked:
+        # fall back to row-by-row inserts for this chunk so only those rows are rejected
+        created = 0
+        for (line_number, row, _, _), user in zip(pending, users):
+            try:
+                with transaction.atomic():
+                    CustomUser.objects.bulk_create([user])
+                created += 1
+            except IntegrityError:
+                reject(line_number, row, 'email already registered')
+        return created
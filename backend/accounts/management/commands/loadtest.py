@@ -0,0 +1,189 @@
+import http.client
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from accounts.benchmarking import environment_info, local_server, summarize, throwaway_database
+from accounts.google import LocalIssuer
+from accounts.models import CustomUser
+from accounts.tokens import tokens_for_user
+from accounts.touch import touch_buffer
+
+ENDPOINTS = ['signup', 'login', 'user', 'logout', 'password-reset', 'google']
+SEED_PASSWORD = 'Loadtest-pass-123'
+
+
+class Client:
+    """Minimal HTTP client for one virtual user; keeps its own cookies"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port
+        self.cookies = {}
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            for header in response.headers.get_all('Set-Cookie') or []:
+                for name, morsel in SimpleCookie(header).items():
+                    self.cookies[name] = morsel.value
+            return response.status
+        finally:
+            conn.close()
+
+
+class Command(BaseCommand):
+    help = 'Load-test the /api/auth/ endpoints against a local server and a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Number of users to seed')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent virtual users')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help=f'Comma-separated subset of: {", ".join(ENDPOINTS)}')
+        parser.add_argument('--hasher', default=None,
+                            help='Dotted path of the password hasher to use (default: PASSWORD_HASHERS[0])')
+        parser.add_argument('--no-auth-cache', action='store_true',
+                            help='Disable the token/user cache in CookieJWTAuthentication')
+        parser.add_argument('--no-touch-buffer', action='store_true',
+                            help='Write last_login on every login instead of buffering it')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+        if options['users'] < options['concurrency']:
+            raise CommandError('--users must be at least --concurrency')
+
+        self.issuer = LocalIssuer(audience='loadtest-client')
+        overrides = {
+            'ALLOWED_HOSTS': ['127.0.0.1', 'localhost'],
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'GOOGLE_OAUTH_CLIENT_ID': 'loadtest-client',
+            'GOOGLE_ID_TOKEN_VERIFIER': {'KEY_SOURCE': self.issuer.key_source()},
+            # Measure the endpoints, not the rate limiter
+            'REST_FRAMEWORK': {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}},
+        }
+        if options['hasher']:
+            overrides['PASSWORD_HASHERS'] = [options['hasher']] + [
+                h for h in settings.PASSWORD_HASHERS if h != options['hasher']
+            ]
+        if options['no_auth_cache']:
+            overrides['AUTH_USER_CACHE'] = {**settings.AUTH_USER_CACHE, 'ENABLED': False}
+        if options['no_touch_buffer']:
+            overrides['TOUCH_BUFFER'] = {**settings.TOUCH_BUFFER, 'ENABLED': False}
+
+        with override_settings(**overrides), throwaway_database():
+            users = self.seed_users(options['users'])
+            # Like a real server, flush buffered last_login writes in the background
+            touch_buffer.start()
+            try:
+                with local_server() as base_url:
+                    results = {
+                        name: self.run_endpoint(name, base_url, users, options['requests'], options['concurrency'])
+                        for name in endpoints
+                    }
+            finally:
+                # Write what is pending while the throwaway database still exists
+                touch_buffer.flush()
+            report = {
+                'environment': environment_info(),
+                'parameters': {
+                    'users': options['users'],
+                    'requests': options['requests'],
+                    'concurrency': options['concurrency'],
+                    'touch_buffer': not options['no_touch_buffer'],
+                },
+                'endpoints': results,
+            }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def seed_users(self, count):
+        # One hash for everyone keeps seeding fast; logins still pay the full hash cost
+        password = make_password(SEED_PASSWORD)
+        CustomUser.objects.bulk_create(
+            CustomUser(
+                email=f'loadtest{i}@example.com',
+                username=f'loadtest{i}',
+                full_name=f'Load Test {i}',
+                password=password,
+            )
+            for i in range(count)
+        )
+        return list(CustomUser.objects.order_by('id'))
+
+    def run_endpoint(self, name, base_url, users, total, concurrency):
+        counter = itertools.count()
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def worker(slot):
+            nonlocal errors
+            user = users[slot]
+            client = Client(base_url)
+            access_token = str(tokens_for_user(user).access_token)
+
+            while True:
+                i = next(counter)
+                if i >= total:
+                    return
+                if name in ('user', 'logout'):
+                    # Logout clears the cookie; every request starts signed in
+                    client.cookies['access_token'] = access_token
+                method, path, payload = self.build_request(name, user, slot, i)
+                started = time.perf_counter()
+                status = client.request(method, path, payload)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if status >= 400:
+                        errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        return summarize(latencies, time.perf_counter() - started, errors)
+
+    def build_request(self, name, user, slot, i):
+        if name == 'signup':
+            return 'POST', '/api/auth/signup/', {
+                'email': f'signup{i}-{time.time_ns()}@example.com',
+                'full_name': f'Signup {i}',
+                'password': SEED_PASSWORD,
+                'password2': SEED_PASSWORD,
+            }
+        if name == 'login':
+            return 'POST', '/api/auth/login/', {'email': user.email, 'password': SEED_PASSWORD}
+        if name == 'user':
+            return 'GET', '/api/auth/user/', None
+        if name == 'logout':
+            return 'POST', '/api/auth/logout/', None
+        if name == 'password-reset':
+            return 'POST', '/api/auth/password-reset/', {'email': user.email}
+        # google: alternate between existing and new accounts
+        email = user.email if i % 2 else f'google{i}@example.com'
+        return 'POST', '/api/auth/google/', {'access_token': self.issuer.issue(email, name='Google User')}
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import deliver_batch, outbox_setting
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued transactional emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Messages sent per connection (default: EMAIL_OUTBOX BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting once it is drained')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep between polls when the outbox is empty')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or outbox_setting('BATCH_SIZE')
+        totals = {'sent': 0, 'retried': 0, 'dead': 0}
+
+        try:
+            while True:
+                result = deliver_batch(batch_size)
+                for key, value in result.items():
+                    totals[key] += value
+
+                if sum(result.values()) < batch_size:
+                    # Outbox drained (or only retries left that are not yet due)
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            f"Sent {totals['sent']}, retried {totals['retried']}, dead {totals['dead']}"
+        )
@@ -0,0 +1,109 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before it can serve its first request: import the WSGI
+# application (settings, app registry, middleware) and the URLconf (views)
+STARTUP_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+from django.conf import settings
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+import_string(settings.WSGI_APPLICATION)
+get_resolver().url_patterns
+print(json.dumps({"startup_ms": (time.perf_counter() - started) * 1000}))
+'''
+
+
+def startup_setting(name):
+    defaults = {
+        'MAX_MS': 1000,
+        'LAZY_MODULES': [],
+    }
+    return getattr(settings, 'STARTUP_BUDGET', {}).get(name, defaults[name])
+
+
+def parse_importtime(output):
+    """(module, self_us, cumulative_us, depth) per line of `python -X importtime` output"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+class Command(BaseCommand):
+    help = ('Measure worker cold start (importing the WSGI application and URLconf in a fresh '
+            'interpreter), break import time down by package, and fail when it exceeds '
+            "STARTUP_BUDGET['MAX_MS'] or imports one of STARTUP_BUDGET['LAZY_MODULES']")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Timed cold starts; the median is checked')
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules to list')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help="Override STARTUP_BUDGET['MAX_MS']")
+
+    def run_startup(self, *python_options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings')}
+        result = subprocess.run(
+            [sys.executable, *python_options, '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+        return json.loads(result.stdout.strip().splitlines()[-1])['startup_ms'], result.stderr
+
+    def handle(self, *args, **options):
+        budget = options['budget_ms'] if options['budget_ms'] is not None else startup_setting('MAX_MS')
+
+        # -X importtime slows imports down, so the budget is checked on separate plain runs
+        timings = sorted(self.run_startup()[0] for _ in range(max(options['runs'], 1)))
+        _, importtime = self.run_startup('-X', 'importtime')
+        entries = parse_importtime(importtime)
+
+        by_package = defaultdict(int)
+        for name, self_us, _, _ in entries:
+            by_package[name.split('.')[0]] += self_us
+        imported = {name for name, _, _, _ in entries}
+        lazy = {module: module in imported for module in startup_setting('LAZY_MODULES')}
+
+        median = statistics.median(timings)
+        report = {
+            'runs': len(timings),
+            'startup_ms': {
+                'min': round(timings[0], 1),
+                'median': round(median, 1),
+                'max': round(timings[-1], 1),
+            },
+            'budget_ms': budget,
+            'within_budget': median <= budget,
+            'import_ms': round(sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000, 1),
+            'modules_imported': len(entries),
+            'packages_ms': {
+                package: round(us / 1000, 1)
+                for package, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+            },
+            'slowest_modules_ms': {
+                name: round(self_us / 1000, 1)
+                for name, self_us, _, _ in sorted(entries, key=lambda entry: entry[1], reverse=True)[:options['top']]
+            },
+            'lazy_modules_imported': lazy,
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        problems = []
+        if median > budget:
+            problems.append(f'median startup {median:.0f} ms exceeds the {budget:.0f} ms budget')
+        problems += [f'{module} is imported at startup' for module, loaded in lazy.items() if loaded]
+        if problems:
+            raise CommandError('; '.join(problems))
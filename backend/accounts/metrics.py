@@ -0,0 +1,291 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware gives every request a RequestTimings collector. Code
+that does expensive work wraps it in timed('<component>') (password hashing,
+JWT encode/decode, outbound HTTP); database time is captured for every query
+by an execute wrapper installed on each new connection. At the end of the
+request the timings go into a Server-Timing header, into per-view histograms
+served in Prometheus text format by metrics_view, and, for slow requests, into
+a structured log line. With PERFORMANCE_METRICS['ENABLED'] off no collector
+exists and timed() costs one context variable lookup.
+"""
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from .cache import cache_stats
+
+logger = logging.getLogger('accounts.performance')
+
+COMPONENTS = ('db', 'hash', 'jwt', 'http')
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_timings', default=None)
+
+
+def metrics_setting(name):
+    defaults = {
+        'ENABLED': True,
+        'SERVER_TIMING': True,
+        'SLOW_REQUEST_MS': 500,
+        'TOKEN': '',  # bearer token required by the metrics endpoint; empty = localhost only
+    }
+    return getattr(settings, 'PERFORMANCE_METRICS', {}).get(name, defaults[name])
+
+
+class RequestTimings:
+    """Seconds spent and number of calls per component for one request"""
+    __slots__ = ('seconds', 'calls')
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(COMPONENTS, 0.0)
+        self.calls = dict.fromkeys(COMPONENTS, 0)
+
+    def add(self, component, seconds):
+        self.seconds[component] += seconds
+        self.calls[component] += 1
+
+
+class timed:
+    """
+    Charge the time spent in the block to component of the current request.
+    A class rather than @contextmanager: outside a request this is on hot
+    paths and should cost next to nothing.
+    """
+    __slots__ = ('component', 'timings', 'started')
+
+    def __init__(self, component):
+        self.component = component
+
+    def __enter__(self):
+        self.timings = _current.get()
+        if self.timings is not None:
+            self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.add(self.component, time.perf_counter() - self.started)
+
+
+def time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_timer(connection, **kwargs):
+    # Connections are per thread, and async views run their queries in worker
+    # threads, so the wrapper lives on the connection and finds the request's
+    # collector through the context variable, which sync_to_async carries over
+    if time_query not in connection.execute_wrappers:
+        # Innermost-last wrappers are popped by execute_wrapper(); stay out of their way
+        connection.execute_wrappers.insert(0, time_query)
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms keyed by (metric name, view)"""
+
+    METRICS = {
+        'auth_request_duration_seconds': ('Wall time of the request', DURATION_BUCKETS),
+        'auth_db_duration_seconds': ('Time spent in database queries', DURATION_BUCKETS),
+        'auth_db_queries': ('Database queries per request', QUERY_COUNT_BUCKETS),
+        'auth_hash_duration_seconds': ('Time spent hashing or checking passwords', DURATION_BUCKETS),
+        'auth_jwt_duration_seconds': ('Time spent encoding and decoding JWTs', DURATION_BUCKETS),
+        'auth_http_duration_seconds': ('Time spent in outbound HTTP calls', DURATION_BUCKETS),
+    }
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, wall, timings):
+        values = {
+            'auth_request_duration_seconds': wall,
+            'auth_db_queries': timings.calls['db'],
+        }
+        for component in COMPONENTS:
+            values[f'auth_{component}_duration_seconds'] = timings.seconds[component]
+
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, view))
+                if histogram is None:
+                    histogram = self._histograms[(name, view)] = Histogram(self.METRICS[name][1])
+                histogram.observe(value)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, (description, _) in self.METRICS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label = f'view="{escape_label(view)}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum!r}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def render_cache_stats():
+    """Lookups by answering tier and hit ratio of every TieredCache namespace"""
+    stats = cache_stats()
+    lines = [
+        '# HELP auth_cache_lookups_total Cache lookups by namespace and the tier that answered',
+        '# TYPE auth_cache_lookups_total counter',
+    ]
+    for namespace, counters in stats.items():
+        label = f'namespace="{escape_label(namespace)}"'
+        for result, counter in (('local', 'local_hits'), ('shared', 'shared_hits'), ('miss', 'misses')):
+            lines.append(f'auth_cache_lookups_total{{{label},result="{result}"}} {counters[counter]}')
+    lines += [
+        '# HELP auth_cache_hit_ratio Share of lookups answered by either tier',
+        '# TYPE auth_cache_hit_ratio gauge',
+    ]
+    for namespace, counters in stats.items():
+        lines.append(f'auth_cache_hit_ratio{{namespace="{escape_label(namespace)}"}} {counters["hit_ratio"]!r}')
+    return '\n'.join(lines) + '\n'
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def server_timing(wall, timings):
+    entries = [f'total;dur={wall * 1000:.2f}']
+    for component in COMPONENTS:
+        calls = timings.calls[component]
+        if calls:
+            entry = f'{component};dur={timings.seconds[component] * 1000:.2f}'
+            if component == 'db':
+                entry += f';desc="{calls} queries"'
+            entries.append(entry)
+    return ', '.join(entries)
+
+
+class PerformanceMiddleware:
+    """Time each request and record where the time went"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics_setting('ENABLED'):
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, time.perf_counter() - started, timings)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics_setting('ENABLED'):
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, time.perf_counter() - started, timings)
+        return response
+
+    def finish(self, request, response, wall, timings):
+        view = view_name(request)
+        registry.observe(view, wall, timings)
+
+        if metrics_setting('SERVER_TIMING'):
+            response['Server-Timing'] = server_timing(wall, timings)
+
+        if wall * 1000 >= metrics_setting('SLOW_REQUEST_MS'):
+            logger.warning('slow request %s', json.dumps({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(wall * 1000, 2),
+                'db_queries': timings.calls['db'],
+                **{f'{component}_ms': round(timings.seconds[component] * 1000, 2) for component in COMPONENTS},
+            }))
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    token = metrics_setting('TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            raise PermissionDenied
+    elif request.META.get('REMOTE_ADDR') not in ('127.0.0.1', '::1'):
+        raise PermissionDenied
+    return HttpResponse(registry.render() + render_cache_stats(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,143 @@
+"""
+Per-prefix middleware pipelines.
+
+RouteMiddleware sits at the end of MIDDLEWARE and runs one of several
+middleware lists depending on the request path: the list of the longest
+matching prefix in ROUTE_MIDDLEWARE['PREFIXES'], or ROUTE_MIDDLEWARE['DEFAULT'].
+That lets the JWT-only API skip sessions, CSRF, the session user and messages
+while the admin keeps all of them. Each list is built once, like MIDDLEWARE
+itself, and the view hooks (process_view, process_exception,
+process_template_response) of the selected list are called as Django would.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+ROUTE_MIDDLEWARE = 'accounts.middleware.RouteMiddleware'
+
+
+def route_middleware_setting(name):
+    defaults = {
+        'DEFAULT': [],
+        'PREFIXES': {},  # path prefix -> middleware list
+    }
+    return getattr(settings, 'ROUTE_MIDDLEWARE', {}).get(name, defaults[name])
+
+
+def middleware_for_path(path):
+    """Middleware list that serves path"""
+    prefixes = route_middleware_setting('PREFIXES')
+    for prefix in sorted(prefixes, key=len, reverse=True):
+        if path.startswith(prefix):
+            return prefixes[prefix]
+    return route_middleware_setting('DEFAULT')
+
+
+class Pipeline:
+    """One middleware list built around get_response, as BaseHandler.load_middleware does"""
+
+    def __init__(self, paths, get_response, is_async):
+        handler = get_response
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+        for path in reversed(paths):
+            middleware = import_string(path)
+            if not getattr(middleware, 'async_capable' if is_async else 'sync_capable', not is_async):
+                raise ImproperlyConfigured(
+                    f'{path} cannot run {"async" if is_async else "sync"} inside {ROUTE_MIDDLEWARE}'
+                )
+            try:
+                instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, 'process_view'):
+                self.view_middleware.insert(0, instance.process_view)
+            if hasattr(instance, 'process_template_response'):
+                self.template_response_middleware.append(instance.process_template_response)
+            if hasattr(instance, 'process_exception'):
+                self.exception_middleware.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self.handler = handler
+
+
+class RouteMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.default = Pipeline(route_middleware_setting('DEFAULT'), get_response, self.async_mode)
+        self.prefixes = sorted(
+            (
+                (prefix, Pipeline(paths, get_response, self.async_mode))
+                for prefix, paths in route_middleware_setting('PREFIXES').items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def pipeline(self, request):
+        path = request.path_info
+        for prefix, pipeline in self.prefixes:
+            if path.startswith(prefix):
+                return pipeline
+        return self.default
+
+    def __call__(self, request):
+        return self.pipeline(request).handler(request)
+
+    # The handler collects these hooks from MIDDLEWARE entries only; relay them
+    # to the middleware of the pipeline serving the request. The middleware this
+    # is used with (CSRF, messages, ...) implement them synchronously.
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for process_view in self.pipeline(request).view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        for process_template_response in self.pipeline(request).template_response_middleware:
+            response = process_template_response(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for process_exception in self.pipeline(request).exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+@checks.register(checks.Tags.admin)
+def check_admin_middleware(app_configs, **kwargs):
+    """
+    admin.E408-E410 only look at MIDDLEWARE; with RouteMiddleware the admin's
+    requirements apply to the list that serves /admin/ instead
+    """
+    if ROUTE_MIDDLEWARE not in settings.MIDDLEWARE:
+        return []
+    classes = [import_string(path) for path in middleware_for_path('/admin/')]
+    errors = []
+    for required, error_id in (
+        (AuthenticationMiddleware, 'accounts.E001'),
+        (MessageMiddleware, 'accounts.E002'),
+        (SessionMiddleware, 'accounts.E003'),
+    ):
+        if not any(issubclass(cls, required) for cls in classes):
+            errors.append(checks.Error(
+                f"'{required.__module__}.{required.__name__}' must serve /admin/ in ROUTE_MIDDLEWARE "
+                "in order to use the admin application.",
+                id=error_id,
+            ))
+    return errors
@@ -0,0 +1,34 @@
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+import accounts.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_directory_indexes'),
+    ]
+
+    operations = [
+        # Both are no-ops outside PostgreSQL
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=accounts.indexes.PostgresGinIndex(
+                OpClass(Upper('full_name'), name='gin_trgm_ops'), name='users_full_name_trgm_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=accounts.indexes.PostgresIndex(
+                OpClass(Upper('email'), name='text_pattern_ops'), name='users_email_upper_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['phone'], name='users_phone_idx'),
+        ),
+    ]
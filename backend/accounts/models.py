@@ -1,5 +1,23 @@
+import hashlib
+
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from .hashing import hash_password, verify_password
+from .indexes import PostgresGinIndex, PostgresIndex
+
+
+def username_for_email(email):
+    """
+    Username derived from the email alone: its local part plus a short digest of
+    the whole address, so john@a.com and john@b.com get different usernames
+    without looking at the database
+    """
+    digest = hashlib.blake2b(email.encode(), digest_size=5).hexdigest()
+    return f"{email.split('@')[0][:139]}-{digest}"
 
 
 class CustomUserManager(BaseUserManager):
@@ -61,6 +79,9 @@ class CustomUser(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='CANDIDATE')
     avatar = models.URLField(blank=True, null=True)  # Can store uploaded image URL or Google profile pic
     
+    # Tokens issued before this (e.g. a password reset) are rejected; see revoke_tokens()
+    tokens_valid_after = models.DateTimeField(blank=True, null=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -77,6 +98,16 @@ class CustomUser(AbstractUser):
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the user directory, optionally filtered by role/is_active
+            models.Index(fields=['-created_at', '-id'], name='users_created_id_idx'),
+            models.Index(fields=['role', 'is_active', '-created_at', '-id'], name='users_role_active_created_idx'),
+            # Admin search (see UserAdmin.get_search_results). The expressions match the
+            # UPPER(col::text) LIKE ... that Django emits for icontains/istartswith.
+            PostgresGinIndex(OpClass(Upper('full_name'), name='gin_trgm_ops'), name='users_full_name_trgm_idx'),
+            PostgresIndex(OpClass(Upper('email'), name='text_pattern_ops'), name='users_email_upper_idx'),
+            models.Index(fields=['phone'], name='users_phone_idx'),
+        ]
     
     def __str__(self):
         return f"{self.full_name} ({self.email})"
@@ -84,5 +115,108 @@ class CustomUser(AbstractUser):
     def save(self, *args, **kwargs):
         # Auto-generate username from email if not provided
         if not self.username:
-            self.username = self.email.split('@')[0] + str(self.id or '')
+            self.username = username_for_email(self.email)
         super().save(*args, **kwargs)
+    
+    def set_password(self, raw_password):
+        # Hash on the bounded hashing pool instead of the request thread
+        self.password = hash_password(raw_password)
+        self._password = raw_password
+    
+    def revoke_tokens(self):
+        """Reject every refresh and access token issued so far, once saved"""
+        # Token `iat` claims have whole-second precision
+        self.tokens_valid_after = timezone.now().replace(microsecond=0)
+    
+    def tokens_revoked(self, token):
+        """Whether token was issued before the user's tokens were last revoked"""
+        if self.tokens_valid_after is None:
+            return False
+        return token.get('iat', 0) < self.tokens_valid_after.timestamp()
+    
+    def check_password(self, raw_password):
+        is_correct, must_update = verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            # Stored with an outdated hasher: upgrade it, as Django's default setter does
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return is_correct
+
+
+class InviteBatch(models.Model):
+    """
+    Interview invitations a host sent to many candidates at once.
+    Each invitation is an outbox row pointing back here; progress is counted from those rows.
+    """
+    host = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='invite_batches')
+    title = models.CharField(max_length=255)
+    scheduled_at = models.DateTimeField(blank=True, null=True)
+    total = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'invite_batches'
+        verbose_name = 'Invite batch'
+        verbose_name_plural = 'Invite batches'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.title} ({self.total} invites)"
+
+
+class OutboundEmail(models.Model):
+    """
+    Transactional email waiting in the outbox.
+    Rows are written by request handlers and delivered by the send_outbox command.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead'),
+    ]
+
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+    batch = models.ForeignKey(InviteBatch, on_delete=models.CASCADE, related_name='emails', blank=True, null=True)
+
+    # Delivery state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'email_outbox'
+        verbose_name = 'Outbound email'
+        verbose_name_plural = 'Outbound emails'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+
+class RevokedToken(models.Model):
+    """
+    Revoked refresh token ids (`jti:<jti>`) and token families (`fam:<id>`).
+    Rows only matter until the tokens they cover expire; expired rows are compacted away.
+    """
+    key = models.CharField(max_length=80, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'revoked_tokens'
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,9 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsHost(BasePermission):
+    """Allows access to hosts (interviewers) and staff"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.role == 'HOST' or user.is_staff))
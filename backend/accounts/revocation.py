@@ -0,0 +1,176 @@
+"""
+Refresh token revocation store.
+
+Revocations are persisted in the revoked_tokens table and mirrored in memory:
+a Bloom filter answers "definitely not revoked" for the common case, and an
+exact set confirms the rare positives. Each process pulls new rows by primary
+key every few seconds, and periodically deletes expired rows and rebuilds.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        # Kirsch-Mitzenmacher double hashing
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def revocation_setting(name):
+    defaults = {
+        'SYNC_INTERVAL': 5,  # seconds between pulls of new rows
+        'COMPACT_INTERVAL': 60 * 60,  # seconds between expired-row cleanups
+        'BLOOM_CAPACITY': 100000,
+        'BLOOM_ERROR_RATE': 0.001,
+    }
+    return getattr(settings, 'TOKEN_REVOCATION', {}).get(name, defaults[name])
+
+
+class RevocationStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.bloom = BloomFilter(revocation_setting('BLOOM_CAPACITY'), revocation_setting('BLOOM_ERROR_RATE'))
+        self.exact = set()
+        self.last_id = 0
+        self.last_sync = 0.0
+        self.last_compact = time.time()
+
+    def clear(self):
+        """Forget the in-memory mirror; the next check reloads it from the table"""
+        with self._lock:
+            self._reset()
+
+    def _add(self, key):
+        if self.bloom.count >= self.bloom.capacity:
+            # Over capacity the false-positive rate climbs; grow and re-add
+            keys = self.exact
+            self.bloom = BloomFilter(self.bloom.capacity * 2, revocation_setting('BLOOM_ERROR_RATE'))
+            for existing in keys:
+                self.bloom.add(existing)
+        self.bloom.add(key)
+        self.exact.add(key)
+
+    def sync(self, force=False):
+        """Pull rows added since the last sync (by other processes too) and compact when due"""
+        now = time.time()
+        if not force and now - self.last_sync < revocation_setting('SYNC_INTERVAL'):
+            return
+
+        with self._lock:
+            if now - self.last_compact >= revocation_setting('COMPACT_INTERVAL'):
+                RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+                self._reset()
+
+            rows = RevokedToken.objects.filter(id__gt=self.last_id).order_by('id').values_list('id', 'key')
+            for row_id, key in rows.iterator():
+                self._add(key)
+                self.last_id = row_id
+            self.last_sync = now
+
+    def is_revoked(self, key):
+        self.sync()
+        if key not in self.bloom:
+            return False
+        return key in self.exact
+
+    def revoke(self, key, expires_at):
+        """
+        Persist a revocation. Returns False if key was already revoked, which
+        is how concurrent use of the same refresh token is detected.
+        """
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(key=key, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        with self._lock:
+            self._add(key)
+        return True
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = RevocationStore()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'TOKEN_REVOCATION':
+        _store = None
+
+
+def jti_key(token):
+    return f"jti:{token['jti']}"
+
+
+def family_key(token):
+    # Tokens minted before families existed form a family of one
+    return f"fam:{token.get('fam') or token['jti']}"
+
+
+def token_expiry(token):
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+def is_revoked(token):
+    """Whether token's login was revoked; single used tokens are caught by rotate()"""
+    return get_store().is_revoked(family_key(token))
+
+
+def revoke_family(token):
+    """Revoke every token descended from the same login"""
+    lifetime = settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME']
+    get_store().revoke(family_key(token), timezone.now() + lifetime)
+
+
+def rotate(token):
+    """
+    Mark token as used. Returns False if it had already been used, i.e. the
+    token was replayed, in which case the whole family is revoked.
+    """
+    store = get_store()
+    if store.is_revoked(jti_key(token)) or not store.revoke(jti_key(token), token_expiry(token)):
+        revoke_family(token)
+        return False
+    return True
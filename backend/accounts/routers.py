@@ -0,0 +1,141 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary ('default'). Reads go to the replica alias
+only where replication lag is acceptable: safe (GET/HEAD/OPTIONS) requests,
+via ReplicaRoutingMiddleware, and code wrapped in read_from_replica(). After a
+write, reads stay on the primary for the rest of the request and, through a
+short-lived cookie, for the client's next few requests, so users always read
+their own writes. Without a configured replica everything uses 'default'.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def routing_setting(name):
+    defaults = {
+        'REPLICA_ALIAS': 'replica',
+        'STICKY_SECONDS': 10,  # how long a client reads from the primary after writing
+        'STICKY_COOKIE': 'db_primary',
+    }
+    return getattr(settings, 'DATABASE_ROUTING', {}).get(name, defaults[name])
+
+
+def replica_alias():
+    alias = routing_setting('REPLICA_ALIAS')
+    return alias if alias in settings.DATABASES else None
+
+
+def wrote_to_primary():
+    return _wrote.get()
+
+
+@contextmanager
+def read_from_replica():
+    """Allow reads inside the block to use the replica unless this request has written"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """Read from the primary inside the block, e.g. for data shared beyond this request"""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def request_routing(replica_reads, pinned=False):
+    """Fresh routing state for one request"""
+    tokens = _replica_reads.set(replica_reads), _pinned.set(pinned), _wrote.set(False)
+    try:
+        yield
+    finally:
+        for var, token in zip((_replica_reads, _pinned, _wrote), tokens):
+            var.reset(token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not _pinned.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Read-your-writes: everything after the first write reads the primary
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Route safe requests' reads to the replica and keep writers on the primary"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if replica_alias() is None:
+            return self.get_response(request)
+
+        with request_routing(*self.routing_for(request)):
+            response = self.get_response(request)
+            self.set_sticky_cookie(response)
+        return response
+
+    async def __acall__(self, request):
+        if replica_alias() is None:
+            return await self.get_response(request)
+
+        with request_routing(*self.routing_for(request)):
+            response = await self.get_response(request)
+            self.set_sticky_cookie(response)
+        return response
+
+    def routing_for(self, request):
+        """(replica_reads, pinned) for this request"""
+        return request.method in SAFE_METHODS, routing_setting('STICKY_COOKIE') in request.COOKIES
+
+    def set_sticky_cookie(self, response):
+        if wrote_to_primary():
+            response.set_cookie(
+                routing_setting('STICKY_COOKIE'),
+                '1',
+                max_age=routing_setting('STICKY_SECONDS'),
+                httponly=True,
+                secure=not settings.DEBUG,
+                samesite='Lax',
+            )
@@ -1,8 +1,17 @@
+import re
+from datetime import datetime
 
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .invites import join_url_allowed
 from .models import CustomUser
+from .routers import read_from_replica
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -14,9 +23,139 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class DateTimeConverter:
+    """
+    DateTimeField.to_representation for ISO 8601 output, with the current time
+    zone looked up once per render (bind) instead of once per value: the
+    context-local lookup costs more than the formatting itself.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __call__(self, value):
+        return self.field.to_representation(value)
+
+    def bind(self, tz):
+        fallback = self.field.to_representation
+        if tz is None:
+            return fallback
+
+        def convert(value):
+            if isinstance(value, datetime) and value.utcoffset() is not None:
+                try:
+                    value = value.astimezone(tz).isoformat()
+                except OverflowError:
+                    return fallback(value)
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return fallback(value)
+        return convert
+
+
+def compile_representation(serializer_class):
+    """
+    Plan for rendering instances the way serializer_class would, built once:
+    (output name, attribute, converter) per readable field. Plain string and
+    integer fields convert with str/int, ISO 8601 datetime fields with a
+    DateTimeConverter, everything else with the bound field's own
+    to_representation.
+    """
+    fast = {
+        serializers.CharField: str,
+        serializers.EmailField: str,
+        serializers.URLField: str,
+        serializers.IntegerField: int,
+    }
+    plan = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if len(field.source_attrs) != 1:
+            raise ValueError(f'{serializer_class.__name__}.{name}: only plain attributes can be precompiled')
+        if (type(field) is serializers.DateTimeField and not hasattr(field, 'format')
+                and not hasattr(field, 'timezone') and api_settings.DATETIME_FORMAT.lower() == ISO_8601):
+            convert = DateTimeConverter(field)
+        else:
+            convert = fast.get(type(field), field.to_representation)
+        plan.append((name, field.source_attrs[0], convert))
+    return tuple(plan)
+
+
+class FastUserSerializer:
+    """
+    Read-only stand-in for UserSerializer with byte-identical output.
+    ModelSerializer rebuilds its fields by model introspection on every
+    instantiation; this renders from a plan compiled once at import.
+    Supports the subset of the serializer API the views use: .data and many=True.
+    """
+    fields = UserSerializer.Meta.fields
+    plan = compile_representation(UserSerializer)
+
+    def __init__(self, instance=None, many=False, **kwargs):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def bound_plan(cls):
+        """plan with the time zone dependent converters bound for one render"""
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        return [
+            (name, attr, convert.bind(tz) if isinstance(convert, DateTimeConverter) else convert)
+            for name, attr, convert in cls.plan
+        ]
+
+    @classmethod
+    def to_representation(cls, instance, plan=None):
+        data = {}
+        for name, attr, convert in plan or cls.bound_plan():
+            value = getattr(instance, attr)
+            data[name] = None if value is None else convert(value)
+        return data
+
+    @classmethod
+    def from_values(cls, rows):
+        """Render rows of .values(*fields) without building model instances"""
+        plan = cls.bound_plan()
+        data = []
+        for row in rows:
+            item = {}
+            for name, attr, convert in plan:
+                value = row[attr]
+                item[name] = None if value is None else convert(value)
+            data.append(item)
+        return data
+
+    @property
+    def data(self):
+        plan = self.bound_plan()
+        if self.many:
+            return [self.to_representation(instance, plan) for instance in self.instance]
+        return self.to_representation(self.instance, plan)
+
+
+class DirectoryUserSerializer(serializers.ModelSerializer):
+    """What hosts who aren't staff see of other users: no contact details"""
+    
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'full_name', 'role', 'avatar']
+        read_only_fields = fields
+
+
+class FastDirectoryUserSerializer(FastUserSerializer):
+    """FastUserSerializer for DirectoryUserSerializer"""
+    fields = DirectoryUserSerializer.Meta.fields
+    plan = compile_representation(DirectoryUserSerializer)
+
+
 class SignupSerializer(serializers.ModelSerializer):
-    """Serializer for user registration"""
-    password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
+    """
+    Serializer for user registration.
+    Email uniqueness is left to the unique index: create() inserts and turns a
+    conflict into the error the unique check would have given, instead of
+    querying first and racing concurrent signups.
+    """
+    password = serializers.CharField(write_only=True, required=True)
     password2 = serializers.CharField(write_only=True, required=True)
     
     class Meta:
@@ -24,24 +163,37 @@ class SignupSerializer(serializers.ModelSerializer):
         fields = ['email', 'full_name', 'password', 'password2', 'role', 'phone']
         extra_kwargs = {
             'full_name': {'required': True},
-            'email': {'required': True},
+            'email': {'required': True, 'validators': []},
         }
     
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password": "Password fields didn't match."})
+        # Validate against the user being created so the similarity check sees email and name
+        user = CustomUser(email=attrs['email'], full_name=attrs['full_name'])
+        try:
+            validate_password(attrs['password'], user=user)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'password': list(e.messages)})
         return attrs
     
     def create(self, validated_data):
         validated_data.pop('password2')
-        user = CustomUser.objects.create_user(
-            email=validated_data['email'],
-            full_name=validated_data['full_name'],
-            password=validated_data['password'],
-            role=validated_data.get('role', 'CANDIDATE'),
-            phone=validated_data.get('phone', '')
-        )
-        return user
+        try:
+            with transaction.atomic():
+                return CustomUser.objects.create_user(
+                    email=validated_data['email'],
+                    full_name=validated_data['full_name'],
+                    password=validated_data['password'],
+                    role=validated_data.get('role', 'CANDIDATE'),
+                    phone=validated_data.get('phone', '')
+                )
+        except IntegrityError:
+            field = CustomUser._meta.get_field('email')
+            raise serializers.ValidationError({'email': [field.error_messages['unique'] % {
+                'model_name': CustomUser._meta.verbose_name,
+                'field_label': field.verbose_name,
+            }]})
 
 
 class LoginSerializer(serializers.Serializer):
@@ -68,12 +220,19 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Must include "email" and "password".')
 
 
-class PasswordResetRequestSerializer(serializers.Serializer):
-    """Serializer for password reset request"""
+class PasswordResetEmailSerializer(serializers.Serializer):
+    """Shape of a password reset request, without the account lookup"""
     email = serializers.EmailField(required=True)
+
+
+class PasswordResetRequestSerializer(PasswordResetEmailSerializer):
+    """Serializer for password reset request"""
     
     def validate_email(self, value):
-        if not CustomUser.objects.filter(email=value).exists():
+        # A replica that lags a fresh signup only delays that user's reset email
+        with read_from_replica():
+            exists = CustomUser.objects.filter(email=value).exists()
+        if not exists:
             raise serializers.ValidationError("No user found with this email address.")
         return value
 
@@ -92,6 +251,65 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
 
 
 
+class UserBatchSerializer(serializers.Serializer):
+    """Ids and/or emails of the users to look up in one request"""
+    MAX_ITEMS = 500
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False, default=list)
+    
+    def validate_emails(self, emails):
+        # Stored emails have their domain lowercased on the way in
+        return [CustomUser.objects.normalize_email(email) for email in emails]
+    
+    def validate(self, attrs):
+        if not attrs['ids'] and not attrs['emails']:
+            raise serializers.ValidationError('Provide ids or emails.')
+        if len(attrs['ids']) + len(attrs['emails']) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f'At most {self.MAX_ITEMS} ids and emails per request.')
+        return attrs
+
+
+LINK_RE = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+
+def reject_links(value):
+    """Invitations carry one link, the join_url; free text must not smuggle in others"""
+    if LINK_RE.search(value):
+        raise serializers.ValidationError('Links are not allowed here; use join_url.')
+
+
+class InviteRecipientSerializer(serializers.Serializer):
+    """A candidate to invite; the name is only used in the greeting"""
+    email = serializers.EmailField()
+    name = serializers.CharField(max_length=100, required=False, default='', allow_blank=True,
+                                 validators=[reject_links])
+
+
+class InviteBatchSerializer(serializers.Serializer):
+    """An interview and the candidates a host invites to it in one request"""
+    MAX_RECIPIENTS = 1000
+    title = serializers.CharField(max_length=120, validators=[reject_links])
+    message = serializers.CharField(max_length=1000, required=False, default='', allow_blank=True,
+                                    validators=[reject_links])
+    join_url = serializers.URLField(required=False, default='', allow_blank=True)
+    scheduled_at = serializers.DateTimeField(required=False, default=None, allow_null=True)
+    recipients = serializers.ListField(
+        child=InviteRecipientSerializer(), allow_empty=False, max_length=MAX_RECIPIENTS,
+    )
+    
+    def validate_join_url(self, value):
+        if value and not join_url_allowed(value):
+            raise serializers.ValidationError('Join links must point at JobMeet or an allowed meeting host.')
+        return value
+    
+    def validate_recipients(self, recipients):
+        # (email, name) pairs; an address listed twice is invited once, under its first name
+        unique = {}
+        for recipient in recipients:
+            unique.setdefault(CustomUser.objects.normalize_email(recipient['email']), recipient['name'])
+        return list(unique.items())
+
+
 class GoogleLoginSerializer(serializers.Serializer):
     """Serializer for Google OAuth login"""
     access_token = serializers.CharField(required=True)
@@ -0,0 +1,27 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user
+from .models import CustomUser
+from .touch import buffered_update_last_login
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, using, created=False, **kwargs):
+    """Keep the auth caches of every worker consistent with profile, password and is_active changes"""
+    if created:
+        return
+    pk = instance.pk
+    invalidate_user(pk)
+    if transaction.get_connection(using).in_atomic_block:
+        # Again once committed: until then other workers still read, and may cache, the old row
+        transaction.on_commit(lambda: invalidate_user(pk), using=using)
+
+
+# Replace django.contrib.auth's receiver, which saves last_login on every login,
+# with one that goes through the write-behind buffer
+user_logged_in.disconnect(dispatch_uid='update_last_login')
+user_logged_in.connect(buffered_update_last_login, dispatch_uid='update_last_login')
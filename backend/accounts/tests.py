@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from smtplib import SMTPException
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .avatars import AvatarStore, StaticFetcher, pillow
+from .authentication import (
+    USER_CACHE_VERSION, CookieJWTAuthentication, token_cache, user_cache, auth_cache_stats,
+)
+from .admin import UserAdmin
+from .benchmarking import percentile, summarize
+from .breach import BreachFilter
+from .cache import LRUCache, PrivateFileBasedCache, TieredCache
+from .google import GoogleKeysUnavailable, GoogleTokenVerifier, LocalIssuer, SharedKeySource, StaticKeySource
+from .hashing import get_pool, hashing_stats
+from .mail import deliver_batch, enqueue_mail
+from .metrics import registry
+from .middleware import check_admin_middleware
+from .pagination import EstimatedCountPaginator
+from .models import CustomUser, InviteBatch, OutboundEmail, RevokedToken, username_for_email
+from .revocation import BloomFilter, get_store as get_revocation_store
+from .routers import read_from_replica, request_routing
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .serializers import FastUserSerializer, InviteBatchSerializer, UserSerializer
+from .throttling import LocalWindowStore, get_store
+from .tokens import tokens_for_user
+from .touch import TouchBuffer, touch_buffer
+from .urls import auth_urlpatterns
+
+
+class AuthTestMixin:
+    """Shared helpers for tests that talk to the cookie-authenticated API"""
+
+    def setUp(self):
+        token_cache.clear()
+        user_cache.clear()
+        get_store().clear()
+        get_revocation_store().clear()
+        touch_buffer.clear()
+        self.addCleanup(touch_buffer.clear)
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(
+            email='jane@example.com', password='S3cure-pass!', full_name='Jane Doe'
+        )
+
+    def login_as(self, user):
+        refresh = RefreshToken.for_user(user)
+        self.client.cookies['access_token'] = str(refresh.access_token)
+        return refresh
+
+
+class LRUCacheTests(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entry_expires_at_absolute_deadline(self):
+        cache = LRUCache(ttl=300)
+        cache.set('a', 1, expires_at=0)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+class CookieJWTAuthenticationCacheTests(AuthTestMixin, TestCase):
+
+    def test_repeat_requests_skip_user_query(self):
+        self.login_as(self.user)
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        hits = auth_cache_stats()['users']['hits']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.data['email'], 'jane@example.com')
+        self.assertEqual(auth_cache_stats()['users']['hits'], hits + 1)
+
+    def test_save_invalidates_snapshot(self):
+        self.login_as(self.user)
+        self.client.get('/api/auth/user/')
+        self.user.full_name = 'Jane Smith'
+        self.user.save()
+        response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.data['full_name'], 'Jane Smith')
+
+    def test_deactivated_user_is_rejected(self):
+        self.login_as(self.user)
+        self.client.get('/api/auth/user/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE={'ENABLED': False})
+    def test_disabled_cache_hits_database(self):
+        self.login_as(self.user)
+        self.client.get('/api/auth/user/')
+        with self.assertNumQueries(1):
+            self.client.get('/api/auth/user/')
+
+    @override_settings(TIERED_CACHE={**settings.TIERED_CACHE, 'SYNC_INTERVAL': 0})
+    def test_deactivation_by_another_worker_is_seen(self):
+        self.login_as(self.user)
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+        # Another worker deactivates the user: the row changes and its cache broadcasts the deletion
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        TieredCache('users', version=USER_CACHE_VERSION).delete(str(self.user.pk))
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+
+@override_settings(
+    CACHES={**settings.CACHES, 'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    TIERED_CACHE={**settings.TIERED_CACHE, 'SYNC_INTERVAL': 0},
+)
+class TieredCacheTests(TestCase):
+
+    def worker(self, **options):
+        """The cache of the namespace under test as one more worker process would have it"""
+        return TieredCache('test', **options)
+
+    def setUp(self):
+        self.worker().clear()
+
+    def test_workers_share_values_and_invalidations(self):
+        a, b = self.worker(), self.worker()
+        a.set('k', 'v1')
+        self.assertEqual(b.get('k'), 'v1')
+        self.assertEqual(b.get('k'), 'v1')
+        self.assertEqual((b.stats()['shared_hits'], b.stats()['local_hits']), (1, 1))
+
+        a.delete('k')
+        self.assertIsNone(b.get('k'))
+        b.set('k', 'v2')
+        a.clear()
+        self.assertIsNone(b.get('k'))
+
+        a.set('k', 'v3')
+        self.assertIsNone(self.worker(version=2).get('k'))
+        self.assertIsNone(self.worker(shared=False).get('k'))
+
+    def test_incomplete_invalidation_log_drops_local_tier(self):
+        a, b = self.worker(), self.worker()
+        a.delete('x')
+        b.set('k', 'v')
+        # An invalidation whose log entry is gone
+        caches['shared'].incr(a._meta_key('seq'))
+        b.get('other')
+        self.assertIsNone(b.local.get('k'))
+
+    def test_entries_are_scoped_to_the_database(self):
+        a = self.worker()
+        a.set('k', 'v')
+        # A test run or benchmark next to a server: same cache, another database
+        name = settings.DATABASES['default']['NAME']
+        settings.DATABASES['default']['NAME'] = f'{name}-other'
+        try:
+            self.assertIsNone(a.get('k'))
+            self.assertIsNone(self.worker().get('k'))
+            a.set('k', 'other')
+        finally:
+            settings.DATABASES['default']['NAME'] = name
+        self.assertEqual(self.worker().get('k'), 'v')
+
+    def test_file_cache_refuses_directories_others_can_enter(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        os.chmod(location, 0o755)
+        with self.assertRaises(ImproperlyConfigured):
+            PrivateFileBasedCache(location, {})
+
+        os.chmod(location, 0o700)
+        cache = PrivateFileBasedCache(location, {})
+        cache.set('k', 'v')
+        self.assertEqual(cache.get('k'), 'v')
+        os.chmod(location, 0o777)
+        with self.assertRaises(ImproperlyConfigured):
+            cache.get('k')
+
+    def test_single_flight_across_threads_and_workers(self):
+        workers = [self.worker(lease=True), self.worker(lease=True)]
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'v'
+
+        threads = [
+            threading.Thread(target=lambda worker=worker: results.append(worker.get_or_set('k', compute)))
+            for worker in workers * 4
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(calls), results), (1, ['v'] * 8))
+
+    def test_google_keys_fetched_once_for_all_workers(self):
+        source = StaticKeySource({'kid-1': 'cert'})
+        source.url = 'https://www.googleapis.com/oauth2/v1/certs'
+        workers = [SharedKeySource(source, self.worker(lease=True)) for _ in range(3)]
+        for worker in workers:
+            certs, max_age = worker.fetch()
+            self.assertEqual(certs, {'kid-1': 'cert'})
+            self.assertAlmostEqual(max_age, 3600, delta=1)
+        self.assertEqual(source.fetches, 1)
+
+        # A worker asking again already has the shared set (expired, or missing a rotated key)
+        source.certs = {'kid-2': 'cert'}
+        self.assertEqual(workers[0].fetch()[0], {'kid-2': 'cert'})
+        self.assertEqual(workers[1].fetch()[0], {'kid-2': 'cert'})
+        self.assertEqual(source.fetches, 2)
+
+    def test_hit_ratios_are_exported(self):
+        user = CustomUser.objects.create_user(email='jane@example.com', password=None)
+        client = APIClient()
+        client.cookies['access_token'] = str(RefreshToken.for_user(user).access_token)
+        client.get('/api/auth/user/')
+        client.get('/api/auth/user/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('auth_cache_lookups_total{namespace="users",result="local"}', body)
+        self.assertIn('auth_cache_hit_ratio{namespace="users"}', body)
+
+
+@override_settings(AUTH_PROFILE_CLAIMS=True)
+class ProfileClaimsTests(AuthTestMixin, TestCase):
+
+    def login_with_claims(self):
+        self.client.cookies['access_token'] = str(tokens_for_user(self.user).access_token)
+
+    def test_current_user_served_from_claims(self):
+        self.login_with_claims()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.user.id)
+        self.assertEqual(response.data['full_name'], 'Jane Doe')
+        self.assertEqual(response.data['role'], 'CANDIDATE')
+        self.assertEqual(response.data, UserSerializer(self.user).data)
+
+    def test_unclaimed_field_loads_lazily(self):
+        token = tokens_for_user(self.user).access_token
+        user = CookieJWTAuthentication().get_user(token)
+        with self.assertNumQueries(1):
+            self.assertFalse(user.is_staff)
+
+    def test_tokens_without_claims_fall_back_to_database(self):
+        self.login_as(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+
+
+class RefreshTokenRotationTests(AuthTestMixin, TestCase):
+
+    def sign_in(self):
+        refresh = tokens_for_user(self.user)
+        self.client.cookies['refresh_token'] = str(refresh)
+        return str(refresh)
+
+    def test_refresh_rotates_cookies(self):
+        old = self.sign_in()
+        response = self.client.post('/api/auth/token/refresh/')
+        self.assertEqual(response.status_code, 200)
+        new = response.cookies['refresh_token'].value
+        self.assertNotEqual(new, old)
+        self.assertEqual(RefreshToken(new)['fam'], RefreshToken(old)['fam'])
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+
+    def test_reuse_revokes_family(self):
+        old = self.sign_in()
+        rotated = self.client.post('/api/auth/token/refresh/').cookies['refresh_token'].value
+
+        self.client.cookies['refresh_token'] = old
+        self.assertEqual(self.client.post('/api/auth/token/refresh/').status_code, 401)
+
+        # The legitimate holder's rotated token is dead too
+        self.client.cookies['refresh_token'] = rotated
+        self.assertEqual(self.client.post('/api/auth/token/refresh/').status_code, 401)
+
+    def test_logout_revokes_refresh_token(self):
+        self.sign_in()
+        self.login_as(self.user)
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertTrue(RevokedToken.objects.filter(key__startswith='fam:').exists())
+
+    def test_password_reset_revokes_existing_tokens(self):
+        refresh = tokens_for_user(self.user)
+        # Issued a while before the reset (iat has whole-second precision)
+        access = refresh.access_token
+        for token in (refresh, access):
+            token.set_iat(at_time=timezone.now() - timedelta(seconds=10))
+        stolen_refresh, stolen_access = str(refresh), str(access)
+        self.client.cookies['access_token'] = stolen_access
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+
+        response = self.client.post('/api/auth/password-reset/confirm/', {
+            'uid': urlsafe_base64_encode(force_bytes(self.user.pk)),
+            'token': default_token_generator.make_token(self.user),
+            'new_password': 'N3w-secure-pass!',
+            'new_password2': 'N3w-secure-pass!',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.cookies['refresh_token'] = stolen_refresh
+        self.assertEqual(self.client.post('/api/auth/token/refresh/').status_code, 401)
+        self.client.cookies['access_token'] = stolen_access
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 401)
+
+        # Signing in again works
+        self.user.refresh_from_db()
+        self.login_as(self.user)
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+
+    def test_revocations_from_other_processes_are_synced(self):
+        refresh = RefreshToken(self.sign_in())
+        RevokedToken.objects.create(key=f"fam:{refresh['fam']}", expires_at=timezone.now() + timedelta(days=7))
+        get_revocation_store().sync(force=True)
+        self.assertEqual(self.client.post('/api/auth/token/refresh/').status_code, 401)
+
+    @override_settings(TOKEN_REVOCATION={**settings.TOKEN_REVOCATION, 'COMPACT_INTERVAL': 0})
+    def test_compaction_drops_expired_rows(self):
+        RevokedToken.objects.create(key='jti:old', expires_at=timezone.now() - timedelta(seconds=1))
+        get_revocation_store().sync(force=True)
+        self.assertFalse(RevokedToken.objects.filter(key='jti:old').exists())
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000)
+        keys = [f'jti:{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other:{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 100)
+
+
+REPLICA_DATABASES = {
+    **settings.DATABASES,
+    'replica': {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+}
+
+
+@override_settings(DATABASES=REPLICA_DATABASES)
+class ReplicaRoutingTests(AuthTestMixin, TestCase):
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(CustomUser.objects.all().db, 'default')
+
+    def test_safe_request_reads_replica(self):
+        with request_routing(replica_reads=True):
+            self.assertEqual(CustomUser.objects.all().db, 'replica')
+
+    def test_reads_after_write_stay_on_primary(self):
+        with request_routing(replica_reads=True):
+            self.user.save()
+            self.assertEqual(CustomUser.objects.all().db, 'default')
+            with read_from_replica():
+                self.assertEqual(CustomUser.objects.all().db, 'default')
+
+    def test_sticky_cookie_pins_client_to_primary(self):
+        with request_routing(replica_reads=True, pinned=True):
+            self.assertEqual(CustomUser.objects.all().db, 'default')
+
+    def test_write_sets_sticky_cookie(self):
+        response = self.client.post('/api/auth/signup/', {
+            'email': 'new@example.com', 'full_name': 'New User',
+            'password': 'S3cure-pass!', 'password2': 'S3cure-pass!',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+
+    def test_read_only_request_does_not_extend_cookie(self):
+        self.login_as(self.user)
+        self.client.cookies['db_primary'] = '1'
+        response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_user_cache_is_filled_from_primary(self):
+        # Every worker serves the cached row: it must not come from a lagging replica
+        token = RefreshToken.for_user(self.user).access_token
+        with request_routing(replica_reads=True), CaptureQueriesContext(connections['default']) as queries:
+            user = CookieJWTAuthentication().get_user(token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(len(queries), 1)
+
+    def test_no_replica_configured(self):
+        with override_settings(DATABASES={'default': settings.DATABASES['default']}):
+            with request_routing(replica_reads=True):
+                self.assertEqual(CustomUser.objects.all().db, 'default')
+
+
+class FailingEmailBackend(LocMemEmailBackend):
+
+    def send_messages(self, messages):
+        raise SMTPException('connection refused')
+
+
+@override_settings(EMAIL_OUTBOX={'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 0})
+class EmailOutboxTests(AuthTestMixin, TestCase):
+
+    def test_password_reset_is_queued_not_sent(self):
+        response = self.client.post('/api/auth/password-reset/', {'email': 'jane@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.to_email, 'jane@example.com')
+        self.assertIn('/reset-password/', queued.html_body)
+
+    def test_worker_drains_outbox_over_one_connection(self):
+        for i in range(3):
+            enqueue_mail('Hello', f'user{i}@example.com', body='Hi')
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='SENT').exists())
+        self.assertFalse(OutboundEmail.objects.exclude(body='', html_body='').exists())
+
+    def test_failed_delivery_retries_then_dead_letters(self):
+        row = enqueue_mail('Hello', 'user@example.com', body='Hi')
+        backend = FailingEmailBackend()
+        self.assertEqual(deliver_batch(connection=backend), {'sent': 0, 'retried': 1, 'dead': 0})
+        self.assertEqual(deliver_batch(connection=backend), {'sent': 0, 'retried': 0, 'dead': 1})
+        row.refresh_from_db()
+        self.assertEqual(row.status, 'DEAD')
+        self.assertEqual(row.last_error, 'connection refused')
+        self.assertEqual((row.body, row.html_body), ('', ''))
+
+    def test_admin_does_not_show_bodies(self):
+        row = enqueue_mail('Reset', 'jane@example.com', html_body='<a href="/reset-password/uid/secret-token">')
+        staff = CustomUser.objects.create_superuser('admin@example.com', 'unused', full_name='Admin')
+        self.client.force_login(staff)
+        response = self.client.get(f'/admin/accounts/outboundemail/{row.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'secret-token')
+
+
+@override_settings(INVITES={**settings.INVITES, 'JOIN_URL_HOSTS': ['meet.example.com']})
+class InviteBatchTests(AuthTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = CustomUser.objects.create_user(
+            email='host@example.com', password=None, full_name='Hank Host', role='HOST',
+        )
+        self.payload = {
+            'title': 'Backend Engineer',
+            'message': 'Bring <code> samples & questions.',
+            'join_url': 'https://meet.example.com/room-1',
+            'recipients': [
+                {'email': 'ann@example.com', 'name': 'Ann'},
+                {'email': 'bob@EXAMPLE.com'},
+                {'email': 'ann@example.com', 'name': 'Ann again'},
+            ],
+        }
+
+    def test_candidates_cannot_invite(self):
+        self.login_as(self.user)
+        response = self.client.post('/api/auth/invites/', self.payload, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_invites_are_rendered_and_queued(self):
+        self.login_as(self.host)
+        response = self.client.post('/api/auth/invites/', self.payload, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            {key: response.data[key] for key in ('total', 'pending', 'sent', 'failed', 'done')},
+            {'total': 2, 'pending': 2, 'sent': 0, 'failed': 0, 'done': False},
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+        ann, bob = OutboundEmail.objects.order_by('to_email')
+        self.assertEqual(bob.to_email, 'bob@example.com')
+        self.assertEqual(ann.subject, 'JobMeet - Hank Host invited you to interview: Backend Engineer')
+        self.assertIn('Hello Ann,', ann.body)
+        self.assertIn('Hello there,', bob.body)
+        # Only the HTML part is escaped
+        self.assertIn('Bring <code> samples & questions.', ann.body)
+        self.assertIn('Bring &lt;code&gt; samples &amp; questions.', ann.html_body)
+        self.assertIn('href="https://meet.example.com/room-1"', ann.html_body)
+
+    def test_progress_follows_delivery(self):
+        self.login_as(self.host)
+        batch_id = self.client.post('/api/auth/invites/', self.payload, format='json').data['id']
+        call_command('send_outbox', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        message = mail.outbox[0]
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+        self.assertIn('Join the interview: https://meet.example.com/room-1', message.body)
+
+        response = self.client.get(f'/api/auth/invites/{batch_id}/')
+        self.assertEqual(
+            {key: response.data[key] for key in ('total', 'pending', 'sent', 'failed', 'done')},
+            {'total': 2, 'pending': 0, 'sent': 2, 'failed': 0, 'done': True},
+        )
+
+        # Other hosts cannot see the batch
+        other = CustomUser.objects.create_user(email='other@example.com', password=None, role='HOST')
+        self.login_as(other)
+        self.assertEqual(self.client.get(f'/api/auth/invites/{batch_id}/').status_code, 404)
+
+    def test_recipient_limit(self):
+        self.login_as(self.host)
+        self.payload['recipients'] = [
+            {'email': f'user{i}@example.com'} for i in range(InviteBatchSerializer.MAX_RECIPIENTS + 1)
+        ]
+        response = self.client.post('/api/auth/invites/', self.payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipients', response.data)
+
+    def test_join_url_must_be_allowed(self):
+        self.login_as(self.host)
+        for join_url in ('https://evil.example.net/room-1', 'http://meet.example.com/room-1',
+                         'https://user@meet.example.com/room-1'):
+            self.payload['join_url'] = join_url
+            response = self.client.post('/api/auth/invites/', self.payload, format='json')
+            self.assertEqual(response.status_code, 400, join_url)
+            self.assertIn('join_url', response.data)
+
+        self.payload['join_url'] = f'{settings.FRONTEND_URL}/interviews/1'
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 202)
+
+    def test_free_text_cannot_carry_links(self):
+        self.login_as(self.host)
+        for field, value in (('title', 'Claim your prize at www.example.net'),
+                             ('message', 'Log in at HTTPS://evil.example.net first.')):
+            response = self.client.post('/api/auth/invites/', {**self.payload, field: value}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.data)
+        self.payload['recipients'] = [{'email': 'ann@example.com', 'name': 'http://evil.example.net'}]
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 400)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    @override_settings(INVITES={**settings.INVITES, 'JOIN_URL_HOSTS': ['meet.example.com'], 'DAILY_RECIPIENTS': 3})
+    def test_daily_recipient_quota(self):
+        self.login_as(self.host)
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 202)
+
+        response = self.client.post('/api/auth/invites/', self.payload, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+        # The quota is per host and frees up as batches age out of the last day
+        InviteBatch.objects.update(created_at=timezone.now() - timedelta(days=1, seconds=1))
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 202)
+        other = CustomUser.objects.create_user(email='other@example.com', password=None, role='HOST')
+        self.login_as(other)
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 202)
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'invite.user': '1/hour'},
+    })
+    def test_invites_are_throttled_per_host(self):
+        self.login_as(self.host)
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 202)
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 429)
+
+        other = CustomUser.objects.create_user(email='other@example.com', password=None, role='HOST')
+        self.login_as(other)
+        self.assertEqual(self.client.post('/api/auth/invites/', self.payload, format='json').status_code, 202)
+
+
+class FlakyKeySource:
+
+    def __init__(self, source):
+        self.source = source
+        self.down = False
+
+    def fetch(self):
+        if self.down:
+            raise OSError('network unreachable')
+        return self.source.fetch()
+
+
+class GoogleTokenVerifierTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.issuer = LocalIssuer(audience='client-id')
+
+    def test_keys_are_fetched_once_and_reused(self):
+        source = self.issuer.key_source()
+        verifier = GoogleTokenVerifier('client-id', key_source=source)
+        for _ in range(3):
+            idinfo = verifier.verify(self.issuer.issue('jane@example.com'))
+        self.assertEqual(idinfo['email'], 'jane@example.com')
+        self.assertEqual(source.fetches, 1)
+
+    def test_rejects_wrong_audience(self):
+        verifier = GoogleTokenVerifier('other-client', key_source=self.issuer.key_source())
+        with self.assertRaises(ValueError):
+            verifier.verify(self.issuer.issue('jane@example.com'))
+
+    def test_stale_keys_used_within_bound(self):
+        source = FlakyKeySource(self.issuer.key_source(max_age=0))
+        verifier = GoogleTokenVerifier('client-id', key_source=source, min_refresh_interval=0)
+        verifier.verify(self.issuer.issue('jane@example.com'))
+        source.down = True
+        self.assertEqual(verifier.verify(self.issuer.issue('jane@example.com'))['email'], 'jane@example.com')
+
+        verifier.max_stale = 0
+        with self.assertRaises(GoogleKeysUnavailable):
+            verifier.verify(self.issuer.issue('jane@example.com'))
+
+    def test_google_login_view_uses_configured_key_source(self):
+        token = self.issuer.issue('new@example.com', name='New User')
+        with self.settings(GOOGLE_OAUTH_CLIENT_ID='client-id',
+                           GOOGLE_ID_TOKEN_VERIFIER={'KEY_SOURCE': self.issuer.key_source()}):
+            response = APIClient().post('/api/auth/google/', {'access_token': token}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_new_user'])
+        self.assertEqual(response.data['user']['full_name'], 'New User')
+
+
+@override_settings(PASSWORD_HASHING_POOL={'MAX_WORKERS': 1, 'MAX_QUEUE': 0, 'RETRY_AFTER': 2})
+class HashingPoolTests(AuthTestMixin, TestCase):
+
+    def occupy_pool(self):
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=get_pool().run, args=(block,))
+        thread.start()
+        started.wait(5)
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+
+    def test_login_hashes_on_pool(self):
+        completed = hashing_stats()['completed']
+        response = self.client.post('/api/auth/login/', {
+            'email': 'jane@example.com', 'password': 'S3cure-pass!'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hashing_stats()['completed'], completed + 1)
+
+    def test_saturated_pool_fails_fast(self):
+        self.occupy_pool()
+        response = self.client.post('/api/auth/login/', {
+            'email': 'jane@example.com', 'password': 'S3cure-pass!'
+        }, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(hashing_stats()['rejected'], 1)
+
+    def test_saturated_pool_leaves_cheap_endpoints_alone(self):
+        self.login_as(self.user)
+        self.occupy_pool()
+        self.assertEqual(self.client.get('/api/auth/user/').status_code, 200)
+
+
+class LocalWindowStoreTests(TestCase):
+
+    def test_sliding_window(self):
+        now = [100.0]
+        store = LocalWindowStore(timer=lambda: now[0])
+        self.assertTrue(store.hit('k', 2, 10)[0])
+        self.assertTrue(store.hit('k', 2, 10)[0])
+        allowed, retry_after = store.hit('k', 2, 10)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+
+        # Halfway into the next window half of the previous count still applies
+        now[0] = 115.0
+        self.assertTrue(store.hit('k', 2, 10)[0])
+        self.assertFalse(store.hit('k', 2, 10)[0])
+
+        now[0] = 130.0
+        self.assertTrue(store.hit('k', 2, 10)[0])
+
+    def test_key_count_is_bounded(self):
+        store = LocalWindowStore(max_keys=2)
+        for key in 'abc':
+            store.hit(key, 1, 60)
+        self.assertEqual(len(store._windows), 2)
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'login.ip': '100/min', 'login.email': '2/min'},
+})
+class AuthThrottleTests(AuthTestMixin, TestCase):
+
+    def login(self, email):
+        return self.client.post('/api/auth/login/', {'email': email, 'password': 'wrong'}, format='json')
+
+    def test_email_limit_rejects_before_hashing(self):
+        self.assertEqual(self.login('jane@example.com').status_code, 400)
+        self.assertEqual(self.login('JANE@example.com').status_code, 400)
+        completed = hashing_stats()['completed']
+
+        response = self.login('jane@example.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(hashing_stats()['completed'], completed)
+
+        # Other accounts are unaffected
+        self.assertEqual(self.login('other@example.com').status_code, 400)
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login.ip': '2/min'},
+    })
+    def test_ip_limit_ignores_spoofed_forwarded_for(self):
+        for i in range(2):
+            response = self.client.post('/api/auth/login/', {'email': f'user{i}@example.com', 'password': 'wrong'},
+                                        format='json', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/auth/login/', {'email': 'user9@example.com', 'password': 'wrong'},
+                                    format='json', HTTP_X_FORWARDED_FOR='203.0.113.9')
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login.ip': '2/min'}, 'NUM_PROXIES': 1,
+    })
+    def test_ip_limit_trusts_configured_proxies(self):
+        for i in range(3):
+            response = self.client.post('/api/auth/login/', {'email': 'jane@example.com', 'password': 'wrong'},
+                                        format='json', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            self.assertEqual(response.status_code, 400)
+
+
+class AsyncAuthURLConf:
+    urlpatterns = [path('api/auth/', include(auth_urlpatterns(async_views=True)))]
+
+
+@override_settings(ROOT_URLCONF=AsyncAuthURLConf)
+class AsyncViewTests(AuthTestMixin, TestCase):
+
+    @sync_to_async
+    def sync_response(self, method, path, data=None):
+        """The same request against the sync views"""
+        with override_settings(ROOT_URLCONF='core.urls'):
+            self.client.cookies = self.async_client.cookies
+            return getattr(self.client, method)(path, data, format='json')
+
+    async def test_current_user_matches_sync_view(self):
+        self.async_client.cookies['access_token'] = str(tokens_for_user(self.user).access_token)
+        response = await self.async_client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, (await self.sync_response('get', '/api/auth/user/')).content)
+
+    async def test_unauthenticated_matches_sync_view(self):
+        response = await self.async_client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.content, (await self.sync_response('get', '/api/auth/user/')).content)
+
+    async def test_password_reset_is_queued(self):
+        response = await self.async_client.post(
+            '/api/auth/password-reset/', {'email': 'jane@example.com'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await OutboundEmail.objects.filter(to_email='jane@example.com').acount(), 1)
+
+    async def test_password_reset_unknown_email_matches_sync_view(self):
+        response = await self.async_client.post(
+            '/api/auth/password-reset/', {'email': 'nobody@example.com'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        expected = await self.sync_response('post', '/api/auth/password-reset/', {'email': 'nobody@example.com'})
+        self.assertEqual(response.content, expected.content)
+
+    async def test_password_reset_is_throttled(self):
+        for _ in range(3):
+            await self.async_client.post(
+                '/api/auth/password-reset/', {'email': 'jane@example.com'}, content_type='application/json'
+            )
+        response = await self.async_client.post(
+            '/api/auth/password-reset/', {'email': 'jane@example.com'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    async def test_google_login_creates_user(self):
+        issuer = LocalIssuer(audience='client-id')
+        with self.settings(GOOGLE_OAUTH_CLIENT_ID='client-id',
+                           GOOGLE_ID_TOKEN_VERIFIER={'KEY_SOURCE': issuer.key_source()}):
+            response = await self.async_client.post(
+                '/api/auth/google/', {'access_token': issuer.issue('new@example.com', name='New User')},
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_new_user'])
+        self.assertIn('access_token', response.cookies)
+
+    async def test_logout_revokes_refresh_token(self):
+        refresh = tokens_for_user(self.user)
+        self.async_client.cookies['access_token'] = str(refresh.access_token)
+        self.async_client.cookies['refresh_token'] = str(refresh)
+        response = await self.async_client.post('/api/auth/logout/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await RevokedToken.objects.filter(key=f"fam:{refresh['fam']}").aexists())
+
+
+class PerformanceMetricsTests(AuthTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def test_login_reports_hash_db_and_jwt_time(self):
+        response = self.client.post('/api/auth/login/', {
+            'email': 'jane@example.com', 'password': 'S3cure-pass!'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        entries = {entry.split(';')[0] for entry in response['Server-Timing'].split(', ')}
+        self.assertEqual(entries, {'total', 'db', 'hash', 'jwt'})
+        self.assertIn('queries"', response['Server-Timing'])
+
+    def test_metrics_endpoint_renders_histograms(self):
+        self.login_as(self.user)
+        self.client.get('/api/auth/user/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE auth_request_duration_seconds histogram', body)
+        self.assertIn('auth_request_duration_seconds_count{view="current-user"} 1', body)
+        self.assertIn('auth_db_queries_bucket{view="current-user",le="+Inf"} 1', body)
+
+    @override_settings(PERFORMANCE_METRICS={**settings.PERFORMANCE_METRICS, 'TOKEN': 'scrape-secret'})
+    def test_metrics_endpoint_requires_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PERFORMANCE_METRICS={**settings.PERFORMANCE_METRICS, 'SLOW_REQUEST_MS': 0})
+    def test_slow_requests_are_logged(self):
+        self.login_as(self.user)
+        with self.assertLogs('accounts.performance', 'WARNING') as logs:
+            self.client.get('/api/auth/user/')
+        self.assertIn('"view": "current-user"', logs.output[0])
+
+    @override_settings(PERFORMANCE_METRICS={**settings.PERFORMANCE_METRICS, 'ENABLED': False})
+    def test_disabled(self):
+        self.login_as(self.user)
+        response = self.client.get('/api/auth/user/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('current-user', registry.render())
+
+
+class FastSerializationTests(TestCase):
+
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(email='plain@example.com', password=None, full_name='Plain'),
+            CustomUser.objects.create_user(
+                email='rich@example.com', password=None, full_name='Zoë \u2028 "Quoted" \U0001F600',
+                phone='+1 555 0100', role='HOST', avatar='https://example.com/a.png?x=1&y=2',
+            ),
+        ]
+
+    def test_user_output_is_byte_identical(self):
+        for user in self.users + list(CustomUser.objects.only(*FastUserSerializer.fields)):
+            self.assertEqual(
+                FastJSONRenderer().render(FastUserSerializer(user).data),
+                JSONRenderer().render(UserSerializer(user).data),
+            )
+        self.assertEqual(
+            FastJSONRenderer().render(FastUserSerializer(self.users, many=True).data),
+            JSONRenderer().render(UserSerializer(self.users, many=True).data),
+        )
+        rows = CustomUser.objects.order_by('id').values(*FastUserSerializer.fields)
+        with timezone.override('America/New_York'):
+            self.assertEqual(
+                FastUserSerializer.from_values(rows),
+                UserSerializer(CustomUser.objects.order_by('id'), many=True).data,
+            )
+
+    def test_parser_matches_stock_parser(self):
+        body = '{"email": "zoë@example.com", "n": [1, 2.5, null, true]}'.encode()
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+        for invalid in (b'', b'{"a": NaN}', b'{"a": 1,}'):
+            with self.assertRaises(ParseError) as fast:
+                FastJSONParser().parse(BytesIO(invalid))
+            with self.assertRaises(ParseError) as stock:
+                JSONParser().parse(BytesIO(invalid))
+            self.assertEqual(str(fast.exception), str(stock.exception))
+
+
+class SignupTests(AuthTestMixin, TestCase):
+
+    def signup(self, email, password='An0ther-pass!'):
+        return self.client.post('/api/auth/signup/', {
+            'email': email, 'full_name': 'John Smith', 'password': password, 'password2': password,
+        }, format='json')
+
+    def test_signup_is_a_single_insert(self):
+        # The insert runs inside a savepoint in tests (SAVEPOINT, INSERT, RELEASE)
+        with self.assertNumQueries(3):
+            response = self.signup('john@a.com')
+        self.assertEqual(response.status_code, 201)
+
+    def test_same_local_part_does_not_collide(self):
+        self.assertEqual(self.signup('john@a.com').status_code, 201)
+        self.assertEqual(self.signup('john@b.com').status_code, 201)
+        usernames = set(CustomUser.objects.filter(email__startswith='john@').values_list('username', flat=True))
+        self.assertEqual(usernames, {username_for_email('john@a.com'), username_for_email('john@b.com')})
+        self.assertEqual(len(usernames), 2)
+
+    def test_duplicate_email_is_a_validation_error(self):
+        response = self.signup('jane@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'email': ['User with this email already exists.']})
+        self.assertEqual(CustomUser.objects.filter(email='jane@example.com').count(), 1)
+
+    def test_password_similar_to_user_is_rejected(self):
+        response = self.signup('johnsmith@example.com', password='johnsmith1')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+
+
+class BreachedPasswordTests(AuthTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        source = os.path.join(temp_dir.name, 'hashes.txt')
+        with open(source, 'w') as f:
+            for password in ('Breached-pass-1', 'Breached-pass-2'):
+                f.write(f'{hashlib.sha1(password.encode()).hexdigest().upper()}:42\n')
+            f.write('not a hash\n')
+        self.path = os.path.join(temp_dir.name, 'breach.bin')
+        out = StringIO()
+        call_command('build_breach_filter', source, self.path, '--probes', '1000', stdout=out)
+        self.report = json.loads(out.getvalue())
+
+    def test_filter_contains_listed_passwords_only(self):
+        self.assertEqual((self.report['items'], self.report['skipped_lines']), (2, 1))
+        breach_filter = BreachFilter(self.path)
+        self.addCleanup(breach_filter.close)
+        self.assertTrue(breach_filter.contains_password('Breached-pass-1'))
+        self.assertTrue(breach_filter.contains_password('Breached-pass-2'))
+        self.assertFalse(breach_filter.contains_password('S3cure-pass!'))
+        self.assertLess(breach_filter.false_positive_rate, 1e-5)
+
+    def test_signup_and_reset_reject_breached_passwords(self):
+        validators = settings.AUTH_PASSWORD_VALIDATORS + [
+            {'NAME': 'accounts.breach.BreachedPasswordValidator', 'OPTIONS': {'path': self.path}},
+        ]
+        with override_settings(AUTH_PASSWORD_VALIDATORS=validators):
+            response = self.client.post('/api/auth/signup/', {
+                'email': 'john@example.com', 'full_name': 'John Smith',
+                'password': 'Breached-pass-1', 'password2': 'Breached-pass-1',
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('data breach', response.json()['password'][0])
+
+            response = self.client.post('/api/auth/password-reset/confirm/', {
+                'uid': urlsafe_base64_encode(force_bytes(self.user.pk)),
+                'token': default_token_generator.make_token(self.user),
+                'new_password': 'Breached-pass-2',
+                'new_password2': 'Breached-pass-2',
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+
+
+class RouteMiddlewareTests(AuthTestMixin, TestCase):
+
+    def test_api_skips_session_and_frame_middleware(self):
+        self.login_as(self.user)
+        response = self.client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Frame-Options', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        # Security middleware still runs
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+    def test_admin_keeps_full_stack(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.get('/admin/login/')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertIn('csrftoken', response.cookies)
+        # CsrfViewMiddleware.process_view is relayed by RouteMiddleware
+        response = client.post('/admin/login/', {'username': 'jane@example.com', 'password': 'S3cure-pass!'})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_async_handler(self):
+        client = AsyncClient()
+        response = await client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        response = await client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-Frame-Options', response)
+
+    @override_settings(ROUTE_MIDDLEWARE={**settings.ROUTE_MIDDLEWARE, 'DEFAULT': []})
+    def test_admin_requirements_are_checked(self):
+        errors = check_admin_middleware(None)
+        self.assertEqual([error.id for error in errors], ['accounts.E001', 'accounts.E002', 'accounts.E003'])
+
+
+class ConditionalProfileTests(AuthTestMixin, TestCase):
+
+    def test_unchanged_profile_is_not_modified(self):
+        self.login_as(self.user)
+        response = self.client.get('/api/auth/user/')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"') and str(self.user.pk) in etag)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_profile_change_invalidates_etag(self):
+        self.login_as(self.user)
+        etag = self.client.get('/api/auth/user/')['ETag']
+        self.user.full_name = 'Jane Roe'
+        self.user.save()
+
+        response = self.client.get('/api/auth/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['full_name'], 'Jane Roe')
+        self.assertNotEqual(response['ETag'], etag)
+
+    @override_settings(AUTH_PROFILE_CLAIMS=True)
+    def test_etag_from_claims_needs_no_query(self):
+        self.client.cookies['access_token'] = str(tokens_for_user(self.user).access_token)
+        etag = self.client.get('/api/auth/user/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(ROOT_URLCONF=AsyncAuthURLConf)
+    async def test_async_view(self):
+        self.async_client.cookies['access_token'] = str(tokens_for_user(self.user).access_token)
+        etag = (await self.async_client.get('/api/auth/user/'))['ETag']
+        response = await self.async_client.get('/api/auth/user/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class UserBatchTests(AuthTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = CustomUser.objects.create_user(email='host@example.com', password=None, role='HOST',
+                                                   is_staff=True)
+        self.login_as(self.host)
+        # Warm the user cache so only the lookup itself is counted
+        self.client.get('/api/auth/user/')
+
+    def batch(self, **payload):
+        return self.client.post('/api/auth/users/batch/', payload, format='json')
+
+    def test_one_query_regardless_of_size(self):
+        CustomUser.objects.bulk_create(
+            CustomUser(email=f'cand{i}@example.com', username=f'cand{i}', full_name=f'Cand {i}')
+            for i in range(199)
+        )
+        ids = list(CustomUser.objects.values_list('id', flat=True))
+        for batch in (ids[:1], ids):
+            with self.assertNumQueries(1):
+                response = self.batch(ids=batch)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([user['id'] for user in response.json()['users']], batch)
+
+    def test_duplicates_collapse_and_missing_are_reported(self):
+        response = self.batch(
+            ids=[self.user.pk, 999999, self.user.pk],
+            emails=['jane@EXAMPLE.com', 'host@example.com', 'nobody@example.com'],
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([user['email'] for user in data['users']], ['jane@example.com', 'host@example.com'])
+        self.assertEqual(data['users'][0], UserSerializer(self.user).data)
+        self.assertEqual(data['missing'], {'ids': [999999], 'emails': ['nobody@example.com']})
+
+    def test_limits_and_permissions(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch(ids=list(range(1, 502))).status_code, 400)
+        self.login_as(self.user)
+        self.assertEqual(self.batch(ids=[self.host.pk]).status_code, 403)
+
+    def test_hosts_who_are_not_staff_see_no_contact_details(self):
+        host = CustomUser.objects.create_user(email='other-host@example.com', password=None, role='HOST')
+        self.login_as(host)
+        response = self.batch(ids=[self.user.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['users'], [
+            {'id': self.user.pk, 'full_name': 'Jane Doe', 'role': 'CANDIDATE', 'avatar': None},
+        ])
+        self.assertEqual(self.batch(emails=['jane@example.com']).status_code, 403)
+
+
+def avatar_image(width, height, color='red'):
+    """JPEG bytes; a JPEG-looking stand-in without Pillow, which serves originals as they are"""
+    if pillow() is None:
+        return b'\xff\xd8\xff' + f'{width}x{height}-{color}'.encode().ljust(1000, b'.')
+    Image, _ = pillow()
+    out = BytesIO()
+    Image.new('RGB', (width, height), color).save(out, 'JPEG')
+    return out.getvalue()
+
+
+class AvatarTests(AuthTestMixin, TestCase):
+    URL = 'https://lh3.googleusercontent.com/a/jane'
+
+    def setUp(self):
+        super().setUp()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.image = avatar_image(400, 300)
+        self.fetcher = StaticFetcher({self.URL: self.image})
+        override = override_settings(AVATARS={
+            **settings.AVATARS, 'CACHE_DIR': temp_dir.name, 'FETCHER': self.fetcher, 'SENDFILE_HEADER': '',
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        CustomUser.objects.filter(pk=self.user.pk).update(avatar=self.URL)
+        self.login_as(self.user)
+
+    def avatar(self, pk=None, **params):
+        return self.client.get(f'/api/auth/users/{pk or self.user.pk}/avatar/', params)
+
+    def test_redirects_to_immutable_thumbnail_fetched_once(self):
+        response = self.avatar(size=96)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=3600')
+        location = response['Location']
+        self.assertTrue(location.startswith(f'/api/auth/avatars/{hashlib.sha256(self.image).hexdigest()}-96.'))
+
+        self.assertEqual(self.avatar(size=96)['Location'], location)
+        self.assertEqual(self.avatar(size=48).status_code, 302)
+        self.assertEqual(self.fetcher.fetches, 1)
+
+        response = self.client.get(location)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        content = b''.join(response.streaming_content)
+        if pillow() is None:
+            self.assertEqual(content, self.image)
+        else:
+            Image, _ = pillow()
+            self.assertEqual(Image.open(BytesIO(content)).size, (96, 96))
+
+    def test_other_users_and_errors(self):
+        other = CustomUser.objects.create_user(email='john@example.com', password=None)
+        self.assertEqual(self.avatar(other.pk).status_code, 404)
+        CustomUser.objects.filter(pk=other.pk).update(avatar='http://169.254.169.254/latest/')
+        self.assertEqual(self.avatar(other.pk).status_code, 404)
+        CustomUser.objects.filter(pk=other.pk).update(avatar='https://lh3.googleusercontent.com/a/gone')
+        with self.assertLogs('accounts.avatars', 'WARNING'):
+            self.assertEqual(self.avatar(other.pk).status_code, 502)
+        # Failures are remembered for a while rather than retried on every request
+        self.assertEqual(self.avatar(other.pk).status_code, 502)
+        self.assertEqual(self.fetcher.fetches, 1)
+
+        self.assertEqual(self.avatar(size=100).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/auth/avatars/{"0" * 64}-96.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/api/auth/avatars/..%2Fdb.sqlite3').status_code, 404)
+        self.client.cookies.clear()
+        self.assertEqual(self.avatar().status_code, 401)
+
+    def test_sendfile_header(self):
+        location = self.avatar()['Location']
+        with override_settings(AVATARS={**settings.AVATARS, 'SENDFILE_HEADER': 'X-Accel-Redirect'}):
+            response = self.client.get(location)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/avatars/' + location.rsplit('/', 1)[1])
+        self.assertEqual(response.content, b'')
+
+    def test_evicts_least_recently_used(self):
+        urls = [f'https://lh3.googleusercontent.com/a/{color}' for color in ('red', 'green')]
+        fetcher = StaticFetcher({url: avatar_image(400, 300, url.rsplit('/', 1)[1]) for url in urls})
+        store = AvatarStore(settings.AVATARS['CACHE_DIR'], fetcher, max_bytes=10 ** 9, sizes=[96],
+                            source_hosts=['*.googleusercontent.com'])
+        red = store.thumbnail(urls[0], 96)
+        store.thumbnail(urls[1], 96)
+
+        # Everything was last used two hours ago, then red is shown again
+        two_hours_ago = time.time() - 2 * 60 * 60
+        for _, path, _ in store.scan()[0]:
+            os.utime(path, (two_hours_ago, two_hours_ago))
+        self.assertEqual(store.thumbnail(urls[0], 96), red)
+
+        recent = [(os.path.basename(path), size) for mtime, path, size in store.scan()[0] if mtime > two_hours_ago]
+        store.max_bytes = int(sum(size for _, size in recent) / 0.9) + 1
+        store.evict()
+        red_index = 'url-' + hashlib.sha256(urls[0].encode()).hexdigest()
+        self.assertEqual(sorted(name for name, _ in recent), sorted([red, red_index]))
+        self.assertEqual(sorted(os.path.basename(path) for _, path, _ in store.scan()[0]), sorted([red, red_index]))
+
+        # Green is fetched again, and writing it evicts down to the limit by itself
+        store.thumbnail(urls[1], 96)
+        self.assertEqual(fetcher.fetches, 3)
+        self.assertLessEqual(store.scan()[1], store.max_bytes)
+        self.assertGreater(store.stats()['evictions'], 0)
+
+
+class StartupReportTests(TestCase):
+
+    def test_fails_over_budget_and_keeps_google_lazy(self):
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, 'exceeds the 0 ms budget'):
+            call_command('startup_report', '--runs', '1', '--budget-ms', '0', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertFalse(report['within_budget'])
+        self.assertEqual(report['lazy_modules_imported'], {'google.auth': False, 'PIL': False})
+
+
+class TouchBufferTests(AuthTestMixin, TestCase):
+
+    def test_logins_are_coalesced_into_one_update(self):
+        other = CustomUser.objects.create_user(email='john@example.com', password='S3cure-pass!')
+        for email in ('jane@example.com', 'john@example.com', 'jane@example.com'):
+            response = self.client.post('/api/auth/login/', {'email': email, 'password': 'S3cure-pass!'},
+                                        format='json')
+            self.assertEqual(response.status_code, 200)
+
+        self.assertIsNone(CustomUser.objects.get(pk=self.user.pk).last_login)
+        with self.assertNumQueries(1):
+            self.assertEqual(touch_buffer.flush(), 2)
+        self.assertIsNotNone(CustomUser.objects.get(pk=self.user.pk).last_login)
+        self.assertIsNotNone(CustomUser.objects.get(pk=other.pk).last_login)
+
+    def test_last_value_wins(self):
+        earlier, later = timezone.now() - timedelta(hours=1), timezone.now()
+        touch_buffer.touch(self.user, 'last_login', later)
+        touch_buffer.touch(self.user, 'last_login', earlier)
+        touch_buffer.flush()
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).last_login, earlier)
+
+    @override_settings(TOUCH_BUFFER={**settings.TOUCH_BUFFER, 'MAX_PENDING': 2})
+    def test_flushes_inline_when_full(self):
+        other = CustomUser.objects.create_user(email='john@example.com', password=None)
+        touch_buffer.touch(self.user, 'last_login')
+        self.assertEqual(touch_buffer.stats()['pending'], 1)
+        touch_buffer.touch(other, 'last_login')
+        self.assertEqual(touch_buffer.stats()['pending'], 0)
+        self.assertEqual(CustomUser.objects.filter(last_login__isnull=False).count(), 2)
+
+    @override_settings(TOUCH_BUFFER={**settings.TOUCH_BUFFER, 'MAX_PENDING': 1})
+    def test_forked_worker_starts_its_own_flusher(self):
+        buffer = TouchBuffer()
+        flushed = threading.Event()
+        buffer.flush = flushed.set
+        # What a worker forked from a server that called start() inherits: the
+        # parent's pid and a thread object that does not run in this process
+        buffer._background = True
+        buffer._pid, buffer._thread = os.getpid() + 1, threading.Thread(target=lambda: None)
+        buffer.touch(self.user, 'last_login')
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual(buffer._pid, os.getpid())
+        self.assertTrue(buffer._thread.is_alive())
+
+    @override_settings(TOUCH_BUFFER={**settings.TOUCH_BUFFER, 'ENABLED': False})
+    def test_disabled_writes_through(self):
+        with self.assertNumQueries(1):
+            touch_buffer.touch(self.user, 'last_login')
+        self.assertEqual(touch_buffer.stats()['pending'], 0)
+        self.assertIsNotNone(CustomUser.objects.get(pk=self.user.pk).last_login)
+
+
+class BenchmarkReportTests(TestCase):
+
+    def test_percentiles_use_nearest_rank(self):
+        samples = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(samples, 50), 0.05)
+        self.assertEqual(percentile(samples, 99), 0.099)
+        report = summarize(samples, wall_time=2.0, errors=1)
+        self.assertEqual(report['throughput_rps'], 50.0)
+        self.assertEqual(report['p95_ms'], 95.0)
+        self.assertEqual(report['errors'], 1)
+
+
+class ImportUsersCommandTests(TestCase):
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        CustomUser.objects.create_user(email='taken@example.com', password=None, full_name='Taken')
+
+    def test_imports_valid_rows_and_writes_rejects(self):
+        password_hash = 'pbkdf2_sha256$1000$salt$AdY3PnBq0OWlrvxb6ijxj5XOfHWjR6aGrh1uMoy3sDw='
+        source = self.write_file('users.csv', (
+            'email,full_name,role,password,password_hash\n'
+            'host@example.com,Host,HOST,S3cure-pass!,\n'
+            f'hashed@example.com,Hashed,,,{password_hash}\n'
+            'not-an-email,Broken,,,\n'
+            'host@example.com,Duplicate,,,\n'
+            'taken@example.com,Taken Again,,,\n'
+        ))
+        rejects = os.path.join(self.tmpdir.name, 'rejects.csv')
+        call_command('import_users', source, workers=0, batch_size=2, rejects=rejects,
+                     stdout=StringIO(), stderr=StringIO())
+
+        host = CustomUser.objects.get(email='host@example.com')
+        self.assertEqual(host.role, 'HOST')
+        self.assertTrue(host.check_password('S3cure-pass!'))
+        self.assertEqual(CustomUser.objects.get(email='hashed@example.com').password, password_hash)
+        with open(rejects) as f:
+            reasons = [line.rstrip().split(',', 2)[2] for line in f.readlines()[1:]]
+        self.assertEqual(reasons, ['invalid email', 'duplicate email in input', 'email already registered'])
+
+    def test_jsonl_input(self):
+        source = self.write_file('users.jsonl', (
+            '{"email": "one@example.com", "full_name": "One"}\n'
+            'not json\n'
+            '{"email": "two@example.com", "full_name": "Two", "password": 12345678}\n'
+            '{"email": "three@example.com", "full_name": "Three", "password_hash": ["x"]}\n'
+        ))
+        out = StringIO()
+        rejects = os.path.join(self.tmpdir.name, 'rejects.csv')
+        call_command('import_users', source, workers=0, rejects=rejects, stdout=out, stderr=StringIO())
+        self.assertTrue(CustomUser.objects.filter(email='one@example.com').exists())
+        self.assertIn('"rejected": 3', out.getvalue())
+        with open(rejects) as f:
+            reasons = [line.rstrip().split(',', 2)[2] for line in f.readlines()[2:]]
+        self.assertEqual(reasons, ['invalid password', 'invalid password'])
+
+
+class UserDirectoryTests(AuthTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = CustomUser.objects.create_user(
+            email='host@example.com', password=None, full_name='Host', role='HOST', is_staff=True
+        )
+        created_at = self.user.created_at
+        CustomUser.objects.bulk_create(
+            CustomUser(email=f'cand{i}@example.com', username=f'cand{i}', full_name=f'Candidate {i}',
+                       is_active=i % 5 != 0)
+            for i in range(12)
+        )
+        # Force ties on created_at so the id tiebreaker is exercised
+        CustomUser.objects.filter(email__startswith='cand').update(created_at=created_at)
+        self.login_as(self.host)
+
+    def walk(self, url):
+        emails = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            emails += [user['email'] for user in response.data['results']]
+            url = response.data['next']
+        return emails
+
+    def test_cursor_walk_returns_every_row_once(self):
+        emails = self.walk('/api/auth/users/?page_size=5')
+        expected = list(CustomUser.objects.order_by('-created_at', '-id').values_list('email', flat=True))
+        self.assertEqual(emails, expected)
+
+    def test_filters(self):
+        emails = self.walk('/api/auth/users/?role=CANDIDATE&is_active=false&page_size=2')
+        self.assertEqual(sorted(emails), ['cand0@example.com', 'cand10@example.com', 'cand5@example.com'])
+        self.assertEqual(self.client.get('/api/auth/users/?role=ADMIN').status_code, 400)
+
+    def test_later_pages_cost_one_query(self):
+        next_url = self.client.get('/api/auth/users/?page_size=3').data['next']
+        with self.assertNumQueries(1):
+            self.client.get(next_url)
+
+    def test_candidates_cannot_browse(self):
+        self.login_as(self.user)
+        self.assertEqual(self.client.get('/api/auth/users/').status_code, 403)
+
+    def test_hosts_who_are_not_staff_see_no_contact_details(self):
+        CustomUser.objects.filter(pk=self.host.pk).update(is_staff=False)
+        response = self.client.get('/api/auth/users/?page_size=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({tuple(user) for user in response.data['results']}, {('id', 'full_name', 'role', 'avatar')})
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+
+class UserAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create([
+            CustomUser(email='john.smith@example.com', username='js', full_name='John Smith', phone='+15550100'),
+            CustomUser(email='johanna@example.com', username='jo', full_name='Johanna Berg'),
+            CustomUser(email='mary@example.com', username='ma', full_name='Mary Johnson'),
+            CustomUser(email='Ronald.McDonald@example.com', username='rm', full_name='Ronald McDonald'),
+        ])
+        cls.admin_user = CustomUser.objects.create_superuser('admin@example.com', 'unused', full_name='Admin')
+
+    def search(self, term):
+        model_admin = UserAdmin(CustomUser, admin.site)
+        queryset, may_have_duplicates = model_admin.get_search_results(None, CustomUser.objects.all(), term)
+        self.assertFalse(may_have_duplicates)
+        return sorted(queryset.values_list('email', flat=True))
+
+    def test_search_paths(self):
+        self.assertEqual(self.search('mary@example.com'), ['mary@example.com'])
+        self.assertEqual(self.search('joh'), ['johanna@example.com', 'john.smith@example.com', 'mary@example.com'])
+        self.assertEqual(self.search('John'), ['john.smith@example.com', 'mary@example.com'])
+        self.assertEqual(self.search('+1555'), ['john.smith@example.com'])
+        # Anywhere in the name, any case
+        self.assertEqual(self.search('smith'), ['john.smith@example.com'])
+        self.assertEqual(self.search('mcdonald'), ['Ronald.McDonald@example.com'])
+        # Mixed-case local parts
+        self.assertEqual(self.search('ronald.mcdonald@example.com'), ['Ronald.McDonald@example.com'])
+        self.assertEqual(self.search('ronald.mc'), ['Ronald.McDonald@example.com'])
+
+    def test_count_is_bounded(self):
+        paginator = EstimatedCountPaginator(CustomUser.objects.order_by('id'), 1)
+        paginator.count_limit = 2
+        self.assertEqual(paginator.count, 3)
+
+    def test_changelist_renders(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.get('/admin/accounts/customuser/', {'q': 'joh'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'johanna@example.com')
@@ -0,0 +1,201 @@
+"""
+Sliding-window rate limiting for the unauthenticated auth endpoints, and for
+authenticated endpoints that are expensive or can be abused (bulk invites).
+
+Each view sets a `throttle_scope` (e.g. 'login'); limits are looked up in
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] under '<scope>.ip', '<scope>.email',
+'<scope>.user' and '<scope>.global'. A missing rate disables that key for the scope.
+
+Counts use the sliding-window-counter approximation: two fixed windows per key,
+with the previous window weighted by how much of it still overlaps the sliding
+window. That is O(1) time and memory per key, unlike DRF's timestamp lists.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60)"""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+def sliding_estimate(previous, current, elapsed, duration):
+    return previous * (1 - elapsed / duration) + current
+
+
+def retry_delay(previous, current, elapsed, limit, duration):
+    """Seconds until the sliding estimate drops below limit again"""
+    if current >= limit:
+        # Only possible once the current window becomes the previous one and decays
+        return (duration - elapsed) + duration * (1 - limit / current)
+    # The previous window has to decay until previous * (1 - t / duration) < limit - current
+    return max(duration * (1 - (limit - current) / previous) - elapsed, 0)
+
+
+class LocalWindowStore:
+    """In-process counters; each worker enforces the limits on its own traffic"""
+
+    def __init__(self, max_keys=100000, timer=time.time):
+        self.max_keys = max_keys
+        self.timer = timer
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, duration):
+        """Count one request for key; return (allowed, retry_after)"""
+        now = self.timer()
+        window, offset = divmod(now, duration)
+
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[0] < window - 1:
+                previous, current = 0, 0
+            elif entry[0] == window - 1:
+                previous, current = entry[2], 0
+            else:
+                previous, current = entry[1], entry[2]
+
+            if sliding_estimate(previous, current, offset, duration) >= limit:
+                self._windows[key] = (window, previous, current)
+                return False, retry_delay(previous, current, offset, limit, duration)
+
+            self._windows[key] = (window, previous, current + 1)
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        return True, None
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class CacheWindowStore:
+    """
+    Counters in a shared Django cache (e.g. Redis or Memcached) so limits hold
+    across all workers. Uses atomic incr on one key per window.
+    """
+
+    def __init__(self, alias='default', key_prefix='throttle', timer=time.time):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+        self.timer = timer
+
+    def hit(self, key, limit, duration):
+        now = self.timer()
+        window, offset = divmod(now, duration)
+        current_key = f'{self.key_prefix}:{key}:{int(window)}'
+        previous_key = f'{self.key_prefix}:{key}:{int(window) - 1}'
+
+        counts = self.cache.get_many([previous_key, current_key])
+        previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+        if sliding_estimate(previous, current, offset, duration) >= limit:
+            return False, retry_delay(previous, current, offset, limit, duration)
+
+        self.cache.add(current_key, 0, timeout=int(duration * 2))
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(current_key, 1, timeout=int(duration * 2))
+        return True, None
+
+    def clear(self):
+        self.cache.clear()
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide counter store configured from AUTH_THROTTLE"""
+    global _store
+    if _store is None:
+        options = getattr(settings, 'AUTH_THROTTLE', {})
+        store_class = import_string(options.get('STORE', 'accounts.throttling.LocalWindowStore'))
+        _store = store_class(**options.get('OPTIONS', {}))
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'AUTH_THROTTLE':
+        _store = None
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Base class; subclasses pick the key the requests are counted under"""
+    kind = None
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}.{self.kind}') if scope else None
+        if rate is None:
+            return True
+
+        ident = self.get_key_ident(request)
+        if ident is None:
+            return True
+
+        limit, duration = parse_rate(rate)
+        allowed, self.retry_after = get_store().hit(f'{scope}.{self.kind}:{ident}', limit, duration)
+        return allowed
+
+    def get_key_ident(self, request):
+        raise NotImplementedError('.get_key_ident() must be overridden')
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    kind = 'ip'
+
+    def get_key_ident(self, request):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(SlidingWindowThrottle):
+    """Counts per target account, so one address can't be hammered from many IPs"""
+    kind = 'email'
+
+    def get_key_ident(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            return None
+        return email.strip().lower()
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    """Counts per signed-in user, whatever IPs their requests come from"""
+    kind = 'user'
+
+    def get_key_ident(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return str(user.pk)
+
+
+class GlobalRateThrottle(SlidingWindowThrottle):
+    kind = 'global'
+
+    def get_key_ident(self, request):
+        return '*'
+
+
+AUTH_THROTTLE_CLASSES = [IPRateThrottle, EmailRateThrottle, GlobalRateThrottle]
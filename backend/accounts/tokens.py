@@ -0,0 +1,66 @@
+"""
+JWT helpers for minting tokens and rebuilding users from profile claims
+"""
+from django.conf import settings
+from django.db import router
+from django.db.models import DEFERRED
+from django.utils.dateparse import parse_datetime
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .metrics import timed
+from .models import CustomUser
+
+
+# Profile fields carried as signed claims when AUTH_PROFILE_CLAIMS is on.
+# Together with the user id claim these cover every field of UserSerializer,
+# and updated_at the ETag of profile responses.
+PROFILE_CLAIMS = ('email', 'full_name', 'phone', 'role', 'avatar', 'created_at', 'updated_at')
+DATETIME_CLAIMS = ('created_at', 'updated_at')
+
+
+def profile_claims_enabled():
+    return getattr(settings, 'AUTH_PROFILE_CLAIMS', False)
+
+
+def tokens_for_user(user, family=None):
+    """
+    Mint a refresh token (and its access token) for the given user, embedding
+    the profile claims when claims-only authentication is enabled. Tokens
+    rotated from one login share its family, so a replay can revoke them all.
+    """
+    with timed('jwt'):
+        refresh = RefreshToken.for_user(user)
+    refresh['fam'] = family or refresh['jti']
+
+    if profile_claims_enabled():
+        for field in PROFILE_CLAIMS:
+            value = getattr(user, field)
+            if field in DATETIME_CLAIMS and value is not None:
+                value = value.isoformat()
+            refresh[field] = value
+
+    return refresh
+
+
+def has_profile_claims(validated_token):
+    return all(claim in validated_token for claim in PROFILE_CLAIMS)
+
+
+def user_from_claims(validated_token):
+    """
+    Build a CustomUser instance from token claims without querying the database.
+    Fields that are not carried in the token are deferred, so reading one of
+    them loads just that column on first access.
+    """
+    values = {'id': validated_token[api_settings.USER_ID_CLAIM]}
+    for field in DATETIME_CLAIMS:
+        values[field] = parse_datetime(validated_token[field] or '')
+    for field in PROFILE_CLAIMS:
+        values.setdefault(field, validated_token[field])
+
+    field_values = [
+        values[f.attname] if f.attname in values else DEFERRED
+        for f in CustomUser._meta.concrete_fields
+    ]
+    return CustomUser.from_db(router.db_for_read(CustomUser), None, field_values)
@@ -0,0 +1,191 @@
+"""
+Write-behind buffer for "touch" timestamps such as last_login.
+
+touch(user, 'last_login') sets the value on the instance at once but only
+queues the database write. Writes to the same row coalesce (last value wins)
+and are flushed with one bulk_update per model and field, either by the
+background flusher that servers start (see core/wsgi.py and core/asgi.py),
+one per process, at most MAX_DELAY seconds later, or inline by the touch that
+finds the buffer full or overdue. Whatever is pending when the process exits is flushed too.
+With TOUCH_BUFFER['ENABLED'] off every touch is written through immediately.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def touch_setting(name):
+    defaults = {
+        'ENABLED': True,
+        'MAX_DELAY': 10,  # seconds a touch may wait before it is written
+        'MAX_PENDING': 500,  # rows waiting that force a flush
+        'BATCH_SIZE': 500,  # rows per UPDATE statement
+    }
+    return getattr(settings, 'TOUCH_BUFFER', {}).get(name, defaults[name])
+
+
+class TouchBuffer:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._background = False
+        self._thread = None
+        self._pid = None  # process that started _thread
+        self._reset()
+        self.touches = 0
+        self.rows_written = 0
+        self.flushes = 0
+
+    def _reset(self):
+        self._pending = defaultdict(dict)  # (model, field) -> {pk: value}
+        self._count = 0
+        self._first_at = None
+
+    def touch(self, instance, field, value=None):
+        value = value or timezone.now()
+        setattr(instance, field, value)
+
+        if not touch_setting('ENABLED'):
+            type(instance)._base_manager.filter(pk=instance.pk).update(**{field: value})
+            return
+
+        with self._lock:
+            rows = self._pending[(type(instance), field)]
+            if instance.pk not in rows:
+                self._count += 1
+            rows[instance.pk] = value
+            self.touches += 1
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            due = (self._count >= touch_setting('MAX_PENDING')
+                   or time.monotonic() - self._first_at >= touch_setting('MAX_DELAY'))
+
+        if self._background:
+            self._ensure_thread()
+        if due:
+            if self._background:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def flush(self):
+        """Write everything pending; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._reset()
+
+            written = 0
+            for (model, field), values in pending.items():
+                rows = []
+                # Primary key order keeps row locks in a consistent order across workers
+                for pk in sorted(values):
+                    row = model(pk=pk)
+                    setattr(row, field, values[pk])
+                    rows.append(row)
+                try:
+                    model._base_manager.bulk_update(rows, [field], batch_size=touch_setting('BATCH_SIZE'))
+                except Exception:
+                    self._requeue(model, field, values)
+                    raise
+                written += len(rows)
+
+            self.rows_written += written
+            self.flushes += 1
+            return written
+
+    def _requeue(self, model, field, values):
+        with self._lock:
+            rows = self._pending[(model, field)]
+            for pk, value in values.items():
+                # A newer touch that arrived meanwhile wins
+                if pk not in rows:
+                    rows[pk] = value
+                    self._count += 1
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+
+    def clear(self):
+        """Drop pending writes"""
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._count,
+                'touches': self.touches,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+            }
+
+    def start(self):
+        """
+        Flush from a daemon thread every MAX_DELAY seconds, for long-running servers.
+        Threads do not survive fork(), so workers forked from a server that loaded
+        the app first (gunicorn --preload) start their own on their first touch.
+        """
+        self._background = True
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='touch-buffer', daemon=True)
+            self._thread.start()
+
+    def _after_fork(self):
+        # A lock some parent thread held at fork() time would never be released here
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(touch_setting('MAX_DELAY'))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered touches failed; will retry')
+            finally:
+                close_old_connections()
+
+
+touch_buffer = TouchBuffer()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=touch_buffer._after_fork)
+
+
+def touch(instance, field, value=None):
+    touch_buffer.touch(instance, field, value)
+
+
+@atexit.register
+def flush_on_exit():
+    if touch_buffer.stats()['pending']:
+        try:
+            touch_buffer.flush()
+        except Exception:
+            logger.exception('Flushing buffered touches at exit failed')
+
+
+def buffered_update_last_login(sender, user, **kwargs):
+    """Drop-in for django.contrib.auth.models.update_last_login"""
+    touch(user, 'last_login')
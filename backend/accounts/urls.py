@@ -1,16 +1,41 @@
+from django.conf import settings
 from django.urls import path
+from .avatars import serve_avatar
 from .views import (
     SignupView, LoginView, LogoutView, CurrentUserView,
     PasswordResetRequestView, PasswordResetConfirmView,
-    GoogleLoginView
+    GoogleLoginView, UserListView, UserBatchView, AvatarView, RefreshTokenView,
+    InviteBatchView, InviteBatchDetailView,
 )
 
-urlpatterns = [
-    path('signup/', SignupView.as_view(), name='signup'),
-    path('login/', LoginView.as_view(), name='login'),
-    path('logout/', LogoutView.as_view(), name='logout'),
-    path('user/', CurrentUserView.as_view(), name='current-user'),
-    path('password-reset/', PasswordResetRequestView.as_view(), name='password-reset'),
-    path('password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
-    path('google/', GoogleLoginView.as_view(), name='google-login'),
-]
+
+def auth_urlpatterns(async_views=False):
+    """URL patterns of the auth API, optionally with the native async views"""
+    current_user, logout, password_reset, google_login = (
+        CurrentUserView, LogoutView, PasswordResetRequestView, GoogleLoginView
+    )
+    if async_views:
+        from .async_views import (
+            AsyncCurrentUserView as current_user, AsyncLogoutView as logout,
+            AsyncPasswordResetRequestView as password_reset, AsyncGoogleLoginView as google_login,
+        )
+
+    return [
+        path('signup/', SignupView.as_view(), name='signup'),
+        path('login/', LoginView.as_view(), name='login'),
+        path('logout/', logout.as_view(), name='logout'),
+        path('token/refresh/', RefreshTokenView.as_view(), name='token-refresh'),
+        path('user/', current_user.as_view(), name='current-user'),
+        path('users/', UserListView.as_view(), name='user-list'),
+        path('users/batch/', UserBatchView.as_view(), name='user-batch'),
+        path('users/<int:pk>/avatar/', AvatarView.as_view(), name='user-avatar'),
+        path('avatars/<str:name>', serve_avatar, name='avatar-file'),
+        path('invites/', InviteBatchView.as_view(), name='invite-batch'),
+        path('invites/<int:pk>/', InviteBatchDetailView.as_view(), name='invite-batch-detail'),
+        path('password-reset/', password_reset.as_view(), name='password-reset'),
+        path('password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
+        path('google/', google_login.as_view(), name='google-login'),
+    ]
+
+
+urlpatterns = auth_urlpatterns(getattr(settings, 'AUTH_ASYNC_VIEWS', False))
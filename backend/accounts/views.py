@@ -1,56 +1,170 @@
-from rest_framework import status
+import hashlib
+import logging
+
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied, Throttled, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth.signals import user_logged_in
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.conf import settings
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-from .models import CustomUser
+from django.db.models import Q
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from .avatars import FetchError, SourceNotAllowed, avatar_setting, get_store as get_avatar_store
+from .google import GoogleKeysUnavailable, verify_google_token
+from .invites import InviteQuotaExceeded, batch_progress, create_invite_batch
+from .mail import enqueue_mail
+from .metrics import timed
+from .models import CustomUser, InviteBatch
+from .pagination import KeysetPagination
+from .permissions import IsHost
+from .routers import read_from_replica
+from . import revocation
+from .throttling import AUTH_THROTTLE_CLASSES, GlobalRateThrottle, UserRateThrottle
+from .tokens import tokens_for_user
 from .serializers import (
-    SignupSerializer, LoginSerializer, UserSerializer,
+    SignupSerializer, LoginSerializer, FastUserSerializer, FastDirectoryUserSerializer,
     PasswordResetRequestSerializer, PasswordResetConfirmSerializer,
-    GoogleLoginSerializer
+    GoogleLoginSerializer, UserBatchSerializer, InviteBatchSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+
+def set_auth_cookies(response, refresh):
+    """Set the refresh (7 days) and access (1 hour) token cookies"""
+    with timed('jwt'):
+        refresh_value, access_value = str(refresh), str(refresh.access_token)
+    response.set_cookie(
+        key='refresh_token',
+        value=refresh_value,
+        httponly=True,
+        secure=not settings.DEBUG,
+        samesite='Lax',
+        max_age=7 * 24 * 60 * 60
+    )
+    response.set_cookie(
+        key='access_token',
+        value=access_value,
+        httponly=True,
+        secure=not settings.DEBUG,
+        samesite='Lax',
+        max_age=60 * 60
+    )
+
+
+# Changes whenever the fields of a profile response change, e.g. across deploys
+PROFILE_FORMAT = hashlib.blake2b(','.join(FastUserSerializer.fields).encode(), digest_size=4).hexdigest()
+
+
+def profile_etag(user):
+    """
+    Strong validator of FastUserSerializer(user).data: every save bumps
+    updated_at, so it is computed from the id and updated_at already on the
+    (usually cached) user, without serializing
+    """
+    return f'"{PROFILE_FORMAT}-{user.pk}-{user.updated_at.timestamp():.6f}"'
+
+
+def profile_not_modified(request, user):
+    """304 response when the client's copy of the profile is current, else None"""
+    etag = profile_etag(user)
+    response = get_conditional_response(request, etag=etag, last_modified=user.updated_at.timestamp())
+    if response is not None:
+        set_profile_validators(response, user, etag)
+    return response
+
+
+def set_profile_validators(response, user, etag=None):
+    response['ETag'] = etag or profile_etag(user)
+    response['Last-Modified'] = http_date(user.updated_at.timestamp())
+    # Per-user and revalidated on every use
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Cookie'])
+
+
+def clear_auth_cookies(response):
+    response.delete_cookie('access_token')
+    response.delete_cookie('refresh_token')
+
+
+def read_refresh_cookie(request):
+    """Validated refresh token from the cookie, or None"""
+    raw = request.COOKIES.get('refresh_token')
+    if not raw:
+        return None
+    try:
+        with timed('jwt'):
+            return RefreshToken(raw)
+    except TokenError:
+        return None
+
+def password_reset_email(user):
+    """Subject and HTML body of the password reset email for user"""
+    # Generate password reset token
+    token = default_token_generator.make_token(user)
+    
+    # Create reset URL with user ID and token
+    from django.utils.http import urlsafe_base64_encode
+    from django.utils.encoding import force_bytes
+    
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
+    
+    # Send email with HTML template
+    email_subject = 'JobMeet - Password Reset Request'
+    email_body = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: #4169E1;">Password Reset Request</h2>
+                <p>Hello {user.full_name},</p>
+                <p>You recently requested to reset your password for your JobMeet account. Click the button below to reset it:</p>
+                <div style="text-align: center; margin: 30px 0;">
+                    <a href="{reset_url}" style="background-color: #4169E1; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block;">Reset Password</a>
+                </div>
+                <p>Or copy and paste this link into your browser:</p>
+                <p style="word-break: break-all; color: #4169E1;">{reset_url}</p>
+                <p style="color: #666; font-size: 14px;">This link will expire in 1 hour.</p>
+                <p style="color: #666; font-size: 14px;">If you didn't request this password reset, please ignore this email or contact support if you have concerns.</p>
+                <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
+                <p style="color: #999; font-size: 12px;">JobMeet Interview Platform</p>
+            </div>
+        </body>
+    </html>
+    """
+    return email_subject, email_body
+
 
 class SignupView(APIView):
     """User registration endpoint"""
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'signup'
     
     def post(self, request):
         serializer = SignupSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
+            user_logged_in.send(sender=user.__class__, request=request, user=user)
             
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             
             # Set tokens in HTTP-only cookies
             response = Response({
                 'message': 'User created successfully',
-                'user': UserSerializer(user).data
+                'user': FastUserSerializer(user).data
             }, status=status.HTTP_201_CREATED)
             
-            response.set_cookie(
-                key='refresh_token',
-                value=str(refresh),
-                httponly=True,
-                secure=not settings.DEBUG,  # True in production
-                samesite='Lax',
-                max_age=7 * 24 * 60 * 60  # 7 days
-            )
-            
-            response.set_cookie(
-                key='access_token',
-                value=str(refresh.access_token),
-                httponly=True,
-                secure=not settings.DEBUG,
-                samesite='Lax',
-                max_age=60 * 60  # 1 hour
-            )
+            set_auth_cookies(response, refresh)
             
             return response
         
@@ -60,38 +174,25 @@ class SignupView(APIView):
 class LoginView(APIView):
     """User login endpoint"""
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'login'
     
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
+            user_logged_in.send(sender=user.__class__, request=request, user=user)
             
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
             
             response = Response({
                 'message': 'Login successful',
-                'user': UserSerializer(user).data
+                'user': FastUserSerializer(user).data
             }, status=status.HTTP_200_OK)
             
             # Set tokens in HTTP-only cookies
-            response.set_cookie(
-                key='refresh_token',
-                value=str(refresh),
-                httponly=True,
-                secure=not settings.DEBUG,
-                samesite='Lax',
-                max_age=7 * 24 * 60 * 60
-            )
-            
-            response.set_cookie(
-                key='access_token',
-                value=str(refresh.access_token),
-                httponly=True,
-                secure=not settings.DEBUG,
-                samesite='Lax',
-                max_age=60 * 60
-            )
+            set_auth_cookies(response, refresh)
             
             return response
         
@@ -103,14 +204,59 @@ class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
+        # Revoke the whole login so the refresh cookie can't be replayed
+        refresh = read_refresh_cookie(request)
+        if refresh is not None:
+            revocation.revoke_family(refresh)
+        
         response = Response({
             'message': 'Logout successful'
         }, status=status.HTTP_200_OK)
         
         # Clear cookies
-        response.delete_cookie('access_token')
-        response.delete_cookie('refresh_token')
+        clear_auth_cookies(response)
+        
+        return response
+
+
+class RefreshTokenView(APIView):
+    """Rotate the refresh token cookie and issue a new access token"""
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'token_refresh'
+    
+    def post(self, request):
+        refresh = read_refresh_cookie(request)
+        if refresh is None or revocation.is_revoked(refresh):
+            return self.reject()
+        
+        # Each refresh token is good for one rotation; a second use means it
+        # leaked, so every token from the same login is revoked
+        if not revocation.rotate(refresh):
+            return self.reject()
+        
+        # Fresh row rather than claims so profile edits and deactivation apply
+        try:
+            user = CustomUser.objects.get(pk=refresh[jwt_settings.USER_ID_CLAIM], is_active=True)
+        except CustomUser.DoesNotExist:
+            return self.reject()
+        if user.tokens_revoked(refresh):
+            # Issued before a password reset
+            return self.reject()
         
+        new_refresh = tokens_for_user(user, family=refresh.get('fam'))
+        response = Response({
+            'message': 'Token refreshed'
+        }, status=status.HTTP_200_OK)
+        set_auth_cookies(response, new_refresh)
+        return response
+    
+    def reject(self):
+        response = Response({
+            'error': 'Invalid or expired refresh token'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+        clear_auth_cookies(response)
         return response
 
 
@@ -119,13 +265,172 @@ class CurrentUserView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        not_modified = profile_not_modified(request, request.user)
+        if not_modified is not None:
+            return not_modified
+        serializer = FastUserSerializer(request.user)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        set_profile_validators(response, request.user)
+        return response
+
+
+def directory_serializer(user):
+    """Anyone may sign up as a host, so only staff see other users' contact details"""
+    return FastUserSerializer if user.is_staff else FastDirectoryUserSerializer
+
+
+class UserListView(generics.ListAPIView):
+    """Directory of users for hosts, filterable by role and active flag"""
+    permission_classes = [IsHost]
+    pagination_class = KeysetPagination
+    
+    def get_serializer_class(self):
+        return directory_serializer(self.request.user)
+    
+    def get_queryset(self):
+        queryset = CustomUser.objects.all()
+        params = self.request.query_params
+        
+        role = params.get('role')
+        if role:
+            if role not in dict(CustomUser.ROLE_CHOICES):
+                raise ValidationError({'role': f'Must be one of {", ".join(dict(CustomUser.ROLE_CHOICES))}.'})
+            queryset = queryset.filter(role=role)
+        
+        is_active = params.get('is_active')
+        if is_active:
+            if is_active.lower() not in ('true', 'false'):
+                raise ValidationError({'is_active': 'Must be true or false.'})
+            # `__in` rather than `=`: a bare boolean predicate can't seek the composite index on SQLite
+            queryset = queryset.filter(is_active__in=[is_active.lower() == 'true'])
+        
+        # Only the fields the serializer renders, plus the pagination keys
+        return queryset.only(*self.get_serializer_class().fields, 'created_at')
+
+
+class UserBatchView(APIView):
+    """
+    Profiles of many users at once, by id and/or email, for hosts; looking
+    users up by email is for staff only, as it tells who has an account.
+    Resolved with one query whatever the batch size; duplicates collapse and
+    ids or emails that match no user are listed under "missing".
+    """
+    permission_classes = [IsHost]
+    
+    def post(self, request):
+        serializer = UserBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['emails'] and not request.user.is_staff:
+            raise PermissionDenied('Only staff can look users up by email.')
+        user_serializer = directory_serializer(request.user)
+        # Per-request memo: each distinct id and email is looked up once, in request order
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        emails = list(dict.fromkeys(serializer.validated_data['emails']))
+        
+        lookup = Q()
+        if ids:
+            lookup |= Q(pk__in=ids)
+        if emails:
+            lookup |= Q(email__in=emails)
+        # Plain rows rather than model instances: rendering hundreds of them is the bulk of the work
+        with read_from_replica():
+            by_id = {row['id']: row for row in CustomUser.objects.filter(lookup).values(*user_serializer.fields)}
+        by_email = {row['email']: row for row in by_id.values()} if emails else {}
+        
+        found = {}
+        for pk in ids:
+            if pk in by_id:
+                found.setdefault(pk, by_id[pk])
+        for email in emails:
+            if email in by_email:
+                found.setdefault(by_email[email]['id'], by_email[email])
+        
+        return Response({
+            'users': user_serializer.from_values(found.values()),
+            'missing': {
+                'ids': [pk for pk in ids if pk not in by_id],
+                'emails': [email for email in emails if email not in by_email],
+            },
+        }, status=status.HTTP_200_OK)
+
+
+class InviteBatchView(APIView):
+    """
+    Invite many candidates to an interview at once, for hosts.
+    Every invitation is rendered and queued before the response; the outbox
+    worker delivers them, and the batch URL reports its progress.
+    Requests are throttled per host, and each host has a daily recipient quota.
+    """
+    permission_classes = [IsHost]
+    throttle_classes = [UserRateThrottle, GlobalRateThrottle]
+    throttle_scope = 'invite'
+    
+    def post(self, request):
+        serializer = InviteBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            batch = create_invite_batch(request.user, **serializer.validated_data)
+        except InviteQuotaExceeded as exc:
+            raise Throttled(wait=exc.retry_after, detail='Daily invite quota exceeded.')
+        return Response(batch_progress(batch), status=status.HTTP_202_ACCEPTED)
+
+
+class InviteBatchDetailView(APIView):
+    """Delivery progress of one of the host's invite batches"""
+    permission_classes = [IsHost]
+    
+    def get(self, request, pk):
+        batches = InviteBatch.objects.all()
+        if not request.user.is_staff:
+            batches = batches.filter(host_id=request.user.pk)
+        try:
+            batch = batches.get(pk=pk)
+        except InviteBatch.DoesNotExist:
+            return Response({'error': 'Invite batch not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(batch_progress(batch), status=status.HTTP_200_OK)
+
+
+class AvatarView(APIView):
+    """
+    Redirect to a local thumbnail of a user's avatar, ?size= one of AVATARS['SIZES'].
+    The thumbnail URL is content-addressed and cached by clients for good; the
+    redirect only for REDIRECT_MAX_AGE, so a new picture shows up within that.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, pk):
+        size = request.query_params.get('size', str(avatar_setting('DEFAULT_SIZE')))
+        sizes = avatar_setting('SIZES')
+        if not size.isdigit() or int(size) not in sizes:
+            raise ValidationError({'size': f'Must be one of {", ".join(map(str, sizes))}.'})
+        
+        if pk == request.user.pk:
+            avatar = request.user.avatar
+        else:
+            with read_from_replica():
+                avatar = CustomUser.objects.filter(pk=pk).values_list('avatar', flat=True).first()
+        if not avatar:
+            return Response({'error': 'No avatar'}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            name = get_avatar_store().thumbnail(avatar, int(size))
+        except SourceNotAllowed:
+            return Response({'error': 'No avatar'}, status=status.HTTP_404_NOT_FOUND)
+        except FetchError:
+            return Response({
+                'error': 'Avatar is temporarily unavailable'
+            }, status=status.HTTP_502_BAD_GATEWAY)
+        
+        response = HttpResponseRedirect(reverse('avatar-file', args=[name]))
+        response['Cache-Control'] = f'private, max-age={avatar_setting("REDIRECT_MAX_AGE")}'
+        return response
 
 
 class PasswordResetRequestView(APIView):
     """Request password reset email"""
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'password_reset'
     
     def post(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
@@ -139,52 +444,15 @@ class PasswordResetRequestView(APIView):
                     'message': 'If an account exists with this email, a reset link will be sent'
                 }, status=status.HTTP_200_OK)
             
-            # Generate password reset token
-            token = default_token_generator.make_token(user)
-            
-            # Create reset URL with user ID and token
-            from django.utils.http import urlsafe_base64_encode
-            from django.utils.encoding import force_bytes
-            
-            uid = urlsafe_base64_encode(force_bytes(user.pk))
-            reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
+            email_subject, email_body = password_reset_email(user)
             
-            # Send email with HTML template
-            email_subject = 'JobMeet - Password Reset Request'
-            email_body = f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                        <h2 style="color: #4169E1;">Password Reset Request</h2>
-                        <p>Hello {user.full_name},</p>
-                        <p>You recently requested to reset your password for your JobMeet account. Click the button below to reset it:</p>
-                        <div style="text-align: center; margin: 30px 0;">
-                            <a href="{reset_url}" style="background-color: #4169E1; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block;">Reset Password</a>
-                        </div>
-                        <p>Or copy and paste this link into your browser:</p>
-                        <p style="word-break: break-all; color: #4169E1;">{reset_url}</p>
-                        <p style="color: #666; font-size: 14px;">This link will expire in 1 hour.</p>
-                        <p style="color: #666; font-size: 14px;">If you didn't request this password reset, please ignore this email or contact support if you have concerns.</p>
-                        <hr style="margin: 30px 0; border: none; border-top: 1px solid #ddd;">
-                        <p style="color: #999; font-size: 12px;">JobMeet Interview Platform</p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            try:
-                send_mail(
-                    email_subject,
-                    '',  # Plain text version (empty as we're using HTML)
-                    settings.EMAIL_HOST_USER,
-                    [email],
-                    fail_silently=False,
-                    html_message=email_body
-                )
-            except Exception as e:
-                return Response({
-                    'error': 'Failed to send email. Please try again later.'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # Queue the email; the send_outbox worker delivers it outside the request
+            enqueue_mail(
+                email_subject,
+                email,
+                html_body=email_body,
+                from_email=settings.EMAIL_HOST_USER,
+            )
             
             return Response({
                 'message': 'If an account exists with this email, a reset link will be sent'
@@ -223,8 +491,9 @@ class PasswordResetConfirmView(APIView):
                     'error': 'Invalid or expired reset link'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Set new password
+            # Set new password, and sign out every session including a possibly stolen one
             user.set_password(new_password)
+            user.revoke_tokens()
             user.save()
             
             return Response({
@@ -238,21 +507,18 @@ class PasswordResetConfirmView(APIView):
 class GoogleLoginView(APIView):
     """Google OAuth login endpoint"""
     permission_classes = [AllowAny]
+    throttle_classes = AUTH_THROTTLE_CLASSES
+    throttle_scope = 'google_login'
     
     def post(self, request):
-        print(f"Google login request data: {request.data}")  # Debug log
         serializer = GoogleLoginSerializer(data=request.data)
         if serializer.is_valid():
             access_token = serializer.validated_data['access_token']
             role = serializer.validated_data.get('role', 'CANDIDATE')
             
             try:
-                # Verify the token with Google
-                idinfo = id_token.verify_oauth2_token(
-                    access_token,
-                    google_requests.Request(),
-                    settings.GOOGLE_OAUTH_CLIENT_ID
-                )
+                # Verify the token against Google's (cached) signing keys
+                idinfo = verify_google_token(access_token)
                 
                 email = idinfo['email']
                 full_name = idinfo.get('name', '')
@@ -267,41 +533,30 @@ class GoogleLoginView(APIView):
                         'role': role,
                     }
                 )
+                user_logged_in.send(sender=user.__class__, request=request, user=user)
                 
                 # Generate JWT tokens
-                refresh = RefreshToken.for_user(user)
+                refresh = tokens_for_user(user)
                 
                 response = Response({
                     'message': 'Google login successful',
-                    'user': UserSerializer(user).data,
+                    'user': FastUserSerializer(user).data,
                     'is_new_user': created
                 }, status=status.HTTP_200_OK)
                 
-                response.set_cookie(
-                    key='refresh_token',
-                    value=str(refresh),
-                    httponly=True,
-                    secure=not settings.DEBUG,
-                    samesite='Lax',
-                    max_age=7 * 24 * 60 * 60
-                )
-                
-                response.set_cookie(
-                    key='access_token',
-                    value=str(refresh.access_token),
-                    httponly=True,
-                    secure=not settings.DEBUG,
-                    samesite='Lax',
-                    max_age=60 * 60
-                )
+                set_auth_cookies(response, refresh)
                 
                 return response
                 
             except ValueError as e:
-                print(f"Token verification error: {str(e)}")  # Debug log
+                logger.info('Google token verification failed: %s', e)
                 return Response({
                     'error': 'Invalid Google token'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            except GoogleKeysUnavailable:
+                return Response({
+                    'error': 'Google sign-in is temporarily unavailable'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
-        print(f"Serializer errors: {serializer.errors}")  # Debug log
+        logger.info('Invalid Google login request: %s', serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Flush buffered last_login writes from a background thread (see accounts/touch.py)
+from accounts.touch import touch_buffer  # noqa: E402
+
+touch_buffer.start()
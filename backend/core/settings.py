@@ -13,14 +13,20 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 from pathlib import Path
 import os
 from datetime import timedelta
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Load environment variables from the nearest .env file up from this directory
+# (where load_dotenv() looks); python-dotenv is only imported when there is one
+ENV_FILE = next(
+    (directory / '.env' for directory in Path(__file__).resolve().parents if (directory / '.env').is_file()),
+    None,
+)
+if ENV_FILE:
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
@@ -40,6 +46,15 @@ FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 GOOGLE_OAUTH_CLIENT_ID = os.getenv('GOOGLE_OAUTH_CLIENT_ID', '')
 GOOGLE_OAUTH_CLIENT_SECRET = os.getenv('GOOGLE_OAUTH_CLIENT_SECRET', '')
 
+# Google ID token verification (see accounts/google.py). Signing keys are
+# cached for the max-age Google advertises and refreshed in the background.
+GOOGLE_ID_TOKEN_VERIFIER = {
+    'KEY_SOURCE': 'accounts.google.HTTPKeySource',
+    'REFRESH_AHEAD': 60,  # seconds before expiry to refresh in the background
+    'MAX_STALE': 60 * 60,  # seconds expired keys may be used while Google is unreachable
+    'MIN_REFRESH_INTERVAL': 30,
+}
+
 
 # Application definition
 
@@ -50,6 +65,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # OpClass in index expressions (accounts.indexes); the indexes themselves are PostgreSQL-only
+    'django.contrib.postgres',
     
     # Third-party apps
     'rest_framework',
@@ -61,16 +78,34 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounts.middleware.RouteMiddleware',
 ]
 
+# Middleware only some paths need (accounts/middleware.py): requests run the
+# list of the longest matching prefix, or DEFAULT. The API authenticates with
+# the JWT cookie alone, so it skips sessions, CSRF, the session user, messages
+# and X-Frame-Options; the admin and everything else get the full stack.
+ROUTE_MIDDLEWARE = {
+    'DEFAULT': [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ],
+    'PREFIXES': {
+        '/api/': [],
+    },
+}
+
+# Checked against the list serving /admin/ instead (accounts.E001-E003)
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -95,11 +130,60 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default. DB_ENGINE=postgres (with DB_NAME, DB_USER, DB_PASSWORD,
+# DB_HOST, DB_PORT) is the production profile: connections persist for
+# DB_CONN_MAX_AGE seconds and are health-checked before reuse. Setting
+# DB_REPLICA_HOST (or DB_REPLICA_NAME for SQLite) adds a 'replica' alias that
+# accounts.routers uses for reads.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'jobmeet'),
+            'USER': os.getenv('DB_USER', 'postgres'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            # Server-side cursors don't survive PgBouncer in transaction pooling mode
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', 'false').lower() == 'true',
+            'OPTIONS': {'connect_timeout': 5},
+        }
     }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.getenv('DB_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': os.getenv('DB_REPLICA_NAME'),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['accounts.routers.PrimaryReplicaRouter']
+
+# Read-your-writes: after a write, the client reads from the primary for
+# STICKY_SECONDS (tracked with the STICKY_COOKIE cookie)
+DATABASE_ROUTING = {
+    'REPLICA_ALIAS': 'replica',
+    'STICKY_SECONDS': 10,
+    'STICKY_COOKIE': 'db_primary',
 }
 
 
@@ -121,6 +205,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Reject passwords from breach corpora, offline: point BREACHED_PASSWORDS_FILTER
+# at a filter file built with `manage.py build_breach_filter` (accounts/breach.py)
+if os.getenv('BREACHED_PASSWORDS_FILTER'):
+    AUTH_PASSWORD_VALIDATORS.append({
+        'NAME': 'accounts.breach.BreachedPasswordValidator',
+        'OPTIONS': {'path': os.getenv('BREACHED_PASSWORDS_FILTER')},
+    })
+
+# Password hashing runs on a bounded pool (accounts/hashing.py). When all
+# workers are busy and MAX_QUEUE requests are waiting, hashing endpoints answer
+# 503 with Retry-After instead of tying up more request workers.
+PASSWORD_HASHING_POOL = {
+    'MAX_WORKERS': int(os.getenv('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)),
+    'MAX_QUEUE': int(os.getenv('PASSWORD_HASHING_QUEUE', 16)),
+    'RETRY_AFTER': 1,  # seconds
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
@@ -152,12 +253,43 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed; same bytes as the stock JSON classes otherwise
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'accounts.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'accounts.parsers.FastJSONParser',
     ],
+    # Sliding-window limits for the unauthenticated auth endpoints and bulk invites
+    # (accounts/throttling.py), keyed '<throttle_scope>.<ip|email|user|global>'
+    'DEFAULT_THROTTLE_RATES': {
+        'login.ip': '30/min',
+        'login.email': '10/min',
+        'login.global': '1000/min',
+        'signup.ip': '20/hour',
+        'signup.global': '300/min',
+        'password_reset.ip': '10/hour',
+        'password_reset.email': '3/hour',
+        'password_reset.global': '200/min',
+        'google_login.ip': '60/min',
+        'google_login.global': '1000/min',
+        'token_refresh.ip': '120/min',
+        'token_refresh.global': '2000/min',
+        'invite.user': '10/hour',
+        'invite.global': '300/hour',
+    },
+    # Reverse proxies in front of the app. Client IPs (for the per-IP limits) are read
+    # from X-Forwarded-For only that many hops deep; with 0 the header is ignored, so
+    # clients can't pick their own IP. Set NUM_PROXIES=1 behind a single nginx/ALB.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+}
+
+# Counter store for the auth throttles. LocalWindowStore keeps per-process
+# counters; use accounts.throttling.CacheWindowStore with a shared cache
+# (OPTIONS: {'alias': ...}) when running several workers.
+AUTH_THROTTLE = {
+    'STORE': os.getenv('AUTH_THROTTLE_STORE', 'accounts.throttling.LocalWindowStore'),
+    'OPTIONS': {},
 }
 
 # Simple JWT settings
@@ -177,6 +309,88 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_SAMESITE': 'Lax',
 }
 
+# Caches of validated access tokens (per process) and user snapshots (two
+# tiers, see TIERED_CACHE) used by CookieJWTAuthentication. MAX_* bound the
+# per-process tier. Entries never outlive the token's `exp` claim.
+AUTH_USER_CACHE = {
+    'ENABLED': os.getenv('AUTH_USER_CACHE_ENABLED', 'true').lower() == 'true',
+    'MAX_TOKENS': 10000,
+    'MAX_USERS': 10000,
+    'TTL': 300,  # seconds
+}
+
+# 'shared' is the cache every worker on the host sees, and where
+# accounts.cache.TieredCache keeps user snapshots and Google signing keys
+# behind a per-process LRU, replaying other workers' invalidations every
+# SYNC_INTERVAL seconds. Redis when REDIS_URL is set; a directory when
+# SHARED_CACHE_DIR is (it must be private to the app's user: entries are
+# pickles holding password hashes). Otherwise each process keeps its own.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    } if os.getenv('REDIS_URL') else {
+        'BACKEND': 'accounts.cache.PrivateFileBasedCache',
+        'LOCATION': os.getenv('SHARED_CACHE_DIR'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    } if os.getenv('SHARED_CACHE_DIR') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+
+TIERED_CACHE = {
+    'ALIAS': 'shared',
+    'SYNC_INTERVAL': 1,  # seconds
+    'LOCK_TIMEOUT': 5,  # seconds
+    'LOG_SIZE': 1000,
+}
+
+# Embed profile claims (email, full_name, role, ...) in access tokens so
+# CurrentUserView can be served without a database lookup. Profile edits and
+# deactivation only show up once the 1 hour access token is re-minted.
+AUTH_PROFILE_CLAIMS = os.getenv('AUTH_PROFILE_CLAIMS', 'false').lower() == 'true'
+
+# Serve the current-user, logout, password reset and Google login endpoints
+# with native async views (accounts/async_views.py). Only worth it under ASGI;
+# under WSGI every async view runs through an extra event loop hop.
+AUTH_ASYNC_VIEWS = os.getenv('AUTH_ASYNC_VIEWS', 'false').lower() == 'true'
+
+# Per-request timings (accounts/metrics.py): Server-Timing header, per-view
+# histograms on /metrics (Prometheus text format) and a log line for requests
+# slower than SLOW_REQUEST_MS. /metrics needs `Authorization: Bearer <TOKEN>`,
+# or comes from localhost when no token is set.
+PERFORMANCE_METRICS = {
+    'ENABLED': os.getenv('PERFORMANCE_METRICS_ENABLED', 'true').lower() == 'true',
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': int(os.getenv('SLOW_REQUEST_MS', '500')),
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+}
+
+# Used refresh tokens and revoked token families (see accounts/revocation.py).
+# Each process mirrors the revoked_tokens table in memory and pulls new rows
+# every SYNC_INTERVAL seconds; expired rows are deleted every COMPACT_INTERVAL.
+TOKEN_REVOCATION = {
+    'SYNC_INTERVAL': 5,  # seconds
+    'COMPACT_INTERVAL': 60 * 60,  # seconds
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+}
+
+# last_login (accounts/touch.py) is written behind: logins only queue the
+# timestamp, and queued rows go out in one bulk UPDATE every MAX_DELAY seconds,
+# once MAX_PENDING rows are waiting, or at process exit. last_login can thus
+# lag by up to MAX_DELAY; a crashed worker loses at most that window.
+TOUCH_BUFFER = {
+    'ENABLED': os.getenv('TOUCH_BUFFER_ENABLED', 'true').lower() == 'true',
+    'MAX_DELAY': int(os.getenv('TOUCH_BUFFER_MAX_DELAY', '10')),  # seconds
+    'MAX_PENDING': 500,
+    'BATCH_SIZE': 500,
+}
+
 
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -212,3 +426,43 @@ EMAIL_HOST_USER = os.getenv('EMAIL_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASS')
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_USER', 'noreply@jobmeet.com')
 
+# Outbox delivery (see `manage.py send_outbox`)
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,  # seconds, doubled per failed attempt
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 5 * 60,
+}
+
+# Bulk interview invites (accounts.invites). DAILY_RECIPIENTS caps the invitations
+# a host sends per rolling 24 hours. Join links must point at FRONTEND_URL or a
+# host matching JOIN_URL_HOSTS (fnmatch patterns, e.g. '*.zoom.us'; https only).
+INVITES = {
+    'DAILY_RECIPIENTS': int(os.getenv('INVITE_DAILY_RECIPIENTS', '2000')),
+    'JOIN_URL_HOSTS': [host for host in os.getenv('INVITE_JOIN_URL_HOSTS', '').split(',') if host],
+}
+
+# Local avatar proxy (accounts.avatars): source images are fetched once from
+# SOURCE_HOSTS, and thumbnails are kept in CACHE_DIR, least recently used
+# evicted past MAX_BYTES. Set SENDFILE_HEADER when nginx (X-Accel-Redirect,
+# internal location SENDFILE_PREFIX aliased to CACHE_DIR) or Apache
+# (X-Sendfile) should send the files instead of the app server
+AVATARS = {
+    'FETCHER': 'accounts.avatars.HTTPFetcher',
+    'CACHE_DIR': os.getenv('AVATAR_CACHE_DIR', str(BASE_DIR / 'avatar_cache')),
+    'MAX_BYTES': int(os.getenv('AVATAR_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    'SIZES': [48, 96, 192],
+    'DEFAULT_SIZE': 96,
+    'SOURCE_HOSTS': ['*.googleusercontent.com'],
+    'SENDFILE_HEADER': os.getenv('AVATAR_SENDFILE_HEADER', ''),
+    'SENDFILE_PREFIX': '/internal/avatars/',
+}
+
+# Cold-start budget enforced by `manage.py startup_report`: median time to
+# import the WSGI application and the URLconf, and modules that must not be
+# imported until first use
+STARTUP_BUDGET = {
+    'MAX_MS': int(os.getenv('STARTUP_BUDGET_MS', '1000')),
+    'LAZY_MODULES': ['google.auth', 'PIL'],
+}
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Flush buffered last_login writes from a background thread (see accounts/touch.py)
+from accounts.touch import touch_buffer  # noqa: E402
+
+touch_buffer.start()